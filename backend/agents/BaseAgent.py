@@ -1,90 +1,164 @@
+import logging
 from abc import ABC
-from pydantic import BaseModel, ConfigDict
-from langchain_openai.chat_models import ChatOpenAI
+from pydantic import BaseModel, ConfigDict, Field
 from backend.llm import llm
-from typing import Dict, Any
+from backend.llm_cache import CacheMiss
+from typing import Dict, Any, List, Optional
 from backend.game_state import GameState
-import json
 from backend.entity import Player
-from langchain_core.messages import SystemMessage
+from backend.base import Phase
+from backend.prompts import RULES, RETRY
+from backend.repair import repair_json, decision_schema
+from backend.metrics import LLMCall, LLM_PARSE_FAILURES, LLM_RETRIES, LLM_FALLBACKS
+from langchain_core.messages import BaseMessage, HumanMessage
 
+logger = logging.getLogger(__name__)
 
 class Agent(ABC, BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    system_prompt: str = """
-    【狼人杀基础规则】
-
-    分好人阵营（村民+神职）和狼人阵营，总共包括四种职业
-    好人阵营：[女巫，预言家，平民]
-    狼人阵营：[狼人]
-
-
-    ### 核心角色及技能
-    - **狼人**：夜间共同商议杀死1名玩家，且晚上必须杀死1名玩家，白天可伪装身份误导好人
-    - **平民**：无特殊技能，白天通过发言判断身份、投票放逐狼人
-    - **预言家**：夜间可查验1名玩家的阵营（好人/狼人）
-    - **女巫**：拥有1瓶解药（可救夜间被刀玩家）和1瓶毒药（可毒杀1名玩家），同一晚不能同时用两种药
-
-
-    ### 游戏流程
-    1. **黑夜阶段**（按顺序行动）：  
-       - 狼人睁眼，协商杀死1人后闭眼  
-       - 预言家睁眼，法官告知其查验玩家的阵营后闭眼  
-       - 女巫睁眼，法官告知夜间死亡玩家，女巫选择是否用解药救人或用毒药毒人（不用药则直接闭眼）  
-       - 猎人保持闭眼（仅在死亡时触发技能）  
-
-    2. **白天阶段**：  
-       - 法官公布夜间死亡信息（无人死亡则为“平安夜”）  
-       - 所有玩家按顺序发言（可陈述观点、怀疑他人或为自己辩解）  
-       - 发言结束后，全体玩家投票放逐1名最可疑的玩家（得票最多者出局，出局玩家可留“遗言”）  
-
-    3. 重复“黑夜-白天”流程，直至某一阵营达成胜利条件
-
-
-    ### 胜负条件
-    - **好人阵营**：所有狼人被放逐  
-    - **狼人阵营**：狼人数量≥好人数量（或所有神职被消灭，依具体规则调整）  
-
-        """
+    system_prompt: str = RULES
+    # "json_schema"：按可选行动和目标生成JSON Schema约束输出；"json_object"：只要求输出JSON；"none"：不约束
+    structured_output: str = "json_schema"
+    # 输出无效时最多重试的次数，之后使用确定性的兜底决策
+    max_retries: int = 2
+    # 按阶段统计的重试次数和兜底决策次数
+    retries: Dict[str, int] = Field(default_factory=dict)
+    fallbacks: Dict[str, int] = Field(default_factory=dict)
+
+    @staticmethod
+    def _targets(game_state: GameState, player: Player) -> List[int]:
+        return [i for i in game_state.alive_players if i != player.id]
+
+    @classmethod
+    def _values(cls, game_state: GameState, player: Player, history) -> Dict[str, Any]:
+        """所有模板共用的局面信息"""
+        return {
+            "pid": player.id,
+            "day": game_state.day,
+            "phase": game_state.phase_map[game_state.phase],
+            "alive": game_state.alive_players,
+            "targets": cls._targets(game_state, player),
+            "history": history if history else '暂时没有',
+        }
+
+    def _spec(self, game_state: GameState, player: Player, **kwargs) -> Dict[str, List[int]]:
+        """当前决策允许的 行动 -> 目标 列表，默认为投票"""
+        return {"vote": self._targets(game_state, player)}
+
+    def _fallback(self, game_state: GameState, player: Player, spec: Dict[str, List[int]]) -> Dict[str, Any]:
+        """重试耗尽后的确定性决策：第一个有目标的行动，目标取编号最小的玩家"""
+        action, targets = next(((a, t) for a, t in spec.items() if t), next(iter(spec.items())))
+        return {"action": action, "target": targets[0] if targets else -1, "reason": "系统代为决策", "content": ""}
+
+    @staticmethod
+    def _validate(result, spec: Dict[str, List[int]]) -> bool:
+        if not isinstance(result, dict) or result.get("action") not in spec:
+            return False
+        allowed = spec[result["action"]]
+        if allowed == [-1]:
+            result["target"] = -1
+        try:
+            result["target"] = int(result.get("target"))
+        except (TypeError, ValueError):
+            return False
+        if result["target"] not in allowed:
+            return False
+        if result["action"] == "conversation" and not result.get("content"):
+            return False
+        result.setdefault("reason", "")
+        return True
+
+    def _response_format(self, spec: Dict[str, List[int]]) -> Dict[str, Any]:
+        if self.structured_output == "json_schema":
+            return {"response_format": decision_schema(spec)}
+        if self.structured_output == "json_object":
+            return {"response_format": {"type": "json_object"}}
+        return {}
+
+    async def _decide(self, game_state: GameState, player: Player, messages: List[BaseMessage],
+                      spec: Dict[str, List[int]]) -> Dict[str, Any]:
+        phase = Phase(game_state.phase).value
+        role = player.role.value
+        kwargs = self._response_format(spec)
+        attempts = self.max_retries + 1
+        for attempt in range(attempts):
+            if attempt:
+                self.retries[phase] = self.retries.get(phase, 0) + 1
+                LLM_RETRIES.labels(role, phase).inc()
+                # 只追加一条简短的纠正提示，前面的消息不变，仍可命中前缀缓存
+                messages = messages + [HumanMessage(content=RETRY.format(
+                    actions=list(spec), targets={a: t for a, t in spec.items()}))]
+            call = LLMCall(role, phase, game_state.day, "act", messages, player.id)
+            try:
+                response = await llm.agenerate([messages], **kwargs)
+            except CacheMiss:
+                raise
+            except Exception as e:
+                call.failed()
+                logger.warning("seat %s (%s, day %s %s): LLM call failed on attempt %d/%d: %r",
+                               player.id, role, game_state.day, phase, attempt + 1, attempts, e)
+                continue
+            call.done(response)
+            result = self._parse_json(response, response_type="act")
+            if self._validate(result, spec):
+                return result
+            LLM_PARSE_FAILURES.labels(role, phase).inc()
+            logger.info("seat %s (%s, day %s %s): invalid decision on attempt %d/%d: %.200r",
+                        player.id, role, game_state.day, phase, attempt + 1, attempts, result)
+        self.fallbacks[phase] = self.fallbacks.get(phase, 0) + 1
+        LLM_FALLBACKS.labels(role, phase).inc()
+        logger.warning("seat %s (%s, day %s %s): no valid decision after %d attempts, using fallback",
+                       player.id, role, game_state.day, phase, attempts)
+        return self._fallback(game_state, player, spec)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"retries": dict(self.retries), "fallbacks": dict(self.fallbacks)}
 
     async def act(self, game_state: GameState, player: Player) -> Dict[str, Any]:
         history = game_state.get_history(player.id)
-        prompt = self._create_prompt(game_state, player, history)
-        response = await llm.agenerate([[SystemMessage(content=prompt)]])
-        result = self._parse_json(response, response_type="act")
-        if not result:
-            return {"action": "again"}
-        return result
+        messages = self._create_prompt(game_state, player, history)
+        return await self._decide(game_state, player, messages, self._spec(game_state, player))
 
     async def speak(self, game_state: GameState, player: Player):
         history = game_state.get_history(player.id)
-        prompt = self._create_prompt(game_state, player, history)
-        async for chunk in llm.astream(prompt):
-            result = self._parse_json(chunk, response_type="speak")
-            if result:
-                yield str(result)
-            else:
-                ''
+        messages = self._create_prompt(game_state, player, history)
+        call = LLMCall(player.role.value, Phase(game_state.phase).value, game_state.day, "speak", messages,
+                       player.id)
+        text, usage = [], None
+        try:
+            async for chunk in llm.astream(messages):
+                call.first_chunk()
+                if getattr(chunk, "usage_metadata", None):
+                    usage = chunk
+                result = self._parse_json(chunk, response_type="speak")
+                if result:
+                    text.append(result)
+                    yield str(result)
+                else:
+                    ''
+        except Exception:
+            call.failed()
+            raise
+        call.done(usage, "".join(text))
         yield "FINISH"
 
-    async def vote(self, game_state: GameState, player: Player) -> Dict[str, Any]:
-        history = game_state.get_history(player.id)
-        prompt = self._create_prompt(game_state, player, history)
-        response = await llm.agenerate([[SystemMessage(content=prompt)]])
-        result = self._parse_json(response, response_type="act")
-        if not result:
-            return {"action": "again"}
-        return result
+    async def vote(self, game_state: GameState, player: Player, history: Optional[str] = None) -> Dict[str, Any]:
+        """history为调用方事先取得的历史快照，None时读取当前的历史"""
+        if history is None:
+            history = game_state.get_history(player.id)
+        messages = self._create_prompt(game_state, player, history)
+        return await self._decide(game_state, player, messages, self._spec(game_state, player))
 
 
     def _parse_json(self, response, response_type: str):
         try:
             if response_type == "act":
                 text = response.generations[0][0].text.strip()
-                return json.loads(text)
+                return repair_json(text) or False
             else:
                 text = response.content.strip()
             return text
         except Exception as e:
-            print(e)
+            # 调用方按返回的False处理并记录座位和尝试次数
+            logger.debug("cannot parse %s response: %r", response_type, e)
             return False
@@ -1,57 +1,28 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from backend.agents.BaseAgent import Agent
 from backend.base import Role, Phase
 from backend.entity import Player
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import BaseMessage, SystemMessage
+from backend.prompts import SEER_NIGHT, SEER_VOTE, SEER_SPEAK
 from backend.game_state import GameState
 
 
 class SeerAgent(Agent):
     """预言家智能体"""
 
-    def _create_prompt(self, game_state: GameState, player: Player, history) -> str:
-        alive_players = [p for p in game_state.players if p.alive and p.id != player.id]
+    def _create_prompt(self, game_state: GameState, player: Player, history) -> List[BaseMessage]:
+        values = self._values(game_state, player, history)
         if game_state.phase == Phase.NIGHT:
-            prompt = f"""{self.system_prompt}
-            你是一名预言家玩家（玩家{player.id}）。现在是第{game_state.day}天晚上！
-            存活玩家: {[f'玩家{p.id}' for p in alive_players]}
-            你需要尽快找到狼人，请根据历史信息分析哪个玩家可能狼人，并查验他的身份
-            
-            历史信息：
-            {history if history else '暂时没有'}
-            
-            请选择一名玩家查验身份，返回JSON格式：
-            {{"action": "check", "target": int,必须是{[p.id for p in alive_players]}中的一个, "reason": "你的理由，中文"}}
-            """
+            return SEER_NIGHT.render(**values)
         elif game_state.phase == Phase.VOTING:
-            prompt = f"""{self.system_prompt}
-                    你是一名预言家玩家（玩家{player.id}）。现在是第{game_state.day}天投票环节！
+            return SEER_VOTE.render(**values)
+        return SEER_SPEAK.render(**values)
 
-                    存活玩家: {[f'玩家{p.id}' for p in alive_players]}
-
-                    为了赢得胜利，请根据历史信息谨慎选择投票给哪个玩家！！！
-
-                    历史信息：
-                    {history if history else '暂时没有'}
-
-                    投票返回JSON格式：
-                    {{"action": "vote", "target": int,必须是{[p.id for p in alive_players]}中的一个, "reason": "你的理由，中文"}}
-                    """
-
-        else:
-            prompt = f"""{self.system_prompt}
-                    你是一名预言家玩家（玩家{player.id}）。现在是第{game_state.day}天讨论环节。
-                    存活玩家: {[f'玩家{p.id}' for p in alive_players]}
-                    为了赢得胜利，请结合历史信息谨慎发言（100~200字），必要时可以暴漏你的身份！！！
-
-                    历史信息：
-                    {history if history else '暂时没有'}
-                    
-                    在发言时，请不要坦漏你内心所想的！
-                    现在，开始发言：
-                    """
-        return prompt
+    def _spec(self, game_state: GameState, player: Player, **kwargs) -> Dict[str, List[int]]:
+        if game_state.phase == Phase.NIGHT:
+            return {"check": self._targets(game_state, player)}
+        return super()._spec(game_state, player)
 
     # async def act(self, game_state: GameState, player: Player, history) -> Dict[str, Any]:
     #     prompt = self._create_seer_prompt(game_state, player, history)
@@ -2,3 +2,13 @@ from .SeerAgent import SeerAgent
 from .VillagerAgent import VillagerAgent
 from .WerewolfAgent import WerewolfAgent
 from .WitchAgent import WitchAgent
+
+
+def create_agents(**options):
+    """每种角色一个智能体实例，可在多局游戏间共享；options为config.toml中[agents]的配置"""
+    return {
+        "werewolf": WerewolfAgent(**options),
+        "seer": SeerAgent(**options),
+        "witch": WitchAgent(**options),
+        "villager": VillagerAgent(**options),
+    }
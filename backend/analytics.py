@@ -0,0 +1,160 @@
+"""
+归档游戏的统计，所有计算都在backend.archive的列数组上用NumPy完成，不逐局遍历记录
+（np.bitwise_count需要NumPy 2.0以上）：
+- 胜率：按角色、按座位以及座位×角色
+- 投票准确率：好人投给狼人、狼人投给好人的比例，按投票者角色、天数和是否人类玩家分组
+- 决策延迟：智能体决策、发言和人类决策的延迟分位数和直方图（分桶与/metrics相同），以及token数
+
+运行：python -m backend.analytics cache/archive
+     python -m backend.analytics cache/archive --model gpt-4o --min-days 3
+"""
+import argparse
+import json
+from typing import Any, Dict
+
+import numpy as np
+
+from backend.archive import CALL_KINDS, DECISION_CODES, ROLES, WINNERS, Columns, Index, read, where
+from backend.base import Role
+from backend.metrics import LATENCY_BUCKETS
+
+WOLVES_WON = WINNERS.index("狼人阵营")
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _bits(masks: np.ndarray, seats: np.ndarray) -> np.ndarray:
+    """座位掩码中的位：masks (n,) 与 seats (m,) 广播为 (n, m)，也可以是形状相同的两个数组"""
+    return (masks.astype(np.int64) >> seats.astype(np.int64)) & 1 == 1
+
+
+def _rate(hits: np.ndarray, total: np.ndarray):
+    """hits/total，total为0的位置为None"""
+    hits, total = np.asarray(hits, dtype=float), np.asarray(total, dtype=float)
+    rate = np.divide(hits, total, out=np.full_like(hits, np.nan), where=total > 0)
+    return [None if np.isnan(r) else round(float(r), 4) for r in np.atleast_1d(rate)]
+
+
+def win_rates(columns: Columns) -> Dict[str, Any]:
+    games = columns.games
+    wolves_won = games["winner"] == WOLVES_WON
+    by_role = {}
+    for role in ROLES:
+        players = np.bitwise_count(games[role.value]).astype(np.int64)
+        won = wolves_won if role == Role.WEREWOLF else ~wolves_won
+        by_role[role.value] = {"players": int(players.sum()),
+                               "win_rate": _rate(players[won].sum(), players.sum())[0]}
+
+    seats = np.arange(1, int(games["seats"].max(initial=0)) + 1)
+    present = seats[None, :] <= games["seats"][:, None]
+    wolf = _bits(games[Role.WEREWOLF.value][:, None], seats[None, :])
+    # 每个座位按自己阵营的胜负计算
+    won = np.where(wolf, wolves_won[:, None], ~wolves_won[:, None]) & present
+    seat_rates = _rate(won.sum(axis=0), present.sum(axis=0))
+    by_seat_role = {}
+    for role in ROLES:
+        has = _bits(games[role.value][:, None], seats[None, :])
+        by_seat_role[role.value] = _rate((has & won).sum(axis=0), has.sum(axis=0))
+    return {
+        "games": len(games),
+        "werewolf_win_rate": _rate(wolves_won.sum(), len(games))[0],
+        "by_role": by_role,
+        "by_seat": {int(seat): {"games": int(present[:, i].sum()), "win_rate": seat_rates[i],
+                                "by_role": {role: rates[i] for role, rates in by_seat_role.items()}}
+                    for i, seat in enumerate(seats)},
+    }
+
+
+def vote_accuracy(columns: Columns) -> Dict[str, Any]:
+    """好人投票的准确率为投给狼人的比例，狼人的为投给好人的比例；弃票不计入"""
+    # 只取用到的列，结构化数组按行筛选会复制整行
+    decisions = columns.decisions
+    selected = (decisions["kind"] == DECISION_CODES["VOTE"]) & (decisions["target"] > 0)
+    game = decisions["game"][selected]
+    source = decisions["source"][selected]
+    target = decisions["target"][selected]
+    day = decisions["day"][selected]
+    human = decisions["human"][selected] == 1
+    wolves = columns.games[Role.WEREWOLF.value][game]
+    voter_wolf = _bits(wolves, source)
+    correct = _bits(wolves, target) != voter_wolf
+
+    by_role = {}
+    for role in ROLES:
+        voter = _bits(columns.games[role.value][game], source)
+        by_role[role.value] = {"votes": int(voter.sum()), "accuracy": _rate(correct[voter].sum(), voter.sum())[0]}
+    days = np.bincount(day, minlength=1)
+    good_days = np.bincount(day[~voter_wolf], minlength=len(days))
+    good_hits = np.bincount(day[~voter_wolf], weights=correct[~voter_wolf], minlength=len(days))
+    return {
+        "votes": len(game),
+        "good": _rate(correct[~voter_wolf].sum(), (~voter_wolf).sum())[0],
+        "werewolf": _rate(correct[voter_wolf].sum(), voter_wolf.sum())[0],
+        "by_role": by_role,
+        # 好人阵营每天的准确率
+        "good_by_day": {int(day): rate for day, rate in enumerate(_rate(good_hits, good_days))
+                        if good_days[day]},
+        "good_human": _rate(correct[~voter_wolf & human].sum(), (~voter_wolf & human).sum())[0],
+        "good_agent": _rate(correct[~voter_wolf & ~human].sum(), (~voter_wolf & ~human).sum())[0],
+    }
+
+
+def _distribution(latency: np.ndarray) -> Dict[str, Any]:
+    if not len(latency):
+        return {"count": 0}
+    counts, _ = np.histogram(latency, bins=[0, *LATENCY_BUCKETS, np.inf])
+    quantiles = np.quantile(latency, QUANTILES)
+    return {
+        "count": len(latency),
+        "mean": round(float(latency.mean()), 4),
+        **{f"p{int(q * 100)}": round(float(v), 4) for q, v in zip(QUANTILES, quantiles)},
+        "histogram": {f"le_{bucket:g}": int(n) for bucket, n in zip([*LATENCY_BUCKETS, np.inf], counts)},
+    }
+
+
+def decision_latency(columns: Columns) -> Dict[str, Any]:
+    """按调用类型（act、speak、human）和角色统计的延迟分布（秒）；失败的调用不计入"""
+    calls = columns.calls
+    ok = calls["ok"] == 1
+    kinds = calls["kind"][ok]
+    roles = calls["role"][ok]
+    latencies = calls["latency"][ok].astype(np.float64)
+    result = {}
+    for code, kind in enumerate(CALL_KINDS):
+        selected = kinds == code
+        latency = latencies[selected]
+        role = roles[selected]
+        tokens = {name: round(float(calls[name][ok][selected].mean()), 1) if len(latency) else None
+                  for name in ("prompt_tokens", "completion_tokens")}
+        result[kind] = {
+            **_distribution(latency),
+            **{f"{name}_mean": value for name, value in tokens.items()},
+            "by_role": {r.value: _distribution(latency[role == i]) for i, r in enumerate(ROLES)},
+        }
+    result["errors"] = int((columns.calls["ok"] == 0).sum())
+    return result
+
+
+def report(columns: Columns) -> Dict[str, Any]:
+    return {
+        "win_rates": win_rates(columns),
+        "vote_accuracy": vote_accuracy(columns),
+        "decision_latency": decision_latency(columns),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统计归档游戏的胜率、投票准确率和决策延迟")
+    parser.add_argument("path", nargs="?", default="cache/archive")
+    parser.add_argument("--role", choices=[role.value for role in ROLES],
+                        help="只统计有该角色（与--seat一起时为该座位是该角色）的游戏")
+    parser.add_argument("--seat", type=int)
+    parser.add_argument("--winner", choices=[w for w in WINNERS if w])
+    parser.add_argument("--model")
+    parser.add_argument("--min-days", type=int)
+    parser.add_argument("--max-days", type=int)
+    args = parser.parse_args()
+    columns = read(args.path)
+    index = Index.open(args.path, len(columns.games))
+    rows = where(index, role=args.role, seat=args.seat, winner=args.winner, model=args.model,
+                 min_days=args.min_days, max_days=args.max_days)
+    print(json.dumps(report(columns.select(rows)), ensure_ascii=False, indent=2))
@@ -0,0 +1,486 @@
+"""
+已结束游戏的只追加归档，用于离线分析（见backend.analytics）。
+
+目录下的文件都只追加：
+    games.log       每局一条记录：长度(4字节，小端) + JSON（角色分配、每个决策及其理由、胜方、LLM统计）
+    games.col       每局一行的定长列（GAME_DTYPE）：胜方、天数、座位数、模型、每种角色的座位掩码，
+                    以及该局在games.log、decisions.col和calls.col中的位置
+    decisions.col   每个决策一行（DECISION_DTYPE）：击杀、救人、查验、投票和狼人交流
+    calls.col       每次LLM调用或人类决策一行（CALL_DTYPE）：延迟和token数
+    index/          games.col的倒排索引，每个"字段=值"一个文件，内容为递增的行号（uint32）：
+                    winner、days、seats、model，以及每种角色的每个座位（如seer=3）
+列文件可以直接用numpy.fromfile读成结构化数组。按角色、胜方、天数和模型过滤只读取用到的索引文件，
+再按games.col中的偏移量取出选中游戏的决策和调用，不扫描其他游戏的行。
+games.col的一行是一局写入完成的标志：写入中途崩溃留下的其他文件（包括索引）的尾部在下次写入前截掉，读取时也被忽略。
+多个worker可以共享同一个目录，写入时用文件锁串行化。
+
+一局游戏进行中由GameRecord收集决策和LLM调用，与backend.tracing一样保存在contextvar中；
+游戏结束后Archive.finish把记录放入队列，由后台任务在线程中写入，不阻塞事件循环。
+"""
+import asyncio
+import logging
+import os
+import struct
+import shutil
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from backend.base import Phase, Role
+from backend.game_state import GameState
+
+logger = logging.getLogger(__name__)
+
+WINNERS = [None, "好人阵营", "狼人阵营"]
+ROLES = list(Role)
+PHASES = list(Phase)
+PHASE_CODES = {phase: i for i, phase in enumerate(PHASES)}
+# 记录的决策类型，编号即decisions.col中的kind
+DECISIONS = ["KILL", "RESURRECTION", "CHECK", "VOTE", "CONVERSATION"]
+DECISION_CODES = {etype: i for i, etype in enumerate(DECISIONS)}
+# calls.col中的kind：智能体的行动/投票决策、智能体发言、人类玩家的决策
+CALL_KINDS = ["act", "speak", "human"]
+CALL_CODES = {kind: i for i, kind in enumerate(CALL_KINDS)}
+ROLE_CODES = {role.value: i for i, role in enumerate(ROLES)}
+
+GAME_DTYPE = np.dtype([
+    ("finished", "<f8"),
+    ("log_offset", "<u8"), ("log_size", "<u4"),
+    ("decision_start", "<u8"), ("decision_count", "<u4"),
+    ("call_start", "<u8"), ("call_count", "<u4"),
+    ("winner", "u1"), ("days", "<u2"), ("seats", "u1"), ("steps", "<u4"),
+    ("model", "S32"),
+    # 每种角色和人类玩家的座位掩码，第n位表示座位n
+    *[(role.value, "<u4") for role in ROLES],
+    ("human", "<u4"),
+])
+DECISION_DTYPE = np.dtype([("game", "<u4"), ("day", "<u2"), ("phase", "u1"), ("kind", "u1"),
+                           ("source", "u1"), ("target", "u1"), ("human", "u1")])
+CALL_DTYPE = np.dtype([("game", "<u4"), ("day", "<u2"), ("phase", "u1"), ("kind", "u1"), ("seat", "u1"),
+                       ("role", "u1"), ("ok", "u1"), ("latency", "<f4"), ("prompt_tokens", "<u4"),
+                       ("completion_tokens", "<u4")])
+LENGTH = struct.Struct("<I")
+ROW = np.dtype("<u4")
+
+_current: ContextVar[Optional["GameRecord"]] = ContextVar("game_record", default=None)
+
+
+def current() -> Optional["GameRecord"]:
+    return _current.get()
+
+
+def activate(record: Optional["GameRecord"]):
+    """在当前任务中启用record；之后创建的子任务继承同一个record"""
+    _current.set(record)
+
+
+class GameRecord:
+    """一局游戏进行中的决策和LLM调用，引擎重新启动时继续写入同一个记录"""
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.decisions: List[tuple] = []
+        self.calls: List[tuple] = []
+
+    def decision(self, event, human: bool):
+        """event为引擎处理的决策事件（DECISIONS中的类型）"""
+        self.decisions.append((event.day, event.phase, event.etype, event.source, event.target,
+                               getattr(event, "reason", None), getattr(event, "content", None), human))
+
+    def call(self, role: str, phase: str, day: int, kind: str, seat: int, latency: float,
+             prompt_tokens: int = 0, completion_tokens: int = 0, ok: bool = True):
+        self.calls.append((day, phase, kind, seat, role, ok, latency, prompt_tokens, completion_tokens))
+
+
+def _mask(seats) -> int:
+    mask = 0
+    for seat in seats:
+        mask |= 1 << seat
+    return mask
+
+
+def _postings(games: np.ndarray, first: int = 0) -> Dict[str, np.ndarray]:
+    """games（从第first行开始）的索引：键 -> 递增的行号；模型名按十六进制写入键，可以作为文件名"""
+    rows = np.arange(first, first + len(games), dtype=ROW)
+    postings = {}
+    for field in ("winner", "days", "seats", "model"):
+        column = games[field]
+        for value in np.unique(column):
+            postings[f"{field}={value.hex() if field == 'model' else int(value)}"] = rows[column == value]
+    for role in ROLES:
+        masks = games[role.value]
+        for seat in range(int(np.bitwise_or.reduce(masks, initial=0)).bit_length()):
+            has = (masks >> seat & 1).astype(bool)
+            if has.any():
+                postings[f"{role.value}={seat}"] = rows[has]
+    return postings
+
+
+def _cut(rows: np.ndarray, n_games: int) -> np.ndarray:
+    """去掉未完成写入的行号，索引文件中的行号递增"""
+    if len(rows) and rows[-1] >= n_games:
+        return rows[:np.searchsorted(rows, n_games)]
+    return rows
+
+
+def build(game_id: str, game_state: GameState, record: GameRecord, model: str) -> Dict[str, Any]:
+    """一局已结束游戏的归档记录"""
+    calls = record.calls
+    llm = [c for c in calls if c[2] != "human"]
+    return {
+        "game_id": game_id,
+        "finished": time.time(),
+        "model": model,
+        "winner": game_state.winner,
+        "days": game_state.day,
+        "steps": game_state.step,
+        "roles": {str(p.id): p.role.value for p in game_state.players},
+        "human_seats": game_state.human_seats,
+        "alive": game_state.alive_players,
+        "decisions": [
+            {"day": day, "phase": Phase(phase).value, "etype": etype, "source": source, "target": target,
+             "reason": reason, "content": content, "human": human}
+            for day, phase, etype, source, target, reason, content, human in record.decisions
+        ],
+        "llm": {
+            "calls": len(llm),
+            "errors": sum(1 for c in llm if not c[5]),
+            "latency": sum(c[6] for c in llm),
+            "prompt_tokens": sum(c[7] for c in llm),
+            "completion_tokens": sum(c[8] for c in llm),
+        },
+        # 列文件的内容，写入时转换为数组，不写入JSON
+        "_calls": calls,
+    }
+
+
+def _lock(file):
+    """跨进程的排他文件锁：Windows上用msvcrt锁住第一个字节，其他平台用flock"""
+    if os.name == "nt":
+        import msvcrt
+        file.seek(0)
+        while True:
+            # LK_LOCK重试10秒后抛出OSError，其他worker的写入更久时继续等待
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    import fcntl
+    fcntl.flock(file, fcntl.LOCK_EX)
+
+
+def _unlock(file):
+    if os.name == "nt":
+        import msvcrt
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    import fcntl
+    fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class Archive:
+    """
+    path目录下的游戏归档。finish()只把记录放入队列，后台任务批量写入；
+    队列中超过max_pending条记录时丢弃新的记录并计数。
+    """
+
+    def __init__(self, path: str = "cache/archive", model: str = "", max_pending: int = 10000,
+                 keep: int = 1000):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.max_pending = max_pending
+        self.keep = keep
+        self.records: "OrderedDict[str, GameRecord]" = OrderedDict()
+        self.queue: List[Dict[str, Any]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def recorder(self, game_id: str) -> GameRecord:
+        """同一局游戏重新启动引擎时继续写入原来的记录；只保留最近keep局未结束的游戏"""
+        record = self.records.get(game_id)
+        if record is None:
+            record = self.records[game_id] = GameRecord(game_id)
+            while len(self.records) > self.keep:
+                self.records.popitem(last=False)
+        return record
+
+    def discard(self, game_id: str):
+        self.records.pop(game_id, None)
+
+    def finish(self, game_id: str, game_state: GameState):
+        record = self.records.pop(game_id, None) or GameRecord(game_id)
+        if len(self.queue) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.queue.append(build(game_id, game_state, record, self.model))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # 写入期间结束的游戏在下一批中一起写入，队列为空时任务结束
+        while self.queue:
+            batch, self.queue = self.queue, []
+            try:
+                await asyncio.to_thread(self.write, batch)
+                self.written += len(batch)
+            except Exception:
+                self.errors += 1
+                logger.exception("archive write failed, %d games lost", len(batch))
+
+    async def close(self):
+        """等待队列中的记录写完"""
+        if self.task is not None:
+            await self.task
+            self.task = None
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    def write(self, batch: List[Dict[str, Any]]):
+        """同步写入一批记录，持有目录的文件锁"""
+        with open(self._file("lock"), "a") as lock:
+            _lock(lock)
+            try:
+                self._append(batch)
+            finally:
+                _unlock(lock)
+
+    def _append(self, batch: List[Dict[str, Any]]):
+        games_path = self._file("games.col")
+        n_games = games_path.stat().st_size // GAME_DTYPE.itemsize if games_path.exists() else 0
+        log_offset = decision_start = call_start = 0
+        if n_games:
+            last = np.fromfile(games_path, dtype=GAME_DTYPE, count=1, offset=(n_games - 1) * GAME_DTYPE.itemsize)[0]
+            log_offset = int(last["log_offset"]) + int(last["log_size"])
+            decision_start = int(last["decision_start"]) + int(last["decision_count"])
+            call_start = int(last["call_start"]) + int(last["call_count"])
+        # 截掉上次写入中途崩溃留下的尾部，之后的偏移量都从最后一局完整写入的位置开始
+        for name, size in (("games.log", log_offset), ("decisions.col", decision_start * DECISION_DTYPE.itemsize),
+                           ("calls.col", call_start * CALL_DTYPE.itemsize),
+                           ("games.col", n_games * GAME_DTYPE.itemsize)):
+            path = self._file(name)
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+        index = self._index(n_games)
+
+        logs, games, decisions, calls = [], [], [], []
+        for game, data in enumerate(batch, n_games):
+            calls_data = data.pop("_calls")
+            payload = orjson.dumps(data)
+            logs.append(LENGTH.pack(len(payload)) + payload)
+            decisions += [(game, d["day"], PHASE_CODES[d["phase"]], DECISION_CODES[d["etype"]], d["source"],
+                           max(d["target"] or 0, 0), d["human"]) for d in data["decisions"]]
+            calls += [(game, day, PHASE_CODES[phase], CALL_CODES[kind], seat, ROLE_CODES[role], ok, latency,
+                       prompt, completion)
+                      for day, phase, kind, seat, role, ok, latency, prompt, completion in calls_data]
+            roles = {role: [] for role in ROLES}
+            for seat, role in data["roles"].items():
+                roles[Role(role)].append(int(seat))
+            games.append((data["finished"], log_offset, len(logs[-1]),
+                          decision_start, len(data["decisions"]), call_start, len(calls_data),
+                          WINNERS.index(data["winner"]), data["days"], len(data["roles"]), data["steps"],
+                          data["model"].encode()[:32], *[_mask(roles[role]) for role in ROLES],
+                          _mask(data["human_seats"])))
+            log_offset += len(logs[-1])
+            decision_start += len(data["decisions"])
+            call_start += len(calls_data)
+
+        # games.col最后写入，它的一行表示这一局已经完整写入
+        games = np.array(games, dtype=GAME_DTYPE)
+        with open(self._file("games.log"), "ab") as f:
+            f.write(b"".join(logs))
+        with open(self._file("decisions.col"), "ab") as f:
+            np.array(decisions, dtype=DECISION_DTYPE).tofile(f)
+        with open(self._file("calls.col"), "ab") as f:
+            np.array(calls, dtype=CALL_DTYPE).tofile(f)
+        _write_postings(index, _postings(games, n_games))
+        with open(games_path, "ab") as f:
+            games.tofile(f)
+
+    def _index(self, n_games: int) -> Path:
+        """
+        索引目录，截掉各索引文件中不小于n_games的行号；每个文件只读最后一个行号，每批写入的开销与键的数量成正比。
+        没有索引目录的旧归档先由games.col一次性建立索引，在临时目录中写完再改名
+        """
+        index = self._file("index")
+        if not index.exists():
+            tmp = self._file("index.tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir()
+            if n_games:
+                games = np.fromfile(self._file("games.col"), dtype=GAME_DTYPE, count=n_games)
+                _write_postings(tmp, _postings(games))
+            os.replace(tmp, index)
+            return index
+        for path in index.glob("*.idx"):
+            size = path.stat().st_size // ROW.itemsize
+            if size and np.fromfile(path, dtype=ROW, count=1, offset=(size - 1) * ROW.itemsize)[0] >= n_games:
+                rows = _cut(np.fromfile(path, dtype=ROW, count=size), n_games)
+                os.truncate(path, len(rows) * ROW.itemsize)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self.queue), "written": self.written, "dropped": self.dropped,
+                "errors": self.errors, "recording": len(self.records)}
+
+
+def _write_postings(index: Path, postings: Dict[str, np.ndarray]):
+    for key, rows in postings.items():
+        with open(index / f"{key}.idx", "ab") as f:
+            rows.tofile(f)
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """多个区间[start, start+count)拼接起来的下标"""
+    counts = counts.astype(np.int64)
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    return np.repeat(starts.astype(np.int64) - (ends - counts), counts) + np.arange(total)
+
+
+class Columns:
+    """
+    归档的列：games每局一行，decisions和calls的game列是games中的行号；
+    每局的决策和调用是连续的，位置为games中的decision_start/decision_count和call_start/call_count
+    """
+
+    def __init__(self, games: np.ndarray, decisions: np.ndarray, calls: np.ndarray):
+        self.games = games
+        self.decisions = decisions
+        self.calls = calls
+
+    def select(self, rows: np.ndarray) -> "Columns":
+        """只保留rows（递增的games行号）选中的游戏，按偏移量取出它们的决策和调用，行号和偏移量重新编排"""
+        # 结构化数组用np.take取行，比花式索引快一个数量级
+        games = np.take(self.games, rows)
+        game = np.arange(len(games), dtype=np.uint32)
+        columns = {}
+        for name, start, count in (("decisions", "decision_start", "decision_count"),
+                                   ("calls", "call_start", "call_count")):
+            counts = games[count]
+            data = np.take(getattr(self, name), _ranges(games[start], counts))
+            data["game"] = np.repeat(game, counts)
+            games[start] = np.cumsum(counts) - counts
+            columns[name] = data
+        return Columns(games, columns["decisions"], columns["calls"])
+
+
+def read(path: str) -> Columns:
+    """
+    读取归档的列，忽略写入中途崩溃留下的不完整部分。
+    decisions和calls是内存映射，select只读取选中游戏所在的页
+    """
+    path = Path(path)
+    games_path = path / "games.col"
+    if not games_path.exists():
+        return Columns(np.zeros(0, GAME_DTYPE), np.zeros(0, DECISION_DTYPE), np.zeros(0, CALL_DTYPE))
+    games = np.fromfile(games_path, dtype=GAME_DTYPE, count=games_path.stat().st_size // GAME_DTYPE.itemsize)
+    if not len(games):
+        return Columns(games, np.zeros(0, DECISION_DTYPE), np.zeros(0, CALL_DTYPE))
+    last = games[-1]
+    columns = []
+    for name, dtype, count in (("decisions.col", DECISION_DTYPE, last["decision_start"] + last["decision_count"]),
+                               ("calls.col", CALL_DTYPE, last["call_start"] + last["call_count"])):
+        count = int(count)
+        columns.append(np.memmap(path / name, dtype=dtype, mode="r", shape=(count,)) if count
+                       else np.zeros(0, dtype))
+    return Columns(games, *columns)
+
+
+class Index:
+    """
+    games的倒排索引：键（"字段=值"）-> 递增的行号数组。
+    open()读取归档目录中由Archive._append维护的索引文件，只在查询用到某个键时读取它；
+    build()由games数组在内存中建立（需要扫描全部行），用于没有索引文件的列，如基准中复制出来的列
+    """
+
+    def __init__(self, n_games: int, keys: List[str], load: Callable[[str], np.ndarray]):
+        self.n_games = n_games
+        self.keys = keys
+        self.load = load
+        self.cache: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, path: str, n_games: int) -> "Index":
+        index = Path(path) / "index"
+        if not index.exists():
+            return cls.build(read(path).games[:n_games])
+        keys = [file.stem for file in index.glob("*.idx")]
+        return cls(n_games, keys, lambda key: _cut(np.fromfile(index / f"{key}.idx", dtype=ROW), n_games))
+
+    @classmethod
+    def build(cls, games: np.ndarray) -> "Index":
+        postings = _postings(games)
+        return cls(len(games), list(postings), postings.__getitem__)
+
+    def rows(self, field: str, value) -> np.ndarray:
+        key = f"{field}={value}"
+        if key not in self.cache:
+            self.cache[key] = self.load(key) if key in self.keys else np.zeros(0, ROW)
+        return self.cache[key]
+
+    def union(self, field: str, accept: Callable[[int], bool]) -> np.ndarray:
+        """field的整数值满足accept的所有行；天数等每局只有一个值的字段各值的行不重叠，排序即可"""
+        prefix = f"{field}="
+        values = [int(key[len(prefix):]) for key in self.keys if key.startswith(prefix)]
+        arrays = [self.rows(field, value) for value in values if accept(value)]
+        if not arrays:
+            return np.zeros(0, ROW)
+        rows = np.concatenate(arrays)
+        return np.unique(rows) if field in ROLE_CODES else np.sort(rows)
+
+
+def _intersect(rows: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """两个递增行号数组的交集，在较长的other中二分查找rows的每个元素"""
+    pos = np.searchsorted(other, rows)
+    found = pos < len(other)
+    found[found] = other[pos[found]] == rows[found]
+    return rows[found]
+
+
+def where(index: Index, role: Optional[str] = None, seat: Optional[int] = None, winner: Optional[str] = None,
+          model: Optional[str] = None, min_days: Optional[int] = None, max_days: Optional[int] = None) -> np.ndarray:
+    """
+    按条件过滤，返回递增的games行号：role和seat同时给出时为该座位是该角色的游戏，
+    只给出role时为有该角色的游戏，只给出seat时为有该座位的游戏。
+    每个条件取出一个行号数组，从最短的开始依次求交集，开销与条件匹配的行数成正比，与归档的总局数无关
+    """
+    candidates = []
+    if role is not None:
+        role = Role(role).value
+        candidates.append(index.rows(role, seat) if seat is not None else index.union(role, lambda _: True))
+    elif seat is not None:
+        candidates.append(index.union("seats", lambda seats: seats >= seat))
+    if winner is not None:
+        candidates.append(index.rows("winner", WINNERS.index(winner)))
+    if model is not None:
+        candidates.append(index.rows("model", model.encode()[:32].hex()))
+    if min_days is not None or max_days is not None:
+        low = min_days if min_days is not None else 0
+        high = max_days if max_days is not None else np.inf
+        candidates.append(index.union("days", lambda days: low <= days <= high))
+    if not candidates:
+        return np.arange(index.n_games)
+    candidates.sort(key=len)
+    rows = candidates[0]
+    for other in candidates[1:]:
+        rows = _intersect(rows, other)
+    return rows
+
+
+def record(path: str, games: np.ndarray, row: int) -> Dict[str, Any]:
+    """读取games第row行对应的完整JSON记录"""
+    game = games[row]
+    with open(Path(path) / "games.log", "rb") as f:
+        f.seek(int(game["log_offset"]) + LENGTH.size)
+        return orjson.loads(f.read(int(game["log_size"]) - LENGTH.size))
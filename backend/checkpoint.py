@@ -0,0 +1,399 @@
+"""
+GameState的紧凑二进制检查点。
+
+每局游戏一个只追加的文件：
+    MAGIC(4字节) VERSION(1字节) 记录...
+    记录 = 类型(1字节) 长度(4字节，小端) 内容
+内容较大时用zlib压缩（类型的最高位为1）。
+第一条记录是完整状态（FULL），之后每条增量记录（DELTA）只包含自上一个检查点以来新增的历史事件，
+以及体积很小的标量、玩家和待处理事件。写入中途崩溃留下的不完整记录在恢复时被忽略。
+"""
+import asyncio
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.base import Phase, Role
+from backend.entity import Player, WitchPlayer
+from backend.events import Event, EVENT_TYPES, HISTORY_KINDS
+from backend.game_state import GameState
+from backend.scheduler import EventScheduler
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WWCK"
+VERSION = 6
+
+FULL = 1
+DELTA = 2
+# 记录类型的最高位表示内容经过zlib压缩
+COMPRESSED = 0x80
+COMPRESS_ABOVE = 1024
+RECORD = struct.Struct("<BI")
+
+PHASES = list(Phase)
+ROLES = list(Role)
+ETYPES = list(EVENT_TYPES)
+WINNERS = [None, "好人阵营", "狼人阵营"]
+# str枚举与其值的哈希相同，字符串形式的phase也能直接查到编号
+PHASE_CODES = {phase: i for i, phase in enumerate(PHASES)}
+ETYPE_CODES = {etype: i for i, etype in enumerate(ETYPES)}
+KIND_CODES = {kind: i for i, kind in enumerate(HISTORY_KINDS)}
+# 历史事件（PLAYER/SYSTEM）的字段，这类事件按列存储
+HISTORY_FIELDS = ["content", "kind", "seat"]
+# 每种事件除 etype/day/phase 以外的字段，按声明顺序编码
+FIELDS = {etype: list(cls.FIELDS) for etype, cls in EVENT_TYPES.items()}
+NONE, INT, STR = 0, 1, 2
+NO_DRUG = 255
+
+
+class Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def u8(self, value: int):
+        self.buf.append(value)
+
+    def varint(self, value: int):
+        # zigzag编码后按7位分组，负数同样紧凑
+        if 0 <= value < 64:
+            self.buf.append(value << 1)
+            return
+        value = (value << 1) ^ (value >> 63)
+        while value >= 0x80:
+            self.buf.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.buf.append(value)
+
+    def str(self, value: str):
+        data = value.encode("utf-8")
+        self.varint(len(data))
+        self.buf += data
+
+    def ints(self, values: List[int]):
+        self.varint(len(values))
+        for value in values:
+            self.varint(-1 if value is None else value)
+
+    def value(self, value):
+        if value.__class__ is str:
+            self.buf.append(STR)
+            self.str(value)
+        elif value is None:
+            self.buf.append(NONE)
+        elif isinstance(value, int):
+            self.buf.append(INT)
+            self.varint(value)
+        else:
+            self.buf.append(STR)
+            self.str(value.value if isinstance(value, Phase) else str(value))
+
+    def event(self, event: Event):
+        etype = event.etype
+        self.buf.append(ETYPE_CODES[etype])
+        self.varint(event.day)
+        self.buf.append(PHASE_CODES[event.phase])
+        for name in FIELDS[etype]:
+            self.value(getattr(event, name))
+
+
+    def history(self, events: List[Event]):
+        """
+        一段历史事件。历史中只有PLAYER/SYSTEM事件，按列存储：
+        etype、phase、kind、seat（没有座位为0）各一个字节数组，day（uint16）和content的字符数（uint32）为定长数组，
+        content拼接后整体编码一次。
+        """
+        self.varint(len(events))
+        if not all(FIELDS[e.etype] == HISTORY_FIELDS for e in events):
+            self.u8(0)
+            for event in events:
+                self.event(event)
+            return
+        self.u8(1)
+        self.buf += bytes(ETYPE_CODES[e.etype] for e in events)
+        self.buf += bytes(PHASE_CODES[e.phase] for e in events)
+        self.buf += bytes(KIND_CODES[e.kind] for e in events)
+        self.buf += bytes(e.seat or 0 for e in events)
+        contents = [e.content for e in events]
+        self.buf += struct.pack(f"<{len(events)}H", *[e.day for e in events])
+        self.buf += struct.pack(f"<{len(events)}I", *map(len, contents))
+        self.str("".join(contents))
+
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def u8(self) -> int:
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self) -> int:
+        shift = result = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        return (result >> 1) ^ -(result & 1)
+
+    def str(self) -> str:
+        size = self.varint()
+        value = str(self.data[self.pos:self.pos + size], "utf-8")
+        self.pos += size
+        return value
+
+    def ints(self) -> List[Optional[int]]:
+        return [None if v == -1 else v for v in (self.varint() for _ in range(self.varint()))]
+
+    def value(self):
+        tag = self.u8()
+        if tag == INT:
+            return self.varint()
+        if tag == STR:
+            return self.str()
+        return None
+
+    def event(self) -> Event:
+        etype = ETYPES[self.u8()]
+        values = {"day": self.varint(), "phase": PHASES[self.u8()]}
+        for name in FIELDS[etype]:
+            values[name] = self.value()
+        return EVENT_TYPES[etype](**values)
+
+
+    def history(self) -> List[Event]:
+        n = self.varint()
+        if not self.u8():
+            return [self.event() for _ in range(n)]
+        etypes = self.data[self.pos:self.pos + n]
+        phases = self.data[self.pos + n:self.pos + 2 * n]
+        kinds = self.data[self.pos + 2 * n:self.pos + 3 * n]
+        seats = self.data[self.pos + 3 * n:self.pos + 4 * n]
+        self.pos += 4 * n
+        days = struct.unpack_from(f"<{n}H", self.data, self.pos)
+        sizes = struct.unpack_from(f"<{n}I", self.data, self.pos + 2 * n)
+        self.pos += 6 * n
+        text = self.str()
+        events = []
+        start = 0
+        for etype, phase, kind, seat, day, size in zip(etypes, phases, kinds, seats, days, sizes):
+            events.append(EVENT_TYPES[ETYPES[etype]](day=day, phase=PHASES[phase], content=text[start:start + size],
+                                                     kind=HISTORY_KINDS[kind], seat=seat or None))
+            start += size
+        return events
+
+
+def _encode_state(w: Writer, game_state: GameState):
+    """除历史记录以外的所有状态，每个检查点都完整写入"""
+    w.u8(PHASE_CODES[game_state.phase])
+    w.varint(game_state.conversations)
+    w.varint(game_state.day)
+    w.u8(int(game_state.game_over))
+    w.u8(WINNERS.index(game_state.winner))
+    w.varint(game_state.step)
+    w.varint(game_state.out)
+    w.varint(game_state.frames)
+    for values in (game_state.votes, game_state.alive_players, game_state.just_killed,
+                   game_state.speak_order, game_state.act_order, game_state.human_seats):
+        w.ints(values)
+    w.varint(len(game_state.seat_tokens))
+    for seat, token in game_state.seat_tokens.items():
+        w.varint(seat)
+        w.str(token)
+    w.varint(len(game_state.players))
+    for p in game_state.players:
+        w.u8(p.id)
+        w.u8(ROLES.index(p.role))
+        w.u8(int(p.alive))
+        w.u8(p.good_drup if isinstance(p, WitchPlayer) else NO_DRUG)
+        w.u8(p.bad_drup if isinstance(p, WitchPlayer) else NO_DRUG)
+    w.varint(len(game_state.summaries))
+    for pid, days in game_state.summaries.items():
+        w.varint(pid)
+        w.varint(len(days))
+        for day, text in days.items():
+            w.varint(day)
+            w.str(text)
+    entries = game_state.events.dump_entries()
+    w.varint(len(entries))
+    for priority, order, event in entries:
+        w.u8(priority)
+        w.varint(order)
+        w.event(event)
+
+
+def _decode_state(r: Reader) -> dict:
+    state = {
+        "phase": PHASES[r.u8()],
+        "conversations": r.varint(),
+        "day": r.varint(),
+        "game_over": bool(r.u8()),
+        "winner": WINNERS[r.u8()],
+        "step": r.varint(),
+        "out": r.varint(),
+        "frames": r.varint(),
+    }
+    for name in ("votes", "alive_players", "just_killed", "speak_order", "act_order", "human_seats"):
+        state[name] = r.ints()
+    state["seat_tokens"] = {r.varint(): r.str() for _ in range(r.varint())}
+    players = []
+    for _ in range(r.varint()):
+        pid, role, alive, good, bad = r.u8(), ROLES[r.u8()], bool(r.u8()), r.u8(), r.u8()
+        if good == NO_DRUG:
+            players.append(Player(id=pid, name=f"玩家{pid}", role=role, alive=alive))
+        else:
+            players.append(WitchPlayer(id=pid, name=f"玩家{pid}", role=role, alive=alive,
+                                       good_drup=good, bad_drup=bad))
+    state["players"] = players
+    state["summaries"] = {r.varint(): {r.varint(): r.str() for _ in range(r.varint())} for _ in range(r.varint())}
+    state["events"] = EventScheduler.from_entries([(r.u8(), r.varint(), r.event()) for _ in range(r.varint())])
+    return state
+
+
+def encode(game_state: GameState, written: Optional[Dict[int, int]] = None) -> Tuple[int, bytes]:
+    """
+    编码一个检查点记录，返回 (记录类型, 内容)。
+    written为每个历史列表已写入的事件数时生成增量记录，只写入之后新增的事件；为None时生成完整记录。
+    """
+    w = Writer()
+    _encode_state(w, game_state)
+    w.varint(len(game_state.histories))
+    for pid, events in game_state.histories.items():
+        start = written.get(pid, 0) if written is not None else 0
+        w.varint(pid)
+        w.history(events[start:])
+    kind = FULL if written is None else DELTA
+    if len(w.buf) > COMPRESS_ABOVE:
+        return kind | COMPRESSED, zlib.compress(w.buf, 1)
+    return kind, bytes(w.buf)
+
+
+def decode(records: List[Tuple[int, bytes]]) -> GameState:
+    """从一个完整记录和之后的增量记录恢复GameState"""
+    histories: Dict[int, List[Event]] = {}
+    state = None
+    for kind, payload in records:
+        if kind & COMPRESSED:
+            kind, payload = kind & ~COMPRESSED, zlib.decompress(payload)
+        r = Reader(payload)
+        state = _decode_state(r)
+        if kind == FULL:
+            histories = {}
+        for _ in range(r.varint()):
+            pid = r.varint()
+            histories.setdefault(pid, []).extend(r.history())
+    if state is None:
+        raise ValueError("checkpoint has no records")
+    return GameState(**state, histories=histories)
+
+
+class Checkpointer:
+    """
+    在阶段切换时把游戏写入path目录下的检查点文件。
+    同一局游戏第一次写入完整记录，之后只追加增量记录；游戏结束后删除检查点。
+    记录在事件循环中编码（此后游戏状态继续变化），文件写入在线程中进行，同一局游戏的写入按顺序串行。
+    """
+
+    def __init__(self, path: str = "cache/checkpoints"):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # game_id -> {pid: (已写入的事件数, 最后写入的事件)}
+        self.written: Dict[str, Dict[int, Tuple[int, Optional[Event]]]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def _file(self, game_id: str) -> Path:
+        return self.path / f"{game_id}.ckpt"
+
+    @staticmethod
+    def _extends(game_state: GameState, written: Dict[int, Tuple[int, Optional[Event]]]) -> bool:
+        """game_state的每个历史列表是否以已写入的部分开头：长度不小于已写入的事件数，且该位置的事件相同"""
+        for pid, (n, last) in written.items():
+            events = game_state.histories.get(pid, ())
+            if len(events) < n or n and events[n - 1] != last:
+                return False
+        return True
+
+    async def save(self, game_id: str, game_state: GameState):
+        if game_state.game_over:
+            self.discard(game_id)
+            return
+        lock = self.locks.setdefault(game_id, asyncio.Lock())
+        async with lock:
+            path = self._file(game_id)
+            previous = self.written.get(game_id)
+            # 重置或从存储重新读取的游戏与已写入的记录对不上时，重新写入完整记录
+            incremental = previous is not None and self._extends(game_state, previous)
+            # 写入失败时下次重新写入完整记录
+            self.written.pop(game_id, None)
+            written = self._written(game_state)
+            if not incremental or not await asyncio.to_thread(
+                    self._append, path, encode(game_state, {pid: n for pid, (n, _) in previous.items()})):
+                written = self._written(game_state)
+                await asyncio.to_thread(self._replace, path, encode(game_state))
+            self.written[game_id] = written
+
+    @staticmethod
+    def _written(game_state: GameState) -> Dict[int, Tuple[int, Optional[Event]]]:
+        return {pid: (len(events), events[-1] if events else None) for pid, events in game_state.histories.items()}
+
+    @staticmethod
+    def _append(path: Path, record: Tuple[int, bytes]) -> bool:
+        """追加增量记录；检查点文件已被删除时返回False"""
+        if not path.exists():
+            return False
+        kind, payload = record
+        with open(path, "ab") as f:
+            f.write(RECORD.pack(kind, len(payload)) + payload)
+        return True
+
+    @staticmethod
+    def _replace(path: Path, record: Tuple[int, bytes]):
+        kind, payload = record
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + bytes([VERSION]) + RECORD.pack(kind, len(payload)) + payload)
+        os.replace(tmp, path)
+
+    def discard(self, game_id: str):
+        self.written.pop(game_id, None)
+        lock = self.locks.get(game_id)
+        if lock is not None and not lock.locked():
+            del self.locks[game_id]
+        self._file(game_id).unlink(missing_ok=True)
+
+    @staticmethod
+    def read(path: Path) -> GameState:
+        data = path.read_bytes()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint")
+        if data[4] != VERSION:
+            raise ValueError(f"{path} has unsupported checkpoint version {data[4]}")
+        records = []
+        pos = 5
+        while pos + RECORD.size <= len(data):
+            kind, size = RECORD.unpack_from(data, pos)
+            pos += RECORD.size
+            if pos + size > len(data):
+                # 写入中途崩溃留下的不完整记录
+                break
+            records.append((kind, data[pos:pos + size]))
+            pos += size
+        return decode(records)
+
+    def restore(self) -> Iterator[Tuple[str, GameState]]:
+        """读取所有未结束游戏的最近检查点；恢复的游戏下次保存时会重新写入完整记录"""
+        for path in sorted(self.path.glob("*.ckpt")):
+            try:
+                game_state = self.read(path)
+            except Exception:
+                logger.exception("skip checkpoint %s", path.name)
+                continue
+            yield path.stem, game_state
@@ -0,0 +1,11 @@
+import toml
+from pathlib import Path
+
+CONFIG = Path(__file__).parent.parent / 'config.toml'
+
+config = toml.load(CONFIG)
+
+
+def section(name: str) -> dict:
+    """读取config.toml中的某个配置段，不存在时返回空字典"""
+    return config.get(name, {})
@@ -0,0 +1,629 @@
+import asyncio
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from pydantic import ValidationError
+
+from backend.game_state import GameState
+from backend.memory import Summarizer
+from backend import archive, tracing
+from backend.base import Role, Phase
+from backend.events import (
+    Event,
+    AllowActEvent,
+    ConversationEvent,
+    ResurrectionEvent,
+    KillEvent,
+    CheckEvent,
+    VoteEvent,
+    INPUT_MODELS,
+    validate_input
+)
+from backend.streaming import coalesce
+from backend.outcomes import (
+    Outcome,
+    DisplayOutcome,
+    SpeakOutcome,
+    ActOutcome,
+    ConversationOutcome,
+    UserSpeakOutcome,
+    VotingOutcome,
+    FinishOutcome,
+    ParkedOutcome
+)
+
+logger = logging.getLogger(__name__)
+
+ROLE_NAMES = {
+    Role.WEREWOLF: '狼人',
+    Role.WITCH: '女巫',
+    Role.SEER: '预言家',
+    Role.VILLAGER: '平民'
+}
+
+
+# 夜晚行动不依赖其他角色结果的角色：预言家查验与狼人刀人无关，女巫需要知道谁被杀所以必须等待
+INDEPENDENT_NIGHT_ROLES = frozenset({Role.SEER})
+
+
+class Parked(Exception):
+    """人类玩家连续多次超时，游戏暂停"""
+
+
+class TurnStats:
+    """人类回合的超时、代为决策和暂停次数，可在多局游戏间共享"""
+
+    def __init__(self):
+        self.timeouts = Counter()
+        self.autopilot = Counter()
+        self.parked = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"timeouts": dict(self.timeouts), "autopilot": dict(self.autopilot), "parked": self.parked}
+
+
+class InputSource(ABC):
+    """人类玩家输入来源"""
+
+    human_seats: frozenset = frozenset()
+    # 每种回合（act/speak/vote）的等待时限（秒），未配置或为0表示一直等待
+    deadlines: Dict[str, float] = {}
+    # 连续超时多少次后暂停游戏，0表示从不暂停
+    park_after: int = 0
+    # 当前连续超时的次数
+    idle: int = 0
+    stats: Optional[TurnStats] = None
+    # 是否正在等待人类玩家的决策
+    blocked: bool = False
+
+    def is_human(self, pid: int) -> bool:
+        return pid in self.human_seats
+
+    def expect(self, pid: int):
+        """即将向玩家pid发出询问，从此刻起收到的该座位的决策有效"""
+
+    @abstractmethod
+    async def wait(self, game_state: GameState, pid: int, action: str = "act") -> bool:
+        """阻塞直到玩家pid的决策已写入game_state；超过action对应的时限时返回False"""
+
+    def close(self):
+        """游戏结束或连接断开时释放资源"""
+
+
+class AIInputSource(InputSource):
+    """所有座位都由智能体控制，用于无界面模拟"""
+
+    async def wait(self, game_state: GameState, pid: int, action: str = "act") -> bool:
+        raise RuntimeError(f"玩家{pid}不是人类玩家")
+
+
+class EventInputSource(InputSource):
+    """通过asyncio.Event等待/game/send写入的人类决策"""
+
+    def __init__(self, event: asyncio.Event, human_seats: Iterable[int] = (6,),
+                 deadlines: Optional[Dict[str, float]] = None, park_after: int = 0,
+                 stats: Optional[TurnStats] = None):
+        self.event = event
+        self.human_seats = frozenset(human_seats)
+        self.deadlines = deadlines or {}
+        self.park_after = park_after
+        self.stats = stats
+        # 超时或已经收到决策后，到下一次expect之前收到的决策已经过期或重复，不再写入
+        self.accepting = True
+        # 正在等待决策的座位，其他人类座位此时提交的决策不是他们的回合
+        self.waiting: Optional[int] = None
+        self.expected = False
+
+    def expect(self, pid: int):
+        self.accepting = True
+        self.waiting = pid
+        self.expected = True
+        self.event.clear()
+
+    async def wait(self, game_state: GameState, pid: int, action: str = "act") -> bool:
+        # 询问发出后、开始等待前收到的决策同样有效
+        if not self.expected or self.waiting != pid:
+            self.expect(pid)
+        self.expected = False
+        self.blocked = True
+        start = time.perf_counter()
+        with tracing.span("human " + action, "human", tid=pid, day=game_state.day) as args:
+            try:
+                await asyncio.wait_for(self.event.wait(), self.deadlines.get(action) or None)
+            except asyncio.TimeoutError:
+                self.accepting = False
+                args["timeout"] = True
+                return False
+            else:
+                self.accepting = False
+            finally:
+                self.blocked = False
+                record = archive.current()
+                if record is not None:
+                    record.call(game_state.players[pid - 1].role.value, Phase(game_state.phase).value,
+                                game_state.day, "human", pid, time.perf_counter() - start,
+                                ok=not args.get("timeout"))
+        return True
+
+
+class ChannelInputSource(EventInputSource):
+    """
+    从跨进程通知通道接收/game/send转发的人类决策，收到后立即写入game_state并唤醒等待中的游戏，
+    /game/send可以由任意一个worker处理。
+    """
+
+    def __init__(self, channel, game_id: str, game_state: GameState, human_seats: Iterable[int] = (6,), **options):
+        super().__init__(asyncio.Event(), human_seats, **options)
+        self.channel = channel
+        self.game_id = game_id
+        self.game_state = game_state
+        # 游戏被重置后，这个连接上的旧游戏不再写回存储
+        self.detached = False
+        # 监听通道时发生的意外错误，之后的等待会抛出它而不是一直等下去
+        self.error: Optional[BaseException] = None
+        # 在构造时订阅，之后发布的输入都不会漏掉
+        self.messages = channel.subscribe(game_id)
+        self.task = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        try:
+            async for message in self.messages:
+                self._receive(message)
+        except Exception as e:
+            logger.exception("game %s: input listener stopped", self.game_id)
+            self.error = e
+            self.event.set()
+
+    def _receive(self, message: Dict[str, Any]):
+        if message["etype"] == "JOIN":
+            # 在其他worker上加入的座位，这里写回存储时不能丢掉它的令牌
+            self.game_state.seat_tokens[message["source"]] = message["token"]
+            return
+        if message["etype"] not in ("RESET", "END") and (not self.accepting or self.waiting is None
+                                                          or input_seat(self.game_state, message) != self.waiting):
+            logger.info("game %s: ignore expired input from seat %s: %s", self.game_id,
+                        message.get("source"), message["etype"])
+            return
+        if message["etype"] == "RESET":
+            self.detached = True
+            self.game_state.game_over = True
+        elif message["etype"] == "END":
+            self.game_state.game_over = True
+        else:
+            try:
+                apply_input(self.game_state, message)
+            except (ValueError, ValidationError) as e:
+                # /game/send已经校验过，这里只可能是阶段在转发途中发生了变化
+                logger.warning("game %s: reject input from seat %s: %s", self.game_id, message.get("source"), e)
+                return
+            # 这一回合的决策已经写入，同一座位再次提交的决策在下一次expect之前都被忽略
+            self.accepting = False
+        self.event.set()
+
+    async def wait(self, game_state: GameState, pid: int, action: str = "act") -> bool:
+        self._check()
+        result = await super().wait(game_state, pid, action)
+        self._check()
+        return result
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError(f"game {self.game_id}: input channel failed") from self.error
+
+    def close(self):
+        self.task.cancel()
+
+
+def input_seat(game_state: GameState, event: Dict[str, Any]) -> Optional[int]:
+    """决策所属的座位，未提交source时为第一个人类座位；没有人类座位时为None"""
+    seat = event.get("source")
+    if seat is None and game_state.human_seats:
+        seat = game_state.human_seats[0]
+    return seat
+
+
+def parse_input(game_state: GameState, event: Dict[str, Any]) -> Optional[Event]:
+    """
+    校验/game/send提交的人类决策，返回需要加入调度器的事件；NONE和SPEAK只记录历史，返回None。
+    类型未知或座位不是人类玩家时抛出ValueError，字段不合法时抛出pydantic的ValidationError。
+    """
+    seat = input_seat(game_state, event)
+    if seat is None:
+        raise ValueError("这局游戏没有人类玩家")
+    if seat not in game_state.human_seats:
+        raise ValueError(f"玩家{seat}不是人类玩家")
+    if event["etype"] in ("NONE", "SPEAK"):
+        return None
+    if event["etype"] not in INPUT_MODELS:
+        raise ValueError(f"Invalid event type: {event['etype']}")
+    if event["etype"] == "CONVERSATION":
+        return validate_input(dict(event, day=game_state.day, phase=game_state.phase,
+                                   count=game_state.conversations))
+    return validate_input(dict(event, day=game_state.day, phase=game_state.phase))
+
+
+def apply_input(game_state: GameState, event: Dict[str, Any]):
+    """把人类玩家的决策写入game_state"""
+    seat = input_seat(game_state, event)
+    if event["etype"] == "NONE":
+        game_state.add_system_history(content=f"玩家{seat}什么也没有做", kind="none", seat=seat)
+        game_state.add_player_history(seat, content="我什么也没有做", kind="none", seat=seat)
+    elif event["etype"] == "SPEAK":
+        game_state.add_system_history(f"玩家{seat}说：{event['content']}", kind="speak", seat=seat)
+        game_state.add_player_history(seat, content=f"我说：{event['content']}", kind="speak", seat=seat)
+    else:
+        game_state.add_event(parse_input(game_state, event))
+
+
+class Prefetcher:
+    """提前并发启动智能体决策，结果仍按事件出队的顺序应用到游戏状态"""
+
+    def __init__(self):
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def start(self, key: Hashable, factory: Callable[[], Awaitable]):
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.ensure_future(factory())
+
+    async def take(self, key: Hashable, factory: Callable[[], Awaitable]):
+        task = self.tasks.pop(key, None)
+        if task is None:
+            return await factory()
+        return await task
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+
+def _prefetch_night(game_state: GameState, agents: Dict[str, Any], input_source: InputSource, prefetcher: Prefetcher):
+    for pid in game_state.act_order:
+        player = game_state.players[pid - 1]
+        if player.role in INDEPENDENT_NIGHT_ROLES and not input_source.is_human(pid) \
+                and game_state.events.pending("ALLOW_ACT", pid):
+            agent = agents.get(player.role)
+            prefetcher.start(("ALLOW_ACT", pid), lambda agent=agent, player=player: agent.act(game_state, player))
+
+
+def _vote_factory(game_state: GameState, agents: Dict[str, Any], pid: int, semaphore: asyncio.Semaphore,
+                  history: Optional[str] = None):
+    """history为None时在获得信号量后读取玩家当时的历史"""
+    player = game_state.players[pid - 1]
+    agent = agents.get(player.role)
+
+    async def vote():
+        async with semaphore:
+            return await agent.vote(game_state, player, history)
+    return vote
+
+
+def _prefetch_votes(game_state: GameState, agents: Dict[str, Any], input_source: InputSource, prefetcher: Prefetcher,
+                    semaphore: asyncio.Semaphore):
+    # 所有智能体基于投票环节开始时的同一份历史投票，可以一次性并发发起。
+    # 历史在发起时读取，而不是在各任务获得信号量之后：否则先返回的投票写入历史后，
+    # 后面的投票者会看到它们，看到什么取决于LLM的返回顺序
+    voters = [pid for pid in game_state.speak_order
+              if not input_source.is_human(pid) and game_state.events.pending("ALLOW_VOTE", pid)
+              and ("ALLOW_VOTE", pid) not in prefetcher.tasks]
+    histories = {pid: game_state.get_history(pid) for pid in voters}
+    for pid in voters:
+        prefetcher.start(("ALLOW_VOTE", pid), _vote_factory(game_state, agents, pid, semaphore, histories[pid]))
+
+
+async def _human_turn(game_state: GameState, input_source: InputSource, pid: int, action: str,
+                      resume: Event) -> bool:
+    """
+    等待人类玩家决策。超时返回False，由该角色的智能体代为决策；
+    连续超时达到park_after次时把resume放回队首并暂停游戏，恢复后重新询问玩家。
+    """
+    if await input_source.wait(game_state, pid, action):
+        input_source.idle = 0
+        return True
+    input_source.idle += 1
+    stats = input_source.stats
+    if stats:
+        stats.timeouts[action] += 1
+    if input_source.park_after and input_source.idle >= input_source.park_after:
+        game_state.add_event(resume)
+        raise Parked()
+    if stats:
+        stats.autopilot[action] += 1
+    return False
+
+
+def _display(game_state: GameState, content: str, seat: Optional[int] = None) -> DisplayOutcome:
+    """seat不为None时只有该座位的玩家可见"""
+    return DisplayOutcome(content=content, day=game_state.day, phase=game_state.phase,
+                          alive=game_state.alive_players, seat=seat)
+
+
+def _alive_teammates(game_state: GameState, pid: int):
+    return [i for i in game_state.seats_of(Role.WEREWOLF, alive=True) if i != pid]
+
+
+async def run_game(game_state: GameState, agents: Dict[str, Any], input_source: InputSource,
+                   concurrent_night: bool = False, vote_concurrency: int = 1,
+                   speak_interval: float = 0.0, speak_bytes: int = 512,
+                   on_checkpoint: Optional[Callable[[GameState], Awaitable[None]]] = None,
+                   summarizer: Optional[Summarizer] = None,
+                   tracer: Optional[tracing.Tracer] = None,
+                   record: Optional[archive.GameRecord] = None) -> AsyncIterator[Outcome]:
+    """
+    驱动一局游戏直到结束，逐个产出结果记录。
+    concurrent_night为True时，夜晚相互独立的角色行动会与狼人行动并发请求LLM。
+    vote_concurrency大于1时，投票环节所有智能体的投票并发进行，最多同时vote_concurrency个请求；
+    投票结果仍按座位顺序生效。
+    speak_interval大于0时，智能体发言的分片按speak_interval秒的时间窗口和speak_bytes字节合并后再产出，
+    句末标点和结束标记FINISH立即产出。
+    on_checkpoint在每次PHASE_CHANGE/DAY_CHANGE处理完之后调用并等待完成，用于保存检查点。
+    人类玩家超过input_source的时限时由智能体代为决策，连续超时过多时产出ParkedOutcome并结束。
+    summarizer不为None时，每天结束后为存活的智能体玩家生成当天的摘要，之后的提示词用摘要代替原始记录；
+    llm模式的摘要在后台生成，当晚的第一个行动之前等待它们写入。
+    tracer不为None时记录每个事件的处理耗时及其中的LLM调用和人类等待，见backend.tracing。
+    record不为None时收集每个决策和每次LLM调用、人类决策的耗时，游戏结束后写入归档，见backend.archive。
+    """
+    tracing.activate(tracer)
+    archive.activate(record)
+    prefetcher = Prefetcher()
+    summaries: List[asyncio.Task] = []
+    semaphore = asyncio.Semaphore(max(vote_concurrency, 1))
+    game_state.parked = False
+    try:
+        async for outcome in _run_events(game_state, agents, input_source, prefetcher, concurrent_night,
+                                         vote_concurrency, semaphore, speak_interval, speak_bytes,
+                                         on_checkpoint, summarizer, summaries):
+            if tracer is None:
+                yield outcome
+            else:
+                with tracer.span("emit", "emit", type=type(outcome).__name__):
+                    yield outcome
+    except Parked:
+        game_state.parked = True
+        if input_source.stats:
+            input_source.stats.parked += 1
+        yield ParkedOutcome()
+    finally:
+        prefetcher.cancel()
+        for task in summaries:
+            task.cancel()
+        if tracer is not None:
+            tracer.finish()
+
+
+async def _run_events(game_state: GameState, agents: Dict[str, Any], input_source: InputSource,
+                      prefetcher: Prefetcher, concurrent_night: bool, vote_concurrency: int,
+                      semaphore: asyncio.Semaphore, speak_interval: float, speak_bytes: int,
+                      on_checkpoint: Optional[Callable[[GameState], Awaitable[None]]],
+                      summarizer: Optional[Summarizer], summaries: List[asyncio.Task]) -> AsyncIterator[Outcome]:
+    tracer = tracing.current()
+    record = archive.current()
+    while not game_state.game_over and game_state.day <= game_state.max_days \
+            and game_state.step < game_state.max_steps and game_state.events:
+        event = game_state.get_event()
+        if tracer is not None:
+            tracer.event(event.etype, seat=getattr(event, "source", getattr(event, "target", None)),
+                         target=getattr(event, "target", None), phase=Phase(game_state.phase).value,
+                         day=game_state.day)
+        if record is not None and event.etype in archive.DECISION_CODES:
+            record.decision(event, input_source.is_human(event.source))
+        if event.etype == "DISPLAY":
+            game_state.step += 1
+            yield _display(game_state, event.content)
+        elif event.etype == "ALLOW_ACT":
+            game_state.step += 1
+            if summaries:
+                # 当晚的第一个行动之前等待前一天的摘要写入，每个摘要最多summarizer.timeout秒，超时时退回extractive
+                with tracing.span("wait summaries", "memory", day=game_state.day):
+                    await asyncio.wait(summaries)
+                summaries.clear()
+            pid = event.target
+            player = game_state.players[pid - 1]
+            human = input_source.is_human(pid)
+            if human:
+                input_source.expect(pid)
+                if player.role == Role.WEREWOLF:
+                    tmp = _alive_teammates(game_state, pid)
+                    yield ActOutcome(day=game_state.day, phase=game_state.phase, seat=pid,
+                                     action=["conversation", "kill"],
+                                     # "KILL"操作对应的玩家ID列表，可以杀死自己
+                                     targets={"conversation": tmp,
+                                              "kill": [i for i in game_state.alive_players if i not in tmp]})
+                elif player.role == Role.WITCH:
+                    action = ["resurrection", "kill", "none"]
+                    targets = {"resurrection": game_state.just_killed,
+                               "kill": [i for i in game_state.alive_players if i != pid],
+                               "none": []}
+                    if player.good_drup == 0:
+                        del targets["resurrection"]
+                        action.remove("resurrection")
+                    if player.bad_drup == 0:
+                        del targets["kill"]
+                        action.remove("kill")
+                    yield ActOutcome(day=game_state.day, phase=game_state.phase, seat=pid,
+                                     action=action, targets=targets)
+                elif player.role == Role.SEER:
+                    yield ActOutcome(day=game_state.day, phase=game_state.phase, seat=pid,
+                                     action=["check"],
+                                     targets={"check": [i for i in game_state.alive_players if i != pid]})
+                human = await _human_turn(game_state, input_source, pid, "act", event)
+            if not human:
+                if concurrent_night:
+                    _prefetch_night(game_state, agents, input_source, prefetcher)
+                if player.role == Role.WEREWOLF:
+                    result = await agents["werewolf"].act(game_state, player, count=game_state.conversations)
+                    yield _display(game_state, "狼人正在行动")
+                    if result["action"] == "conversation":
+                        game_state.add_event(ConversationEvent(day=game_state.day, phase=game_state.phase,
+                                                               source=player.id, target=result["target"],
+                                                               content=result["content"],
+                                                               count=game_state.conversations))
+                    else:
+                        game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
+                                                       source=pid, target=result["target"]))
+                elif player.role == Role.WITCH:
+                    just_die = game_state.just_killed[0] if game_state.just_killed else None
+                    result = await agents["witch"].act(game_state, player, just_die)
+                    yield _display(game_state, "女巫正在行动")
+                    if result["action"] == "kill":
+                        game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
+                                                       source=pid, target=result["target"]))
+                    elif result["action"] == "resurrection":
+                        game_state.add_event(
+                            ResurrectionEvent(day=game_state.day, phase=game_state.phase, source=pid,
+                                              reason=result["reason"], target=result["target"]))
+                    else:
+                        game_state.add_system_history(content=f"玩家{player.id}选择什么也不做。理由是：{result.get('reason')}", kind="none", seat=player.id)
+                        game_state.add_player_history(player.id, content=f"我选择什么也不做理由是：{result.get('reason')}", kind="none", seat=player.id)
+                elif player.role == Role.SEER:
+                    result = await prefetcher.take(("ALLOW_ACT", pid), lambda: agents["seer"].act(game_state, player))
+                    yield _display(game_state, "预言家正在行动")
+                    game_state.add_event(CheckEvent(day=game_state.day, phase=game_state.phase, source=pid,
+                                                    target=result["target"], reason=result["reason"]))
+        elif event.etype == "CONVERSATION":
+            game_state.step += 1
+            sid = event.source
+            tid = event.target
+            player = game_state.players[tid - 1]
+            game_state.conversations += 1
+            game_state.add_system_history(content=f"玩家{sid}向玩家{tid}发送消息：{event.content}", kind="conversation", seat=sid)
+            game_state.add_player_history(sid, content=f"我向玩家{tid}发送消息：{event.content}", kind="conversation", seat=sid)
+            game_state.add_player_history(tid, content=f"玩家{sid}向我发送消息：{event.content}", kind="conversation", seat=sid)
+            human = input_source.is_human(tid)
+            if human:
+                input_source.expect(tid)
+                tmp = _alive_teammates(game_state, tid)
+                yield ConversationOutcome(content=f"玩家{sid}(你的队友)说：" + event.content + "\n请选择你的行动",
+                                          day=game_state.day, phase=game_state.phase, seat=tid, source=sid,
+                                          action=["conversation", "kill"] if tmp else ["kill"],
+                                          targets={"conversation": tmp,
+                                                   "kill": [i for i in game_state.alive_players if i not in tmp]})
+                # 对话不能重复处理，暂停后恢复时重新询问该玩家的夜晚行动
+                human = await _human_turn(game_state, input_source, tid, "act",
+                                          AllowActEvent(day=game_state.day, phase=game_state.phase, target=tid))
+            if not human:
+                result = await agents["werewolf"].act(game_state, player, count=game_state.conversations)
+                if result["action"] == "conversation":
+                    game_state.add_event(
+                        ConversationEvent(day=game_state.day, phase=game_state.phase,
+                                          source=player.id, target=result["target"],
+                                          content=result["content"], count=game_state.conversations))
+                else:
+                    game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
+                                                   source=tid, target=result["target"]))
+        elif event.etype == "KILL":
+            game_state.step += 1
+            sid = event.source
+            splayer = game_state.players[sid - 1]
+            tid = event.target
+            if splayer.role == Role.WEREWOLF:
+                # 狼人每晚只能杀一人，移除另一名狼人尚未处理的行动
+                wid = game_state.seats_of(Role.WEREWOLF)
+                for etype in ("ALLOW_ACT", "CONVERSATION", "KILL"):
+                    for w in wid:
+                        game_state.events.cancel(etype, w)
+            game_state.add_just_killed(tid, sid)
+            game_state.add_system_history(content=f"玩家{sid}杀死了玩家{tid},理由是：{event.reason}", kind="kill", seat=sid)
+            game_state.add_player_history(sid, content=f"我杀死了玩家{tid},理由是：{event.reason}", kind="kill", seat=sid)
+            if input_source.is_human(sid):
+                yield _display(game_state, f"你杀死了玩家{tid}", sid)
+            for hid in sorted(input_source.human_seats):
+                if game_state.players[hid - 1].role == Role.WEREWOLF and sid != hid:
+                    yield _display(game_state, f"你的队友玩家{sid}杀死了玩家{tid}", hid)
+        elif event.etype == "RESURRECTION":
+            game_state.step += 1
+            sid = event.source
+            tid = event.target
+            game_state.resurrection(tid, sid)
+            game_state.add_system_history(content=f"玩家{sid}复活了玩家{tid},理由是：{event.reason}", kind="resurrection", seat=sid)
+            game_state.add_player_history(sid, content=f"我复活了玩家{tid},理由是：{event.reason}", kind="resurrection", seat=sid)
+            if input_source.is_human(sid):
+                yield _display(game_state, f"你复活了玩家{tid}", sid)
+        elif event.etype == "CHECK":
+            game_state.step += 1
+            sid = event.source
+            tid = event.target
+            role = ROLE_NAMES[game_state.players[tid - 1].role]
+            game_state.add_system_history(content=f"玩家{sid}检查了玩家{tid}的身份，玩家{tid}的身份为{role},理由是：{event.reason}", kind="check", seat=sid)
+            game_state.add_player_history(sid, content=f"我检查了玩家{tid}的身份，玩家{tid}的身份为{role},理由是：{event.reason}", kind="check", seat=sid)
+            if input_source.is_human(sid):
+                yield _display(game_state, f"玩家{tid}的身份是{role}", sid)
+        elif event.etype == "PHASE_CHANGE":
+            game_state.step += 1
+            game_state.phase = event.change
+            if game_state.phase == Phase.DAY:
+                game_state.kill_player()
+                game_state.when_day_event()
+                tmp = (' | '.join([f'玩家{i}' for i in game_state.just_killed]) + '被杀死了') \
+                    if game_state.just_killed else '没有人死亡'
+                game_state.add_system_history(content=f"现在是白天,昨晚{tmp}")
+            elif game_state.phase == Phase.COUNT_VOTES:
+                game_state.set_out()
+                if game_state.check_game_over():
+                    game_state.game_over = True
+                    yield FinishOutcome(winner=game_state.winner)
+                game_state.when_count_vote_event()
+            if on_checkpoint:
+                await on_checkpoint(game_state)
+        elif event.etype == "ALLOW_SPEAK":
+            game_state.step += 1
+            pid = event.target
+            player = game_state.players[pid - 1]
+            human = input_source.is_human(pid)
+            if human:
+                input_source.expect(pid)
+                yield UserSpeakOutcome(day=game_state.day, phase=game_state.phase, seat=pid,
+                                       alive=game_state.alive_players)
+                human = await _human_turn(game_state, input_source, pid, "speak", event)
+            if not human:
+                agent = agents.get(player.role)
+                tmp = ""
+                mid = str(uuid.uuid4())
+                async for chunk in coalesce(agent.speak(game_state, player), speak_interval, speak_bytes):
+                    tmp += chunk
+                    yield SpeakOutcome(id=player.id, content=chunk, phase=game_state.phase,
+                                       day=game_state.day, mid=mid)
+                game_state.add_system_history(content=f"玩家{pid}发言：{tmp}", kind="speak", seat=pid)
+                game_state.add_player_history(pid, content=f"我的发言：{tmp}", kind="speak", seat=pid)
+        elif event.etype == "ALLOW_VOTE":
+            game_state.step += 1
+            pid = event.target
+            player = game_state.players[pid - 1]
+            if vote_concurrency > 1:
+                _prefetch_votes(game_state, agents, input_source, prefetcher, semaphore)
+            human = input_source.is_human(pid)
+            if human:
+                input_source.expect(pid)
+                yield VotingOutcome(day=game_state.day, phase=game_state.phase, seat=pid,
+                                    voting=game_state.alive_players, alive=game_state.alive_players)
+                human = await _human_turn(game_state, input_source, pid, "vote", event)
+            if not human:
+                result = await prefetcher.take(("ALLOW_VOTE", pid), _vote_factory(game_state, agents, pid, semaphore))
+                if result["action"] == "vote":
+                    game_state.add_event(
+                        VoteEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
+                                  source=player.id, target=result["target"]))
+        elif event.etype == "VOTE":
+            game_state.step += 1
+            sid = event.source
+            tid = event.target
+            game_state.vote(tid)
+            game_state.add_system_history(content=f"玩家{sid}投票给了玩家{tid},理由是：{event.reason}", kind="vote", seat=sid)
+            game_state.add_player_history(sid, content=f"我投票给了玩家{tid},理由是：{event.reason}", kind="vote", seat=sid)
+            if input_source.is_human(sid):
+                yield _display(game_state, f"你投票给了玩家{tid}", sid)
+            else:
+                yield _display(game_state, f"玩家{sid}投票给了玩家{tid}")
+        elif event.etype == "DAY_CHANGE":
+            if summarizer is not None:
+                summaries[:] = [task for task in summaries if not task.done()]
+                summaries.extend(summarizer.schedule(
+                    game_state, game_state.day,
+                    [pid for pid in game_state.alive_players if not input_source.is_human(pid)]))
+            game_state.next_day()
+            if on_checkpoint:
+                await on_checkpoint(game_state)
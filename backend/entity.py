@@ -1,16 +1,40 @@
-from pydantic import BaseModel
+from typing import Any, Dict
+
 from backend.base import Role
 
+# 同时接受Role和它的字符串值
+_ROLES = {role.value: role for role in Role}
 
-class Player(BaseModel):
-    id: int
-    name: str
-    role: Role
-    alive: bool = True
 
+class Player:
+    # 每次处理事件都要读取玩家属性，使用__slots__的普通对象，不经过pydantic
+    __slots__ = ("id", "name", "role", "alive")
 
-class WitchPlayer(Player):
-    good_drup: int = 1
-    bad_drup: int = 1
+    def __init__(self, id: int, name: str, role: Role, alive: bool = True):
+        self.id = id
+        self.name = name
+        self.role = _ROLES[role]
+        self.alive = alive
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name)
+                for cls in reversed(type(self).__mro__) for name in getattr(cls, "__slots__", ())}
+        data["role"] = self.role.value
+        return data
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
 
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+class WitchPlayer(Player):
+    __slots__ = ("good_drup", "bad_drup")
 
+    def __init__(self, id: int, name: str, role: Role, alive: bool = True, good_drup: int = 1, bad_drup: int = 1):
+        super().__init__(id, name, role, alive)
+        self.good_drup = good_drup
+        self.bad_drup = bad_drup
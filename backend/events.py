@@ -1,113 +1,253 @@
+from typing import Any, Dict, Optional
+
 from pydantic import BaseModel
 from backend.base import Phase
 
+# 同时接受Phase和它的字符串值
+_PHASES = {phase.value: phase for phase in Phase}
+
+
+class Event:
+    """
+    引擎内部的事件。每个阶段都要创建大量事件，因此是带__slots__的普通对象，构造时不做校验；
+    外部输入先由下面的pydantic模型校验，见validate_input。
+    """
+    __slots__ = ("day", "phase")
+    etype = "EVENT"
+    # day、phase之外的字段，按此顺序序列化，也是构造函数的参数顺序
+    FIELDS = ()
+
+    def __init__(self, day: int, phase: Phase):
+        self.day = day
+        self.phase = _PHASES[phase]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"etype": self.etype, "day": self.day, "phase": self.phase.value}
+        for name in self.FIELDS:
+            data[name] = getattr(self, name)
+        return data
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+class _ContentEvent(Event):
+    __slots__ = ("content",)
+    FIELDS = ("content",)
+
+    def __init__(self, day: int, phase: Phase, content: str):
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.content = content
 
-class Event(BaseModel):
-    etype: str
-    day: int
-    phase: Phase
 
+# 历史记录的事件类型，复盘按它过滤；公告等系统消息为announce，没有座位
+HISTORY_KINDS = ["speak", "conversation", "kill", "resurrection", "check", "vote", "none", "announce"]
+ANNOUNCE = "announce"
 
-class PlayerEvent(Event):
+
+class _HistoryEvent(_ContentEvent):
+    # 除文本外记录事件类型和行动的座位，由写入历史的引擎给出，复盘不需要解析文本
+    __slots__ = ("kind", "seat")
+    FIELDS = ("content", "kind", "seat")
+
+    def __init__(self, day: int, phase: Phase, content: str, kind: Optional[str] = ANNOUNCE,
+                 seat: Optional[int] = None):
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.content = content
+        self.kind = kind or ANNOUNCE
+        self.seat = seat
+
+
+class PlayerEvent(_HistoryEvent):
     # 用于记录玩家的历史信息
-    etype: str = "PLAYER"
-    content: str
+    __slots__ = ()
+    etype = "PLAYER"
 
 
-class SystemEvent(Event):
+class SystemEvent(_HistoryEvent):
     # 用于记录历史信息记录在在第几天，什么事件段，发生了什么时
-    etype: str = "SYSTEM"
-    content: str
+    __slots__ = ()
+    etype = "SYSTEM"
 
 
-class DisplayEvent(Event):
-    etype: str = "DISPLAY"
-    content: str
+class DisplayEvent(_ContentEvent):
+    __slots__ = ()
+    etype = "DISPLAY"
 
 
 class ConversationEvent(Event):
     # 用于狼人玩家交流
-    etype: str = "CONVERSATION"
-    source: int  # 制定事件玩家ID
-    target: int  # 玩家ID
-    content: str  # 交流内容
-    count: int  # 记录交流次数
+    __slots__ = ("source", "target", "content", "count")
+    etype = "CONVERSATION"
+    FIELDS = ("source", "target", "content", "count")
+
+    def __init__(self, day: int, phase: Phase, source: int, target: int, content: str, count: int):
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.source = source  # 制定事件玩家ID
+        self.target = target  # 玩家ID
+        self.content = content  # 交流内容
+        self.count = count  # 记录交流次数
 
     def to_string(self):
         return f"玩家{self.source}对玩家{self.target}说：{self.content}"
 
 
-class KillEvent(Event):
-    etype: str = "KILL"
-    source: int  # 制定事件玩家ID
-    target: int  # 玩家ID
-    reason: str = None
+class _ActionEvent(Event):
+    __slots__ = ("source", "target", "reason")
+    FIELDS = ("source", "target", "reason")
+
+    def __init__(self, day: int, phase: Phase, source: int, target: int, reason: Optional[str] = None):
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.source = source  # 制定事件玩家ID
+        self.target = target  # 玩家ID
+        self.reason = reason
+
+
+class KillEvent(_ActionEvent):
+    __slots__ = ()
+    etype = "KILL"
 
     def to_string(self):
         return f"玩家{self.source}杀死了玩家{self.target}。"
 
 
-class ResurrectionEvent(Event):
+class ResurrectionEvent(_ActionEvent):
     # 用于女巫玩家用药救人
-    etype: str = "RESURRECTION"
-    source: int  # 制定事件玩家ID
-    target: int  # 玩家ID
-    reason: str = None
+    __slots__ = ()
+    etype = "RESURRECTION"
 
     def to_string(self):
         return f"玩家{self.source}拯救了玩家{self.target}。"
 
 
-class CheckEvent(Event):
+class CheckEvent(_ActionEvent):
     # 用于预言家玩家验证玩家身份
-    etype: str = "CHECK"
-    source: int  # 制定事件玩家ID
-    target: int  # 玩家ID
-    reason: str = None
+    __slots__ = ()
+    etype = "CHECK"
 
     def to_string(self):
         return f"玩家{self.source}检查了玩家{self.target}的身份。"
 
 
-class VoteEvent(Event):
+class VoteEvent(_ActionEvent):
     # 用于玩家进行投票
-    etype: str = "VOTE"
-    source: int  # 制定事件玩家ID
-    target: int  # 玩家ID
-    reason: str = None
+    __slots__ = ()
+    etype = "VOTE"
 
     def to_string(self):
         return f"玩家{self.source}投票给了玩家{self.target}。"
 
 
-class AllowSpeakEvent(Event):
-    etype: str = "ALLOW_SPEAK"
-    target: int
+class _TargetEvent(Event):
+    __slots__ = ("target",)
+    FIELDS = ("target",)
 
+    def __init__(self, day: int, phase: Phase, target: int):
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.target = target
 
-class AllowActEvent(Event):
-    etype: str = "ALLOW_ACT"
-    target: int
+
+class AllowSpeakEvent(_TargetEvent):
+    __slots__ = ()
+    etype = "ALLOW_SPEAK"
+
+
+class AllowActEvent(_TargetEvent):
+    __slots__ = ()
+    etype = "ALLOW_ACT"
 
     def to_string(self):
         return f"玩家{self.target}开始行动。"
 
 
-class AllowVoteEvent(Event):
-    etype: str = "ALLOW_VOTE"
-    target: int
+class AllowVoteEvent(_TargetEvent):
+    __slots__ = ()
+    etype = "ALLOW_VOTE"
 
     def to_string(self):
         return f"玩家{self.target}开始投票。"
 
 
 class PhaseChangeEvent(Event):
-    etype: str = "PHASE_CHANGE"
-    change: str = Phase
+    __slots__ = ("change",)
+    etype = "PHASE_CHANGE"
+    FIELDS = ("change",)
+
+    def __init__(self, day: int, phase: Phase, change: str):
+        self.day = day
+        self.phase = _PHASES[phase]
+        # 与之前的pydantic模型（change: str）一致，保存为普通字符串
+        self.change = change.value if isinstance(change, Phase) else change
 
     def to_string(self):
         return f"当前环节为{self.change}。"
 
 
 class DayChangeEvent(Event):
-    etype: str = "DAY_CHANGE"
+    __slots__ = ()
+    etype = "DAY_CHANGE"
+
+
+# etype -> 事件类，用于从存储中还原事件
+EVENT_TYPES = {
+    cls.etype: cls
+    for cls in (PlayerEvent, SystemEvent, DisplayEvent, ConversationEvent, KillEvent, ResurrectionEvent,
+                CheckEvent, VoteEvent, AllowSpeakEvent, AllowActEvent, AllowVoteEvent, PhaseChangeEvent,
+                DayChangeEvent)
+}
+
+
+def parse_event(data: dict) -> Event:
+    """还原to_dict()的结果，数据来自自己写入的存储，不做校验"""
+    cls = EVENT_TYPES[data["etype"]]
+    return cls(data["day"], data["phase"], *[data.get(name) for name in cls.FIELDS])
+
+
+class EventModel(BaseModel):
+    """外部数据的校验模型：/game/send提交的人类决策和/game/review输出的事件"""
+    etype: str
+    day: int
+    phase: Phase
+
+
+class ActionModel(EventModel):
+    source: int
+    target: int
+    reason: Optional[str] = None
+
+
+class ConversationModel(EventModel):
+    source: int
+    target: int
+    content: str
+    count: int
+
+
+class HistoryModel(EventModel):
+    content: str
+
+
+# 人类玩家可以提交的决策类型 -> 校验模型
+INPUT_MODELS = {
+    "CONVERSATION": ConversationModel,
+    "RESURRECTION": ActionModel,
+    "KILL": ActionModel,
+    "CHECK": ActionModel,
+    "VOTE": ActionModel,
+}
+
+
+def validate_input(data: Dict[str, Any]) -> Event:
+    """校验外部提交的决策并转换为内部事件，字段不合法时抛出pydantic的ValidationError"""
+    model = INPUT_MODELS[data["etype"]].model_validate(data)
+    return EVENT_TYPES[model.etype](**model.model_dump(exclude={"etype"}))
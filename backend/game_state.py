@@ -1,7 +1,12 @@
-from typing import List, Dict, Optional
+from functools import cached_property
+from typing import Iterable, List, Dict, Optional
 import random
+import secrets
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from backend.events import (
+    ANNOUNCE,
     Event,
+    parse_event,
     SystemEvent,
     PlayerEvent,
     DisplayEvent,
@@ -13,24 +18,106 @@ from backend.events import (
 )
 from backend.entity import *
 from backend.base import *
+from backend.history import HistoryView, PUBLIC_PHASES, render
+from backend.review import ReviewIndex
+from backend.scheduler import EventScheduler
+
+MIN_SEATS = 6
+MAX_SEATS = 20
+# 夜晚按此顺序行动
+NIGHT_ROLES = [Role.WEREWOLF, Role.SEER, Role.WITCH]
+
+
+def table_roles(seats: int = 6, roles: Optional[Dict[str, int]] = None) -> List[Role]:
+    """
+    一桌游戏的角色列表。roles为每种角色的人数，未指定时按座位数分配：
+    狼人为座位数的四分之一（至少2名），预言家和女巫各一名，其余为平民。
+    """
+    if not MIN_SEATS <= seats <= MAX_SEATS:
+        raise ValueError(f"座位数必须在{MIN_SEATS}到{MAX_SEATS}之间: {seats}")
+    if roles is None:
+        wolves = max(2, seats // 4)
+        roles = {"werewolf": wolves, "seer": 1, "witch": 1, "villager": seats - wolves - 2}
+    result = [Role(role) for role, count in roles.items() for _ in range(count)]
+    if len(result) != seats:
+        raise ValueError(f"角色总数{len(result)}与座位数{seats}不一致")
+    wolves = result.count(Role.WEREWOLF)
+    if not 0 < wolves < seats - wolves:
+        raise ValueError(f"狼人数量必须大于0且少于好人数量: {wolves}")
+    return result
+
+
+def bits(mask: int) -> List[int]:
+    """位掩码中为1的位的编号，从小到大"""
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
+class SeatIndex:
+    """
+    座位索引：存活座位和每种角色的座位用位掩码表示（第i位对应玩家i），并按阵营统计存活人数。
+    由players构建一次，之后在玩家死亡时增量更新。
+    """
+    __slots__ = ("alive", "roles", "wolves", "good")
+
+    def __init__(self, players: List[Player]):
+        self.alive = 0
+        self.roles: Dict[Role, int] = {}
+        self.wolves = 0
+        self.good = 0
+        for p in players:
+            self.roles[p.role] = self.roles.get(p.role, 0) | 1 << p.id
+            if p.alive:
+                self.revive(p)
+
+    def revive(self, player: Player):
+        if not self.alive >> player.id & 1:
+            self.alive |= 1 << player.id
+            if player.role == Role.WEREWOLF:
+                self.wolves += 1
+            else:
+                self.good += 1
+
+    def kill(self, player: Player):
+        if self.alive >> player.id & 1:
+            self.alive &= ~(1 << player.id)
+            if player.role == Role.WEREWOLF:
+                self.wolves -= 1
+            else:
+                self.good -= 1
 
 
 class GameState(BaseModel):
-    players: List[Player] = [None] * 6
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    players: List[Player] = []
     phase: Phase = Phase.NIGHT
     conversations: int = 1
     day: int = 1
-    events: List[Event] = []
+    events: EventScheduler = Field(default_factory=EventScheduler)
     histories: Dict[int, List[Event]] = {}
     alive_players: List[int] = []
     just_killed: List[int] = []
-    speak_order: List[int] = [None] * 6
-    act_order: List[int] = [None] * 4
+    speak_order: List[int] = []
+    act_order: List[int] = []
+    # 由人类玩家控制的座位
+    human_seats: List[int] = [6]
+    # 已被玩家占用的人类座位的令牌：seat -> token，/game/send和/game/playing由令牌确定座位
+    seat_tokens: Dict[int, str] = {}
     game_over: bool = False
+    # 人类玩家长时间未操作，游戏暂停，等待重新连接
+    parked: bool = False
+    # 历史记忆模式下每个玩家已结束各天的摘要：pid -> {day: 摘要}
+    summaries: Dict[int, Dict[int, str]] = {}
+    # 已推送给前端的帧数，也是最近一帧的SSE id，断线重连后继续递增
+    frames: int = 0
     winner: Optional[str] = None
     step: int = 0
     out: int = 0
-    votes: List[int] = [0] * 6
+    votes: List[int] = []
     phase_map: Dict[Phase, str] = {
         Phase.DAY: "白天",
         Phase.NIGHT: "夜晚",
@@ -44,10 +131,41 @@ class GameState(BaseModel):
         Role.WITCH: "witch",
         Role.VILLAGER: "villager"
     }
+    # 每个玩家的增量历史视图，缓存已渲染的历史文本
+    _history_views: Dict[int, HistoryView] = PrivateAttr(default_factory=dict)
+
+    def dump(self) -> dict:
+        """可JSON序列化的完整游戏状态，包括待处理的事件"""
+        # 玩家和事件是__slots__对象，自己序列化；phase可能是来自PHASE_CHANGE事件的字符串
+        data = self.model_dump(mode="json", exclude={"players", "histories", "events", "phase_map", "role_map"},
+                               warnings=False)
+        data["players"] = [None if p is None else p.to_dict() for p in self.players]
+        data["histories"] = {str(pid): [e.to_dict() for e in events] for pid, events in self.histories.items()}
+        data["events"] = self.events.dump()
+        return data
+
+    @classmethod
+    def load(cls, data: dict) -> "GameState":
+        data = dict(data)
+        data["players"] = [
+            None if p is None else (WitchPlayer if p["role"] == Role.WITCH else Player)(**p)
+            for p in data["players"]
+        ]
+        data["histories"] = {int(pid): [parse_event(e) for e in events]
+                             for pid, events in data["histories"].items()}
+        data["summaries"] = {int(pid): {int(day): text for day, text in days.items()}
+                             for pid, days in data.get("summaries", {}).items()}
+        data["events"] = EventScheduler.load(data["events"])
+        return cls(**data)
 
-    def initialize_players(self):
-        roles = [Role.WEREWOLF, Role.WEREWOLF, Role.VILLAGER,
-                 Role.VILLAGER, Role.SEER, Role.WITCH]
+    def initialize_players(self, seats: int = 6, roles: Optional[Dict[str, int]] = None,
+                           human_seats: Iterable[int] = (6,)):
+        """按config.toml中的[table]分配座位和角色"""
+        roles = table_roles(seats, roles)
+        human_seats = sorted(set(human_seats))
+        if any(not 1 <= seat <= seats for seat in human_seats):
+            raise ValueError(f"人类玩家座位超出范围: {human_seats}")
+        self.human_seats = human_seats
         random.shuffle(roles)
 
         self.players = [
@@ -56,50 +174,63 @@ class GameState(BaseModel):
             else WitchPlayer(id=i + 1, name=f"玩家{i + 1}", role=role)
             for i, role in enumerate(roles)
         ]
-        # 初始化行动顺序（狼人、狼人、预言家、女巫）
-        act_roles = [Role.WEREWOLF, Role.WEREWOLF, Role.SEER, Role.WITCH]
-        self.act_order = []
-        for role in act_roles:
-            # 找到对应角色的存活玩家（处理可能的重复角色）
-            for player in self.players:
-                if player.role == role and player.id not in self.act_order:
-                    self.act_order.append(player.id)
-                    break
+        self.__dict__.pop("seat_index", None)
+        self.__dict__.pop("review_index", None)
+        # 初始化行动顺序（所有狼人、预言家、女巫）
+        self.act_order = [p.id for role in NIGHT_ROLES for p in self.players if p.role == role]
 
-        for i in range(0, 7):
+        for i in range(0, seats + 1):
             self.histories[i] = []
+        self.votes = [0] * seats
 
         self.alive_players = [p.id for p in self.players]
         self.speak_order = self.alive_players.copy()
-        self.events = self.must_event_every_day()
+        self.must_event_every_day()
+
+    def claim_seat(self, seat: int) -> str:
+        """占用一个人类座位并返回它的令牌；座位不是人类座位或已被占用时抛出ValueError"""
+        if seat not in self.human_seats:
+            raise ValueError(f"玩家{seat}不是人类玩家")
+        if seat in self.seat_tokens:
+            raise ValueError(f"玩家{seat}的座位已被占用")
+        self.seat_tokens[seat] = secrets.token_urlsafe(16)
+        return self.seat_tokens[seat]
+
+    def token_seat(self, token: Optional[str]) -> Optional[int]:
+        """令牌对应的座位，令牌无效时返回None"""
+        if token:
+            for seat, seat_token in self.seat_tokens.items():
+                if secrets.compare_digest(seat_token, token):
+                    return seat
+        return None
 
     def must_event_every_day(self):
-        return [PhaseChangeEvent(day=self.day, phase=Phase.NIGHT, change=Phase.DAY)] + \
-            [AllowActEvent(day=self.day, phase=Phase.NIGHT, target=i) for i in reversed(self.act_order)] + \
-            [DisplayEvent(day=self.day, phase=Phase.NIGHT,
-                          content=f"第{self.day}天夜晚，存活的玩家为{' | '.join([f'玩家{i}' for i in self.alive_players])}")]
+        self.events.schedule(DisplayEvent(day=self.day, phase=Phase.NIGHT,
+                                          content=f"第{self.day}天夜晚，存活的玩家为{' | '.join([f'玩家{i}' for i in self.alive_players])}"))
+        self.events.extend([AllowActEvent(day=self.day, phase=Phase.NIGHT, target=i) for i in self.act_order])
+        self.events.schedule(PhaseChangeEvent(day=self.day, phase=Phase.NIGHT, change=Phase.DAY))
 
     def add_event(self, event: Event):
-        self.events.append(event)
+        # 行动产生的事件优先于剩余的阶段事件处理
+        self.events.push(event)
 
     def when_day_event(self):
-        self.events = [PhaseChangeEvent(day=self.day, phase=Phase.VOTING, change=Phase.COUNT_VOTES)] + \
-                      [AllowVoteEvent(day=self.day, phase=Phase.VOTING, target=i) for i in reversed(self.speak_order)] + \
-                      [DisplayEvent(day=self.day, phase=Phase.VOTING, content=f"现在是投票环节")] + \
-                      [PhaseChangeEvent(day=self.day, phase=Phase.DISCUSSION, change=Phase.VOTING)] + \
-                      [AllowSpeakEvent(day=self.day, phase=Phase.DISCUSSION, target=i) for i in
-                       reversed(self.speak_order)] + \
-                      [DisplayEvent(day=self.day, phase=Phase.DISCUSSION, content=f"现在是讨论环节")] + \
-                      [PhaseChangeEvent(day=self.day, phase=Phase.DAY, change=Phase.DISCUSSION)] + \
-                      [DisplayEvent(day=self.day, phase=Phase.DAY,
-                                    content=f"现在是白天,昨晚{(' | '.join([f'玩家{i}' for i in self.just_killed]) + '被杀死了！') if self.just_killed else ('没有人死亡！')}")]
+        self.events.schedule(DisplayEvent(day=self.day, phase=Phase.DAY,
+                                          content=f"现在是白天,昨晚{(' | '.join([f'玩家{i}' for i in self.just_killed]) + '被杀死了！') if self.just_killed else ('没有人死亡！')}"))
+        self.events.schedule(PhaseChangeEvent(day=self.day, phase=Phase.DAY, change=Phase.DISCUSSION))
+        self.events.schedule(DisplayEvent(day=self.day, phase=Phase.DISCUSSION, content=f"现在是讨论环节"))
+        self.events.extend([AllowSpeakEvent(day=self.day, phase=Phase.DISCUSSION, target=i) for i in self.speak_order])
+        self.events.schedule(PhaseChangeEvent(day=self.day, phase=Phase.DISCUSSION, change=Phase.VOTING))
+        self.events.schedule(DisplayEvent(day=self.day, phase=Phase.VOTING, content=f"现在是投票环节"))
+        self.events.extend([AllowVoteEvent(day=self.day, phase=Phase.VOTING, target=i) for i in self.speak_order])
+        self.events.schedule(PhaseChangeEvent(day=self.day, phase=Phase.VOTING, change=Phase.COUNT_VOTES))
 
     def when_count_vote_event(self):
-        self.events = [DayChangeEvent(day=self.day, phase=Phase.COUNT_VOTES)] + \
-                      [DisplayEvent(day=self.day, phase=Phase.COUNT_VOTES, content=f"玩家{self.out}出局了")]
+        self.events.schedule(DisplayEvent(day=self.day, phase=Phase.COUNT_VOTES, content=f"玩家{self.out}出局了"))
+        self.events.schedule(DayChangeEvent(day=self.day, phase=Phase.COUNT_VOTES))
 
     def get_event(self):
-        return self.events.pop(-1)
+        return self.events.pop()
 
     def add_just_killed(self, player_id, sid=None):
         player = self.players[sid - 1]
@@ -116,40 +247,72 @@ class GameState(BaseModel):
         player = self.players[sid - 1]
         player.good_drup = 0
 
+    @cached_property
+    def seat_index(self) -> SeatIndex:
+        """
+        存活座位和角色座位的索引，首次使用时由players构建。
+        缓存在实例的__dict__中：pydantic的PrivateAttr每次读取都要经过__getattr__，在热路径上要慢几十倍。
+        """
+        return SeatIndex(self.players)
+
+    @cached_property
+    def review_index(self) -> ReviewIndex:
+        """公共历史的复盘索引，首次查询时构建，之后由add_system_history随追加更新"""
+        return ReviewIndex(self.histories[0])
+
+    def is_alive(self, pid: int) -> bool:
+        return bool(self.seat_index.alive >> pid & 1)
+
+    def seats_of(self, role: Role, alive: bool = False) -> List[int]:
+        """某个角色的座位，alive为True时只包括存活的"""
+        mask = self.seat_index.roles.get(role, 0)
+        return bits(mask & self.seat_index.alive if alive else mask)
+
+    def _die(self, pid: int):
+        if not self.is_alive(pid):
+            return
+        player = self.players[pid - 1]
+        player.alive = False
+        self.seat_index.kill(player)
+        self.alive_players.remove(pid)
+
     def kill_player(self):
         if not self.just_killed:
             return
-        for player in self.players:
-            if player.id in self.just_killed:
-                player.alive = False
+        for pid in self.just_killed:
+            self._die(pid)
         self.act_order = [pid for pid in self.act_order if pid not in self.just_killed]
-        self.alive_players = [p.id for p in self.players if p.alive]
 
     def vote(self, pid):
         self.votes[pid - 1] += 1
 
     def set_out(self):
         self.out = self.votes.index(max(self.votes)) + 1
-        for player in self.players:
-            if player.id == self.out:
-                player.alive = False
-        self.alive_players = [p.id for p in self.players if p.alive]
+        self._die(self.out)
 
     def next_day(self):
         self.day += 1
         self.phase = Phase.NIGHT
         self.just_killed = []
         self.speak_order = self.alive_players.copy()
-        self.events = self.must_event_every_day()
-        self.votes = [0 for _ in range(6)]
+        self.must_event_every_day()
+        self.votes = [0 for _ in self.players]
         self.out = 0
         self.conversations = 1
 
+    @property
+    def max_days(self) -> int:
+        # 每天白天至少放逐一人，座位数即游戏最长天数
+        return len(self.players)
+
+    @property
+    def max_steps(self) -> int:
+        # 每天的事件数和天数都随座位数线性增长；6人局为200
+        return 200 * len(self.players) ** 2 // MIN_SEATS ** 2
+
     def check_game_over(self):
-        werewolves_alive = sum(1 for p in self.players
-                               if p.role == Role.WEREWOLF and p.alive)
-        others_alive = sum(1 for p in self.players
-                           if p.role != Role.WEREWOLF and p.alive)
+        werewolves_alive = self.seat_index.wolves
+        others_alive = self.seat_index.good
 
         if werewolves_alive == 0:
             self.game_over = True
@@ -161,18 +324,42 @@ class GameState(BaseModel):
             return True
         return False
 
-    def add_player_history(self, pid, content):
-        self.histories[pid].append(PlayerEvent(day=self.day, phase=self.phase, content=content))
+    def add_player_history(self, pid, content, kind=ANNOUNCE, seat=None):
+        self.histories[pid].append(PlayerEvent(day=self.day, phase=self.phase, content=content, kind=kind, seat=seat))
 
-    def add_system_history(self, content):
-        self.histories[0].append(SystemEvent(day=self.day, phase=self.phase, content=content))
+    def add_system_history(self, content, kind=ANNOUNCE, seat=None):
+        history = self.histories[0]
+        history.append(SystemEvent(day=self.day, phase=self.phase, content=content, kind=kind, seat=seat))
+        # 复盘索引已经构建时随追加更新，还没有人查询过的游戏不建索引
+        index = self.__dict__.get("review_index")
+        if index is not None:
+            index.add(len(history) - 1)
 
     def get_history(self, pid):
-        tmp = []
-        tmp.extend([data for data in self.histories[pid] if data.phase == Phase.NIGHT])
-        tmp.extend([data for data in self.histories[0] if
-                    data.phase == Phase.DAY or data.phase == Phase.DISCUSSION or data.phase == Phase.VOTING])
-        tmp = sorted(tmp, key=lambda x: x.day)
-        history = [f"在第{data.day}天{data.phase}:{data.content}" for data in tmp]
-
-        return "\n".join(history)
+        summaries = self.summaries.get(pid)
+        if summaries and 1 in summaries:
+            return self._summarized_history(pid, summaries)
+        view = self._history_views.get(pid)
+        if view is None:
+            view = self._history_views[pid] = HistoryView(self.histories[pid], self.histories[0])
+        return view.get(self.histories[pid], self.histories[0])
+
+    def _summarized_history(self, pid: int, summaries: Dict[int, str]) -> str:
+        """从第1天起连续已有摘要的各天用摘要代替，之后各天仍使用原始记录"""
+        covered = 0
+        while covered + 1 in summaries:
+            covered += 1
+        lines = [f"第{day}天摘要：{summaries[day]}" for day in range(1, covered + 1)]
+        # 历史按天追加，从末尾向前取出摘要之后各天的记录
+        recent = []
+        for events, phases in ((self.histories[pid], (Phase.NIGHT,)), (self.histories[0], PUBLIC_PHASES)):
+            tail = []
+            for data in reversed(events):
+                if data.day <= covered:
+                    break
+                if data.phase in phases:
+                    tail.append(data)
+            recent.extend(reversed(tail))
+        recent.sort(key=lambda x: x.day)
+        lines.extend(render(data) for data in recent)
+        return "\n".join(lines)
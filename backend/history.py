@@ -0,0 +1,95 @@
+from typing import List
+from backend.base import Phase
+from backend.events import Event
+
+PUBLIC_PHASES = (Phase.DAY, Phase.DISCUSSION, Phase.VOTING)
+
+
+def render(data: Event) -> str:
+    return f"在第{data.day}天{data.phase}:{data.content}"
+
+
+class HistoryView:
+    """
+    单个玩家可见的历史视图：自己的夜晚记录 + 公共的白天/讨论/投票记录，按天排序。
+    每次只渲染新追加的事件，新渲染的行先放在pending中，读取文本时才拼接到已缓存的文本之后；
+    拼接后不再保留这些行，每个视图只保存一份文本。
+    """
+
+    def __init__(self, own: List[Event], public: List[Event]):
+        self.own = own
+        self.public = public
+        self.rebuild()
+
+    def rebuild(self):
+        self.own_cursor = 0
+        self.public_cursor = 0
+        self.own_day = 0
+        self.public_day = 0
+        # 已渲染、还没有拼接到_text的行
+        self.pending: List[str] = []
+        self._text = ""
+
+    @property
+    def text(self) -> str:
+        if self.pending:
+            tail = "\n".join(self.pending)
+            self._text = f"{self._text}\n{tail}" if self._text else tail
+            self.pending = []
+        return self._text
+
+    def _accept(self, data: Event, own: bool) -> bool:
+        # 同一天内自己的夜晚记录排在公共记录之前，追加顺序与排序结果不一致时需要重建
+        if own:
+            if data.day <= self.public_day or data.day < self.own_day:
+                return False
+            self.own_day = data.day
+        else:
+            if data.day < self.own_day or data.day < self.public_day:
+                return False
+            self.public_day = data.day
+        return True
+
+    def _extend(self) -> bool:
+        new_own = [data for data in self.own[self.own_cursor:] if data.phase == Phase.NIGHT]
+        new_public = [data for data in self.public[self.public_cursor:] if data.phase in PUBLIC_PHASES]
+        self.own_cursor = len(self.own)
+        self.public_cursor = len(self.public)
+        if not new_own and not new_public:
+            return True
+        lines = self.pending
+        i = j = 0
+        while i < len(new_own) or j < len(new_public):
+            if j == len(new_public) or (i < len(new_own) and new_own[i].day <= new_public[j].day):
+                data, own = new_own[i], True
+                i += 1
+            else:
+                data, own = new_public[j], False
+                j += 1
+            if not self._accept(data, own):
+                return False
+            lines.append(render(data))
+        return True
+
+    def get(self, own: List[Event], public: List[Event]) -> str:
+        # 列表被替换或截断时（例如重置游戏）丢弃缓存
+        if own is not self.own or public is not self.public \
+                or len(own) < self.own_cursor or len(public) < self.public_cursor:
+            self.own = own
+            self.public = public
+            self.rebuild()
+        if not self._extend():
+            self.rebuild()
+            self._extend_sorted()
+        return self.text
+
+    def _extend_sorted(self):
+        tmp = [data for data in self.own if data.phase == Phase.NIGHT]
+        tmp.extend([data for data in self.public if data.phase in PUBLIC_PHASES])
+        tmp = sorted(tmp, key=lambda x: x.day)
+        self.pending = [render(data) for data in tmp]
+        self._text = ""
+        self.own_cursor = len(self.own)
+        self.public_cursor = len(self.public)
+        self.own_day = max((data.day for data in self.own if data.phase == Phase.NIGHT), default=0)
+        self.public_day = max((data.day for data in self.public if data.phase in PUBLIC_PHASES), default=0)
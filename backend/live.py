@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Coroutine, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("drop", "coalesce", "disconnect")
+
+
+def sse_event(data: dict, event_name: str = None, event_id: int = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event_name:
+        lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    lines.append("")  # 结尾空行
+    lines.append("")
+    return "\n".join(lines)
+
+
+def new_stats() -> Dict[str, int]:
+    return {"frames": 0, "dropped": 0, "coalesced": 0, "disconnected": 0}
+
+
+class Frame:
+    """
+    推送给前端的一帧，序列化只在发布时做一次，所有订阅者共享同一份文本。
+    带seat的帧是该座位的私有信息（查验结果、狼人队友、行动提示等），只发给该座位的连接。
+    """
+    __slots__ = ("id", "data", "text", "seat")
+
+    def __init__(self, frame_id: int, data: dict, text: str):
+        self.id = frame_id
+        self.data = data
+        self.text = text
+        self.seat = data.get("seat")
+
+    def visible_to(self, seat: Optional[int]) -> bool:
+        return self.seat is None or self.seat == seat
+
+
+class Subscriber:
+    """
+    一个SSE连接的有界队列。队列满时按policy处理：
+    - drop：丢弃最早的一帧，前端会看到id不连续
+    - coalesce：把同一条发言的相邻分片合并成一帧，没有可合并的分片时断开
+    - disconnect：断开连接，浏览器携带Last-Event-ID重连后从环形缓冲区补发
+    """
+
+    def __init__(self, size: int = 64, policy: str = "coalesce", seat: Optional[int] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        # 连接所属的人类座位，None为旁观者，只接收公开的帧
+        self.seat = seat
+        self.queue: Deque[Frame] = deque()
+        self.size = size
+        self.policy = policy
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def offer(self, frame: Frame, encode: Callable[[dict, int], str], stats: Dict[str, int]) -> bool:
+        """放入一帧并唤醒连接，返回False表示应断开"""
+        self.ready.set()
+        if len(self.queue) < self.size:
+            self.queue.append(frame)
+            return True
+        if self.policy == "drop":
+            self.queue.popleft()
+            self.queue.append(frame)
+            stats["dropped"] += 1
+            return True
+        if self.policy == "coalesce" and self._coalesce(frame, encode):
+            stats["coalesced"] += 1
+            return True
+        self.closed = True
+        stats["disconnected"] += 1
+        return False
+
+    def _coalesce(self, frame: Frame, encode: Callable[[dict, int], str]) -> bool:
+        frames = list(self.queue)
+        frames.append(frame)
+        for i in range(len(frames) - 1):
+            a, b = frames[i], frames[i + 1]
+            if a.data.get("type") == "speak" and b.data.get("type") == "speak" and a.data["mid"] == b.data["mid"]:
+                # 合并后的帧使用较新的id，重连时不会重复补发
+                data = dict(b.data, content=a.data["content"] + b.data["content"])
+                frames[i:i + 2] = [Frame(b.id, data, encode(data, b.id))]
+                self.queue = deque(frames)
+                return True
+        return False
+
+
+class LiveGame:
+    """
+    一局正在运行的游戏：引擎作为后台任务运行，与HTTP连接无关，产出的每一帧带有递增的id。
+    帧广播给所有可见该帧的连接，同时保存在有界的环形缓冲区中；
+    断线重连时携带Last-Event-ID只补发缺失的帧，然后继续接收新帧，不会再启动第二个引擎循环。
+    """
+
+    def __init__(self, game_id: str, encode: Callable[[dict, int], str], size: int = 256,
+                 queue_size: int = 64, policy: str = "coalesce",
+                 on_idle: Optional[Callable[["LiveGame"], None]] = None, stats: Optional[Dict[str, int]] = None):
+        self.game_id = game_id
+        self.frames: Deque[Frame] = deque(maxlen=size)
+        self.encode = encode
+        self.queue_size = queue_size
+        self.policy = policy
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: List[Subscriber] = []
+        # 可以由多局游戏共享，累计整个worker的统计
+        self.stats = stats if stats is not None else new_stats()
+        # 引擎结束且没有连接时调用，用于从注册表中移除
+        self.on_idle = on_idle
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, run: Coroutine):
+        """启动引擎任务，run负责调用publish产出帧"""
+        self.task = asyncio.create_task(self._run(run))
+
+    async def _run(self, run: Coroutine):
+        try:
+            await run
+        except Exception:
+            logger.exception("game %s stopped", self.game_id)
+        finally:
+            for subscriber in self.subscribers:
+                subscriber.ready.set()
+            self._check_idle()
+
+    def publish(self, frame_id: int, data: dict):
+        """序列化一次，放入环形缓冲区和可见该帧的订阅者的队列；从不等待，慢连接不会拖慢游戏"""
+        frame = Frame(frame_id, data, self.encode(data, frame_id))
+        self.frames.append(frame)
+        self.stats["frames"] += 1
+        slow = [s for s in self.subscribers
+                if frame.visible_to(s.seat) and not s.offer(frame, self.encode, self.stats)]
+        for subscriber in slow:
+            self.subscribers.remove(subscriber)
+
+    def _check_idle(self):
+        if not self.running and not self.subscribers and self.on_idle:
+            self.on_idle(self)
+
+    def _replay(self, last: int, seat: Optional[int]) -> List[Frame]:
+        if self.frames and not (self.frames[0].id - 1 <= last <= self.frames[-1].id):
+            # 客户端落后太多或id来自之前的运行，尽量补发缓冲区中的全部帧
+            last = -1
+        return [frame for frame in self.frames if frame.id > last and frame.visible_to(seat)]
+
+    async def subscribe(self, last_event_id: Optional[str] = None, seat: Optional[int] = None) -> AsyncIterator[str]:
+        """seat为连接所属的人类座位，只接收公开的帧和该座位的私有帧；None时只接收公开的帧"""
+        try:
+            last = int(last_event_id) if last_event_id else 0
+        except ValueError:
+            last = 0
+        # 补发的帧和之后的新帧之间没有await，不会漏掉或重复
+        replay = self._replay(last, seat)
+        subscriber = Subscriber(self.queue_size, self.policy, seat)
+        self.subscribers.append(subscriber)
+        try:
+            for frame in replay:
+                yield frame.text
+            while True:
+                while subscriber.queue:
+                    yield subscriber.queue.popleft().text
+                if subscriber.closed or not self.running:
+                    return
+                subscriber.ready.clear()
+                await subscriber.ready.wait()
+        finally:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            self._check_idle()
+
+
+class LiveRegistry:
+    """本worker上正在运行或仍有连接的游戏"""
+
+    def __init__(self, encode: Callable[[dict, int], str], **options):
+        self.encode = encode
+        self.options = options
+        self.games: Dict[str, LiveGame] = {}
+        self.totals = new_stats()
+
+    def get(self, game_id: str) -> Optional[LiveGame]:
+        return self.games.get(game_id)
+
+    def create(self, game_id: str) -> LiveGame:
+        self.games[game_id] = LiveGame(game_id, self.encode, on_idle=self.forget, stats=self.totals, **self.options)
+        return self.games[game_id]
+
+    def forget(self, live: LiveGame):
+        if self.games.get(live.game_id) is live:
+            del self.games[live.game_id]
+
+    def cancel(self):
+        for live in list(self.games.values()):
+            if live.task is not None:
+                live.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "games": len(self.games),
+            "running": sum(live.running for live in self.games.values()),
+            "subscribers": sum(len(live.subscribers) for live in self.games.values()),
+            **self.totals,
+        }
@@ -1,14 +1,32 @@
 from langchain_openai.chat_models import ChatOpenAI
-import toml
-from pathlib import Path
+from backend.config import CONFIG, section
+from backend.llm_cache import LLMCache, PASSTHROUGH
+from backend.llm_pool import create_pool
 
-CONFIG = Path(__file__).parent.parent / 'config.toml'
+llm_config = section('llm')
 
-llm_config = toml.load(CONFIG)['llm']
+if llm_config.get('backends'):
+    # 配置了多个后端时使用连接池，[llm]中的字段作为每个后端的默认值
+    llm = create_pool(
+        llm_config['backends'],
+        {k: v for k, v in llm_config.items() if k != 'backends'},
+        **section('llm_pool')
+    )
+else:
+    llm = ChatOpenAI(
+        openai_api_key=llm_config['api_key'],
+        model=llm_config['model'],
+        base_url=llm_config['base_url'],
+        temperature=llm_config['temperature']
+    )
 
-llm = ChatOpenAI(
-    openai_api_key=llm_config['api_key'],
-    model=llm_config['model'],
-    base_url=llm_config['base_url'],
-    temperature=llm_config['temperature']
-)
+# 录制/回放缓存，相对路径基于项目根目录
+cache_config = section('llm_cache')
+if cache_config.get('mode', PASSTHROUGH) != PASSTHROUGH:
+    llm = LLMCache(
+        llm,
+        path=str(CONFIG.parent / cache_config.get('path', 'cache/llm')),
+        mode=cache_config['mode'],
+        max_entries=cache_config.get('max_entries', 50000),
+        token_rate=cache_config.get('token_rate', 0.0)
+    )
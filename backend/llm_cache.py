@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+PASSTHROUGH = "passthrough"  # 直接调用LLM，不读写缓存
+RECORD = "record"  # 命中时读缓存，未命中时调用LLM并写入缓存
+REPLAY = "replay"  # 只读缓存，未命中时报错，用于离线回放
+MODES = (PASSTHROUGH, RECORD, REPLAY)
+
+
+class CacheMiss(KeyError):
+    """回放模式下缓存中没有对应的提示词"""
+
+
+def _normalize(messages) -> List[List[str]]:
+    if isinstance(messages, str):
+        return [["human", " ".join(messages.split())]]
+    return [[message.type, " ".join(str(message.content).split())] for message in messages]
+
+
+def _split(text: str, size: int = 4) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class DiskStore:
+    """
+    每个缓存条目一个JSON文件，按key前两位分目录。
+    文件修改时间即最近访问时间，条目数超过max_entries时按LRU淘汰到low_water比例。
+    读写都是同步的文件IO，由LLMCache在线程中调用，不阻塞事件循环。
+    """
+
+    def __init__(self, path: Path, max_entries: int = 50000, low_water: float = 0.9):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.low_water = low_water
+        self.count = sum(1 for _ in self.path.glob("*/*.json"))
+        # 多个线程同时写入时保护count和淘汰
+        self.lock = threading.Lock()
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        file = self._file(key)
+        try:
+            data = json.loads(file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(file)
+        except FileNotFoundError:
+            # 读取之后被另一个线程淘汰
+            pass
+        return data
+
+    def put(self, key: str, value: dict):
+        file = self._file(key)
+        file.parent.mkdir(exist_ok=True)
+        existed = file.exists()
+        # 同一个key可能在两个线程中同时写入，临时文件按线程区分
+        tmp = file.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, file)
+        if not existed:
+            with self.lock:
+                self.count += 1
+                if self.count > self.max_entries:
+                    self.evict()
+
+    def evict(self):
+        files = sorted(self.path.glob("*/*.json"), key=lambda f: f.stat().st_mtime)
+        target = int(self.max_entries * self.low_water)
+        for file in files[:max(len(files) - target, 0)]:
+            file.unlink(missing_ok=True)
+        self.count = min(len(files), target)
+
+
+class Inflight:
+    """
+    正在进行的一次LLM请求及等待它的调用数。请求在独立的任务中运行，不属于任何一个调用方：
+    某个等待者被取消时请求继续为其他等待者进行，最后一个等待者取消时才取消请求。
+    """
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMCache:
+    """
+    包装backend.llm的录制/回放缓存层，提供与ChatOpenAI相同的agenerate/astream接口。
+    缓存key为规范化提示词（合并空白）与模型参数的sha256。
+    回放流式发言时按token_rate（每秒分片数，0表示不限速）输出录制的分片。
+    """
+
+    def __init__(self, llm, path: str = "cache/llm", mode: str = RECORD, max_entries: int = 50000,
+                 token_rate: float = 0.0):
+        if mode not in MODES:
+            raise ValueError(f"Invalid llm cache mode: {mode}")
+        self.llm = llm
+        self.mode = mode
+        self.token_rate = token_rate
+        self.store = DiskStore(Path(path), max_entries=max_entries) if mode != PASSTHROUGH else None
+        self.inflight: Dict[str, Inflight] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # 其他属性（例如model_name）透传给被包装的llm
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def key(self, messages, **kwargs) -> str:
+        params = {
+            "model": getattr(self.llm, "model_name", None),
+            "temperature": getattr(self.llm, "temperature", None),
+            **kwargs
+        }
+        payload = json.dumps({"params": params, "messages": _normalize(messages)},
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _lookup(self, key: str) -> Optional[dict]:
+        entry = await asyncio.to_thread(self.store.get, key)
+        if entry is None:
+            self.misses += 1
+            if self.mode == REPLAY:
+                raise CacheMiss(key)
+        else:
+            self.hits += 1
+        return entry
+
+    async def _generate_one(self, messages: List[BaseMessage], **kwargs) -> str:
+        key = self.key(messages, **kwargs)
+        entry = await self._lookup(key)
+        if entry is not None:
+            return entry["text"]
+        # 多局游戏同时发出相同的提示词时只请求一次，结果或异常由所有等待者共享
+        inflight = self.inflight.get(key)
+        if inflight is None:
+            inflight = self.inflight[key] = Inflight(asyncio.ensure_future(self._request(key, messages, **kwargs)))
+        inflight.waiters += 1
+        try:
+            return await asyncio.shield(inflight.task)
+        finally:
+            inflight.waiters -= 1
+            if not inflight.waiters:
+                # 最后一个等待者：请求已完成时结果已写入缓存，之后的调用直接命中；否则没有人需要它了
+                inflight.task.cancel()
+                if self.inflight.get(key) is inflight:
+                    del self.inflight[key]
+
+    async def _request(self, key: str, messages: List[BaseMessage], **kwargs) -> str:
+        response = await self.llm.agenerate([messages], **kwargs)
+        text = response.generations[0][0].text
+        await asyncio.to_thread(self.store.put, key, {"text": text, "created": time.time()})
+        return text
+
+    async def agenerate(self, messages: List[List[BaseMessage]], **kwargs) -> LLMResult:
+        if self.mode == PASSTHROUGH:
+            return await self.llm.agenerate(messages, **kwargs)
+        texts = await asyncio.gather(*(self._generate_one(m, **kwargs) for m in messages))
+        return LLMResult(generations=[[ChatGeneration(message=AIMessage(content=text))] for text in texts])
+
+    async def astream(self, messages, **kwargs):
+        if self.mode == PASSTHROUGH:
+            async for chunk in self.llm.astream(messages, **kwargs):
+                yield chunk
+            return
+        key = self.key(messages, **kwargs)
+        entry = await self._lookup(key)
+        if entry is not None:
+            delay = 1 / self.token_rate if self.token_rate else 0
+            for piece in entry.get("chunks") or _split(entry["text"]):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield AIMessageChunk(content=piece)
+            return
+        chunks = []
+        async for chunk in self.llm.astream(messages, **kwargs):
+            chunks.append(str(chunk.content))
+            yield chunk
+        entry = {"text": "".join(chunks), "chunks": chunks, "created": time.time()}
+        await asyncio.to_thread(self.store.put, key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses,
+                "entries": self.store.count if self.store else 0}
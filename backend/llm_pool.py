@@ -0,0 +1,161 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_openai.chat_models import ChatOpenAI
+
+
+class Backend:
+    """连接池中的一个OpenAI兼容后端"""
+
+    def __init__(self, name: str, llm, weight: float = 1.0, max_inflight: int = 8):
+        self.name = name
+        self.llm = llm
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.latency: Optional[float] = None  # 指数加权平均延迟（秒）
+        self.failures = 0  # 连续失败次数
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self, default_latency: float) -> float:
+        # 预计等待时间：延迟 × 排队中的请求数 / 权重，越小越优先
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (self.inflight + 1) / self.weight
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "weight": self.weight, "inflight": self.inflight,
+                "latency": self.latency, "requests": self.requests, "errors": self.errors,
+                "ejected": not self.healthy(time.monotonic())}
+
+
+class LLMPool:
+    """
+    多后端LLM客户端池，提供与ChatOpenAI相同的agenerate/astream接口。
+    - 按 权重 和 观测延迟 选择预计等待时间最短的后端
+    - 每个后端限制同时进行的请求数，超出时排队等待
+    - 连续失败eject_after次的后端在eject_seconds内不再被选择，到期后重新试探
+    - 请求失败（流式请求尚未输出任何内容）时换一个后端重试，最多retries次
+    """
+
+    def __init__(self, backends: List[Backend], eject_after: int = 3, eject_seconds: float = 30.0,
+                 alpha: float = 0.2, retries: int = 1):
+        if not backends:
+            raise ValueError("LLMPool needs at least one backend")
+        self.backends = backends
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.alpha = alpha
+        self.retries = retries
+
+    def __getattr__(self, name):
+        if name == "backends":
+            raise AttributeError(name)
+        return getattr(self.backends[0].llm, name)
+
+    def _default_latency(self) -> float:
+        observed = [b.latency for b in self.backends if b.latency is not None]
+        return sum(observed) / len(observed) if observed else 1.0
+
+    def pick(self, exclude=()) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude] or self.backends
+        healthy = [b for b in candidates if b.healthy(now)]
+        if not healthy:
+            # 全部被剔除时选择最早恢复的后端，避免整体不可用
+            return min(candidates, key=lambda b: b.ejected_until)
+        default = self._default_latency()
+        free = [b for b in healthy if b.inflight < b.max_inflight]
+        return min(free or healthy, key=lambda b: b.score(default))
+
+    def _succeeded(self, backend: Backend, elapsed: float):
+        backend.failures = 0
+        backend.latency = elapsed if backend.latency is None \
+            else self.alpha * elapsed + (1 - self.alpha) * backend.latency
+
+    def _failed(self, backend: Backend):
+        backend.errors += 1
+        backend.failures += 1
+        if backend.failures >= self.eject_after:
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+            backend.failures = 0
+
+    async def agenerate(self, messages, **kwargs):
+        tried = []
+        while True:
+            backend = self.pick(exclude=tried)
+            tried.append(backend)
+            backend.inflight += 1
+            try:
+                async with backend.semaphore:
+                    backend.requests += 1
+                    start = time.monotonic()
+                    response = await backend.llm.agenerate(messages, **kwargs)
+                self._succeeded(backend, time.monotonic() - start)
+                return response
+            except Exception:
+                self._failed(backend)
+                if len(tried) > self.retries:
+                    raise
+            finally:
+                backend.inflight -= 1
+
+    async def astream(self, messages, **kwargs):
+        tried = []
+        while True:
+            backend = self.pick(exclude=tried)
+            tried.append(backend)
+            started = False
+            backend.inflight += 1
+            try:
+                async with backend.semaphore:
+                    backend.requests += 1
+                    start = time.monotonic()
+                    async for chunk in backend.llm.astream(messages, **kwargs):
+                        if not started:
+                            # 流式请求以首个分片的到达时间作为延迟
+                            started = True
+                            self._succeeded(backend, time.monotonic() - start)
+                        yield chunk
+                return
+            except Exception:
+                self._failed(backend)
+                if started or len(tried) > self.retries:
+                    raise
+            finally:
+                backend.inflight -= 1
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
+
+
+def create_pool(configs: List[Dict[str, Any]], defaults: Dict[str, Any], **options) -> LLMPool:
+    """根据config.toml中的[[llm.backends]]创建连接池，未填写的字段使用[llm]中的值"""
+    backends = []
+    for i, item in enumerate(configs):
+        conf = {**defaults, **item}
+        max_inflight = conf.get('max_inflight', 8)
+        # 每个后端独立的长连接池，连接数与并发上限一致
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight,
+                                keepalive_expiry=conf.get('keepalive', 30.0)),
+            timeout=conf.get('timeout', 120.0)
+        )
+        llm = ChatOpenAI(
+            openai_api_key=conf['api_key'],
+            model=conf['model'],
+            base_url=conf['base_url'],
+            temperature=conf['temperature'],
+            http_async_client=client,
+            max_retries=0
+        )
+        backends.append(Backend(conf.get('name', f"{conf['base_url']}#{i}"), llm,
+                                weight=conf.get('weight', 1.0), max_inflight=max_inflight))
+    return LLMPool(backends, **options)
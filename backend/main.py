@@ -1,27 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 import asyncio
-from typing import Dict, Any
+import logging
+import os
+import socket
+from typing import Dict, Any, Optional
 import uuid
-import json
 from contextlib import asynccontextmanager
 
 from pydantic_core._pydantic_core import ValidationError
 
 from backend.game_state import GameState
-from backend.base import Role, Phase
-from backend.agents import WerewolfAgent, SeerAgent, WitchAgent, VillagerAgent
-from backend.events import (
-    ConversationEvent,
-    ResurrectionEvent,
-    KillEvent,
-    CheckEvent,
-    VoteEvent,
-    AllowActEvent
-)
-
+from backend.agents import create_agents
+from backend.engine import run_game, ChannelInputSource, TurnStats, parse_input
+from backend.base import Phase
+from backend.review import KIND_NAMES, MAX_PAGE_SIZE, PAGE_SIZE, ReviewPage, ndjson
+from backend.outcomes import SpeakOutcome
+from backend.config import CONFIG, section
+from backend.store import create_store
+from backend.checkpoint import Checkpointer
+from backend.live import LiveGame, LiveRegistry, sse_event
+from backend.memory import create_summarizer
+from backend import metrics
+from backend.tracing import TraceStore
+from backend.archive import Archive
+from prometheus_client import CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
 
 agents = {}
 # 定义lifespan上下文管理器（替代原来的startup事件）
@@ -29,11 +36,18 @@ agents = {}
 async def lifespan(app: FastAPI):
     """初始化代理（启动时执行）"""
     global agents  # 声明使用全局变量
-    agents["werewolf"] = WerewolfAgent()
-    agents["seer"] = SeerAgent()
-    agents["witch"] = WitchAgent()
-    agents["villager"] = VillagerAgent()
+    agents.update(create_agents(**section('agents')))
+    if checkpointer is not None:
+        # 恢复上次运行时未结束的游戏，重新连接/game/playing即可从最近的阶段继续
+        for game_id, game_state in checkpointer.restore():
+            if not await store.exists(game_id):
+                await store.put(game_id, game_state)
+    sweeper = asyncio.create_task(sweep_games(store_config.get('sweep_interval', 60)))
     yield  # 程序运行期间会停在这里
+    sweeper.cancel()
+    live_games.cancel()
+    if archive is not None:
+        await archive.close()
 
 app = FastAPI(title="狼人杀游戏后端", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="../frontend/static"), name="/werewolf")
@@ -47,19 +61,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局游戏状态和代理
-game_states: Dict[str, GameState] = {}
-game_events: Dict[str, asyncio.Event] = {}
+engine_config = section('engine')
+# 座位数、角色配置和人类玩家座位
+table_config = section('table')
+# 人类回合的时限和超时统计
+turn_config = dict(section('turns'))
+park_after = turn_config.pop('park_after', 0)
+turn_stats = TurnStats()
+# 历史摘要和各提示词模板的token上限
+summarizer = create_summarizer(**section('memory'))
+# 可选的引擎追踪，/game/trace/{game_id}下载Chrome trace格式的JSON
+tracing_config = section('tracing')
+traces = TraceStore(tracing_config.get('keep', 50), tracing_config.get('max_spans', 50000)) \
+    if tracing_config.get('enabled', False) else None
+
+# 游戏状态存储和人类输入的通知通道；使用sqlite后端时多个worker可以共享同一批游戏
+store_config = dict(section('store'))
+store_config['path'] = str(CONFIG.parent / store_config.get('path', 'cache/games.db'))
+if 'sessions' in store_config:
+    store_config['sessions'] = dict(store_config['sessions'])
+    store_config['sessions']['path'] = str(CONFIG.parent / store_config['sessions'].get('path', 'cache/snapshots'))
+store, channel = create_store(**{k: v for k, v in store_config.items() if k not in ('sweep_interval', 'lease_ttl')})
+# 同一局游戏只由持有租约的worker运行引擎，租约超过lease_ttl秒没有续期时可以被其他worker接管
+lease_ttl = store_config.get('lease_ttl', 30)
+worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# 可选的已结束游戏归档，用backend.analytics离线分析
+archive_config = section('archive')
+archive = Archive(str(CONFIG.parent / archive_config.get('path', 'cache/archive')),
+                  model=section('llm').get('model', ''), max_pending=archive_config.get('max_pending', 10000)) \
+    if archive_config.get('enabled', False) else None
+
+checkpoint_config = section('checkpoint')
+checkpointer = Checkpointer(str(CONFIG.parent / checkpoint_config.get('path', 'cache/checkpoints'))) \
+    if checkpoint_config.get('enabled', False) else None
+
+
+async def sweep_games(interval: float):
+    """定期把空闲和已结束的游戏淘汰出内存"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.sweep()
+        except Exception:
+            logger.exception("sweeping games failed")
+
 
+# 本worker上正在运行或仍有连接的游戏；每帧只序列化一次，广播给该局的所有连接
+live_games = LiveRegistry(lambda data, frame_id: sse_event(data, event_id=frame_id),
+                          size=engine_config.get('replay_frames', 256),
+                          queue_size=engine_config.get('subscriber_queue', 64),
+                          policy=engine_config.get('slow_consumer', 'coalesce'))
 
-def sse_event(data: dict, event_name: str = None) -> str:
-    lines = []
-    if event_name:
-        lines.append(f"event: {event_name}")
-    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
-    lines.append("")  # 结尾空行
-    lines.append("")
-    return "\n".join(lines)
+# 本worker上正在运行的引擎的输入来源，用于/metrics中的引擎指标
+engines: Dict[str, ChannelInputSource] = {}
+metrics.track_engines(engines.values)
 
 @app.get("/index")
 async def index():
@@ -69,373 +125,181 @@ async def start_game():
     """开始新游戏"""
     game_id = str(uuid.uuid4())
     game_state = GameState()
-    game_events[game_id] = asyncio.Event()
-    game_events[game_id].clear()
-
-    game_state.initialize_players()
-    game_states[game_id] = game_state
 
-    # 获取用户身份（玩家6）
-    user_role = next(p.role for p in game_state.players if p.id == 6)
+    game_state.initialize_players(**table_config)
+    # 创建者占用第一个人类座位，其他人类座位通过/game/join加入；没有人类座位时创建者只能观战
+    info = seat_info(game_state)
+    token = game_state.claim_seat(info["seat"]) if info["seat"] is not None else None
+    await store.put(game_id, game_state)
+
+    return {"game_id": game_id, **info, "token": token}
+
+
+def seat_info(game_state: GameState, seat: Optional[int] = None) -> dict:
+    """
+    人类玩家的座位和身份，seat为None时为第一个人类座位；不包含座位令牌。
+    没有人类座位时seat和user_role为None。
+    """
+    if seat is None and game_state.human_seats:
+        seat = game_state.human_seats[0]
+    return {"seat": seat, "user_role": game_state.players[seat - 1].role.value if seat is not None else None,
+            "human_seats": game_state.human_seats, "seats": len(game_state.players)}
+
+
+@app.get("/game/join/{game_id}/{seat}")
+async def join_game(game_id: str, seat: int, x_seat_token: Optional[str] = Header(None)):
+    """
+    以指定的人类座位加入已经创建的游戏，返回该座位的令牌，之后的/game/send和/game/playing都要带上它。
+    每个座位只能被占用一次；已持有该座位令牌的玩家可以带上X-Seat-Token重新加入。
+    """
+    game_state = await store.get(game_id)
+    if game_state is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    if seat not in game_state.human_seats:
+        raise HTTPException(status_code=400, detail=f"玩家{seat}不是人类玩家")
+    if game_state.token_seat(x_seat_token) != seat:
+        try:
+            x_seat_token = game_state.claim_seat(seat)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        await store.put(game_id, game_state)
+        # 游戏可能正在其他worker上运行，通知它记下这个令牌
+        await channel.publish(game_id, {"etype": "JOIN", "source": seat, "token": x_seat_token})
+    return {"game_id": game_id, **seat_info(game_state, seat), "token": x_seat_token}
+
+async def heartbeat(game_id: str, input_source: ChannelInputSource, live: LiveGame):
+    """定期续期租约；租约被其他worker接管时停止本地的引擎，且不再写回存储"""
+    while True:
+        await asyncio.sleep(lease_ttl / 3)
+        if not await store.acquire(game_id, worker_id, lease_ttl):
+            logger.warning("game %s: lease lost, stopping the local engine", game_id)
+            input_source.detached = True
+            live.task.cancel()
+            return
+
+
+def frames_topic(game_id: str) -> str:
+    """运行引擎的worker把每一帧发布到这个主题，其他worker上的连接通过它观看游戏"""
+    return f"{game_id}/frames"
+
+
+async def run_engine(game_id: str, game_state: GameState, live: LiveGame):
+    """在后台运行一局游戏，把每个结果编号后发布到live，连接断开不会中断游戏"""
+    input_source = ChannelInputSource(channel, game_id, game_state, game_state.human_seats, deadlines=turn_config,
+                                      park_after=park_after, stats=turn_stats)
+    engines[game_id] = input_source
+    lease = asyncio.create_task(heartbeat(game_id, input_source, live))
+
+    async def save_checkpoint(state: GameState):
+        if not input_source.detached:
+            await checkpointer.save(game_id, state)
+
+    store.pin(game_id)
+    try:
+        async for outcome in run_game(game_state, agents, input_source,
+                                      concurrent_night=engine_config.get('concurrent_night', False),
+                                      vote_concurrency=engine_config.get('vote_concurrency', 1),
+                                      speak_interval=engine_config.get('speak_interval', 0.0),
+                                      speak_bytes=engine_config.get('speak_bytes', 512),
+                                      on_checkpoint=save_checkpoint if checkpointer else None,
+                                      summarizer=summarizer,
+                                      tracer=traces.start(game_id) if traces else None,
+                                      record=archive.recorder(game_id) if archive else None):
+            game_state.frames += 1
+            # 发言分片不改变游戏状态，其余结果产出前写回存储，其他worker读到的是最新状态
+            if not isinstance(outcome, SpeakOutcome) and not input_source.detached:
+                await store.put(game_id, game_state)
+            frame = outcome.to_frame()
+            live.publish(game_state.frames, frame)
+            if channel.shared:
+                await channel.publish(frames_topic(game_id), {"id": game_state.frames, "data": frame})
+    finally:
+        lease.cancel()
+        if channel.shared:
+            # 其他worker上转发这局游戏的连接随之结束，EventSource重连后由新的引擎或转发继续
+            await channel.publish(frames_topic(game_id), {"end": True})
+        input_source.close()
+        if engines.get(game_id) is input_source:
+            del engines[game_id]
+        store.unpin(game_id)
+        if checkpointer and game_state.game_over and not input_source.detached:
+            checkpointer.discard(game_id)
+        if archive and game_state.game_over and game_state.winner and not input_source.detached:
+            archive.finish(game_id, game_state)
+        if not input_source.detached:
+            await store.put(game_id, game_state)
+        else:
+            # 游戏已被重置或由其他worker接管，之后的连接不应重新附加到这里
+            live_games.forget(live)
+        # 重置后本worker上可能已经启动了新的引擎，租约由它继续持有
+        if live_games.get(game_id) in (None, live):
+            await store.release(game_id, worker_id)
+
+
+async def relay(game_id: str, live: LiveGame):
+    """
+    游戏正在其他worker上运行：把那边发布的帧转发给本worker上的连接，直到那边的引擎结束或这里没有连接；
+    那个worker退出、租约过期后在本worker上接管游戏。
+    """
+    messages = channel.subscribe(frames_topic(game_id), backlog=live.frames.maxlen)
+    forward = asyncio.ensure_future(forward_frames(messages, live))
+    try:
+        while True:
+            done, _ = await asyncio.wait([forward], timeout=lease_ttl / 3)
+            if done:
+                return await forward
+            if not live.subscribers:
+                return
+            if await store.acquire(game_id, worker_id, lease_ttl):
+                break
+    finally:
+        forward.cancel()
+    game_state = await store.get(game_id)
+    if game_state is None:
+        await store.release(game_id, worker_id)
+        return
+    logger.warning("game %s: lease expired, taking over the engine", game_id)
+    if live.frames:
+        # 帧id接着转发过的帧递增，重连的连接只补发缺失的帧
+        game_state.frames = max(game_state.frames, live.frames[-1].id)
+    await run_engine(game_id, game_state, live)
+
+
+async def forward_frames(messages, live: LiveGame):
+    async for message in messages:
+        if message.get("end"):
+            return
+        live.publish(message["id"], message["data"])
 
-    return {"game_id": game_id, "user_role": user_role.value}
 
 @app.get("/game/playing/{game_id}")
-async def playing(game_id: str):
-    if game_id not in game_states:
+async def playing(game_id: str, last_event_id: Optional[str] = Header(None), after: Optional[str] = None,
+                  token: Optional[str] = None):
+    """
+    推送游戏进度。每局游戏只在持有租约的worker上运行一个引擎任务，其他worker转发它发布的帧；
+    断线重连时浏览器携带Last-Event-ID，只补发缓冲区中缺失的帧，然后继续接收新帧。
+    新建的EventSource无法设置请求头，用after参数传入最近收到的帧id，用token参数传入座位令牌。
+    令牌所属座位的私有帧只发给这个连接；不带令牌时只接收公开的帧。
+    """
+    game_state = await store.get(game_id)
+    if game_state is None:
         raise HTTPException(status_code=404, detail="Game not found")
-
-    game_state = game_states[game_id]
-
-    async def event_generator():
-        while not game_state.game_over and game_state.day < 7 and game_state.step < 200:
-            while game_state.events:
-                event = game_state.get_event()
-                if event.etype == "DISPLAY":
-                    game_state.step += 1
-                    yield sse_event({
-                        "type": "display",
-                        "content": event.content,
-                        "day": game_state.day,
-                        "phase": game_state.phase,
-                        "alive": game_state.alive_players
-                    })
-                elif event.etype == "ALLOW_ACT":
-                    game_state.step += 1
-                    pid = event.target
-                    player = game_state.players[pid - 1]
-                    if pid == 6:
-                        if player.role == Role.WEREWOLF:
-                            tmp = [p.id for p in game_state.players if (p.role == Role.WEREWOLF) and (p.id != 6) and (p.id in game_state.alive_players)]
-                            yield sse_event({
-                                "type": "act",
-                                "content": "请选择你的行动",
-                                "day": game_state.day,
-                                "phase": game_state.phase,
-                                # 在前端用户可以执行的操作
-                                "action": ["conversation", "kill"],
-                                # "CONVERSATION"操作对应的玩家ID列表
-                                "conversation": tmp,
-                                # "KILL"操作对应的玩家ID列表，可以杀死自己
-                                "kill": [i for i in game_state.alive_players if i not in tmp]
-                            })
-                        elif player.role == Role.WITCH:
-                            info = {
-                                "type": "act",
-                                "content": "请选择你的行动",
-                                "day": game_state.day,
-                                "phase": game_state.phase,
-                                # 在前端用户可以执行的操作
-                                "action": ["resurrection", "kill", "none"],
-                                # "RESURRECTION"操作对应的玩家ID列表
-                                "resurrection": game_state.just_killed,
-                                # "KILL"操作对应的玩家ID列表
-                                "kill": [i for i in game_state.alive_players if i != 6],
-                                # "NONE"操作对应的玩家ID列表
-                                "none": []
-                            }
-                            if player.good_drup == 0:
-                                del info["resurrection"]
-                                info["action"].remove("resurrection")
-                            if player.bad_drup == 0:
-                                del info["kill"]
-                                info["action"].remove("kill")
-                            yield sse_event(info)
-                        elif player.role == Role.SEER:
-                            yield sse_event({
-                                "type": "act",
-                                "content": "请选择你的行动",
-                                "day": game_state.day,
-                                "phase": game_state.phase,
-                                # 在前端用户可以执行的操作
-                                "action": ["check"],
-                                # "CHECK"操作对应的玩家ID列表
-                                "check": [i for i in game_state.alive_players if i != 6]
-                            })
-                        game_events[game_id].clear()
-                        await game_events[game_id].wait()
-                    else:
-                        if player.role == Role.WEREWOLF:
-                            result = await agents["werewolf"].act(game_state, player, count=game_state.conversations)
-                            if not result:
-                                game_state.add_event(event)
-                            else:
-                                yield sse_event({
-                                    "type": "display",
-                                    "content": "狼人正在行动",
-                                    "day": game_state.day,
-                                    "phase": game_state.phase,
-                                    "alive": game_state.alive_players
-                                })
-
-                                if result["action"] == "conversation":
-                                    game_state.add_event(ConversationEvent(day=game_state.day, phase=game_state.phase,
-                                                                           source=player.id, target=result["target"],
-                                                                           content=result["content"],
-                                                                           count=game_state.conversations))
-                                else:
-                                    game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
-                                                                   source=pid, target=result["target"]))
-                        elif player.role == Role.WITCH:
-                            result = await agents["witch"].act(game_state, player, game_state.just_killed[0])
-                            if not result:
-                                game_state.add_event(event)
-                            else:
-                                yield sse_event({
-                                    "type": "display",
-                                    "content": "女巫正在行动",
-                                    "day": game_state.day,
-                                    "phase": game_state.phase,
-                                    "alive": game_state.alive_players
-                                })
-                                if result["action"] == "kill":
-                                    game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
-                                                                   source=pid, target=result["target"]))
-                                elif result["action"] == "resurrection":
-                                    game_state.add_event(
-                                        ResurrectionEvent(day=game_state.day, phase=game_state.phase, source=pid,
-                                                          reason=result["reason"], target=result["target"]))
-                                else:
-                                    game_state.add_system_history(content=f"玩家{player.id}选择什么也不做。理由是：{result['reason']}")
-                                    game_state.add_player_history(player.id, content=f"我选择什么也不做理由是：{result['reason']}")
-                        elif player.role == Role.SEER:
-                            result = await agents["seer"].act(game_state, player)
-                            if not result:
-                                game_state.add_event(event)
-                            else:
-                                yield sse_event({
-                                    "type": "display",
-                                    "content": "预言家正在行动",
-                                    "day": game_state.day,
-                                    "phase": game_state.phase,
-                                    "alive": game_state.alive_players
-                                })
-                                game_state.add_event(CheckEvent(day=game_state.day, phase=game_state.phase, source=pid,
-                                                                target=result["target"], reason=result["reason"]))
-                elif event.etype == "CONVERSATION":
-                    game_state.step += 1
-                    sid = event.source
-                    tid = event.target
-                    player = game_state.players[tid - 1]
-                    game_state.conversations += 1
-                    game_state.add_system_history(content=f"玩家{sid}向玩家{tid}发送消息：{event.content}")
-                    game_state.add_player_history(sid, content=f"我向玩家{tid}发送消息：{event.content}")
-                    game_state.add_player_history(tid, content=f"玩家{sid}向我发送消息：{event.content}")
-                    if tid == 6:
-                        tmp = [p.id for p in game_state.players if (p.role == Role.WEREWOLF) and (p.id != 6) and (p.id in game_state.alive_players)]
-                        yield sse_event({
-                                "type": "conversation",
-                                "content": f"玩家{sid}(你的队友)说：" + event.content + "\n请选择你的行动",
-                                "day": game_state.day,
-                                "phase": game_state.phase,
-                                "source": sid,
-                                # 在前端用户可以执行的操作
-                                "action": ["conversation", "kill"] if tmp else ["kill"],
-                                # "CONVERSATION"操作对应的玩家ID列表
-                                "conversation": tmp,
-                                # "KILL"操作对应的玩家ID列表
-                                "kill": [i for i in game_state.alive_players if i not in tmp]
-                        })
-                        game_events[game_id].clear()
-                        await game_events[game_id].wait()
-                    else:
-                        result = await agents["werewolf"].act(game_state, player, count=game_state.conversations)
-                        if not result:
-                            game_state.add_event(event)
-                        else:
-                            if result["action"] == "conversation":
-                                game_state.add_event(
-                                    ConversationEvent(day=game_state.day, phase=game_state.phase,
-                                                      source=player.id, target=result["target"],
-                                                      content=result["content"], count=game_state.conversations))
-                            else:
-                                game_state.add_event(KillEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
-                                                               source=tid, target=result["target"]))
-                elif event.etype == "KILL":
-                    game_state.step += 1
-                    sid = event.source
-                    splayer = game_state.players[sid - 1]
-                    tid = event.target
-                    if splayer.role == Role.WEREWOLF:
-                        wid = [p.id for p in game_state.players if p.role == Role.WEREWOLF]
-                        for e in game_state.events:
-                            if isinstance(e, AllowActEvent) or isinstance(e, ConversationEvent) or isinstance(e,
-                                                                                                              KillEvent):
-                                if e.target in wid:
-                                    game_state.events.remove(e)
-                                    break
-                    game_state.add_just_killed(tid, sid)
-                    game_state.add_system_history(content=f"玩家{sid}杀死了玩家{tid},理由是：{event.reason}")
-                    game_state.add_player_history(sid, content=f"我杀死了玩家{tid},理由是：{event.reason}")
-                    if sid == 6:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"你杀死了玩家{tid}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-                    if game_state.players[5].role == Role.WEREWOLF and sid != 6:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"你的队友玩家{sid}杀死了玩家{tid}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-
-                elif event.etype == "RESURRECTION":
-                    game_state.step += 1
-                    sid = event.source
-                    tid = event.target
-                    game_state.resurrection(tid, sid)
-                    game_state.add_system_history(content=f"玩家{sid}复活了玩家{tid},理由是：{event.reason}")
-                    game_state.add_player_history(sid, content=f"我复活了玩家{tid},理由是：{event.reason}")
-                    if sid == 6:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"你复活了玩家{tid}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-                elif event.etype == "CHECK":
-                    game_state.step += 1
-                    sid = event.source
-                    tid = event.target
-                    tplayer = game_state.players[tid - 1]
-                    m = {
-                        Role.WEREWOLF: '狼人',
-                        Role.WITCH: '女巫',
-                        Role.SEER: '预言家',
-                        Role.VILLAGER: '平民'
-                    }
-
-                    role = m[tplayer.role]
-                    game_state.add_system_history(content=f"玩家{sid}检查了玩家{tid}的身份，玩家{tid}的身份为{role},理由是：{event.reason}")
-                    game_state.add_player_history(sid, content=f"我检查了玩家{tid}的身份，玩家{tid}的身份为{role},理由是：{event.reason}")
-                    if sid == 6:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"玩家{tid}的身份是{role}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-                elif event.etype == "PHASE_CHANGE":
-                    game_state.step += 1
-                    game_state.phase = event.change
-                    if game_state.phase == Phase.DAY:
-                        game_state.kill_player()
-                        game_state.when_day_event()
-                        tmp = (' | '.join([f'玩家{i}' for i in game_state.just_killed]) + '被杀死了') \
-                            if game_state.just_killed else '没有人死亡'
-
-                        game_state.add_system_history(
-                            content=f"现在是白天,昨晚{tmp}")
-                        del tmp
-                    elif game_state.phase == Phase.COUNT_VOTES:
-                        game_state.set_out()
-                        if game_state.check_game_over():
-                            game_state.game_over = True
-                            yield sse_event({
-                                "type": "finish",
-                                "winner": game_state.winner,
-                                "game_over": True
-                            })
-                        game_state.when_count_vote_event()
-                elif event.etype == "ALLOW_SPEAK":
-                    game_state.step += 1
-                    pid = event.target
-                    player = game_state.players[pid - 1]
-                    if player.id != 6:
-                        # agent = agents.get(game_state.role_map.get(player.role))
-                        agent = agents.get(player.role)
-                        tmp = ""
-                        mid = str(uuid.uuid4())
-                        async for chunk in agent.speak(game_state, player):
-                            tmp += chunk
-                            yield sse_event({
-                                "type": "speak",
-                                "id": player.id,
-                                "content": chunk,
-                                "phase": game_state.phase,
-                                "day": game_state.day,
-                                "mid": mid
-                            })
-                        del mid
-                        game_state.add_system_history(content=f"玩家{pid}发言：{tmp}")
-                        game_state.add_player_history(pid, content=f"我的发言：{tmp}")
-                    else:
-                        yield sse_event({
-                            "type": "user_speak",
-                            "content": "开始你的发言",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            # 在前端用户可以执行的操作
-                            "action": ["speak"],
-                            "alive": game_state.alive_players
-                        })
-                        game_events[game_id].clear()
-                        await game_events[game_id].wait()
-                elif event.etype == "ALLOW_VOTE":
-                    game_state.step += 1
-                    pid = event.target
-                    player = game_state.players[pid - 1]
-                    if pid == 6:
-                        yield sse_event({
-                            "type": "voting",
-                            "content": "请进行投票",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            # 在前端用户可以执行的操作
-                            "action": ["voting"],
-                            # "VOTING"操作对应的玩家ID列表
-                            "voting": game_state.alive_players,
-                            "alive": game_state.alive_players
-                        })
-                        game_events[game_id].clear()
-                        await game_events[game_id].wait()
-                    else:
-                        agent = agents.get(player.role)
-                        result = await agent.vote(game_state, player)
-                        if not result:
-                            game_state.add_event(event)
-                        else:
-                            if result["action"] == "vote":
-                                game_state.add_event(
-                                    VoteEvent(day=game_state.day, phase=game_state.phase, reason=result["reason"],
-                                              source=player.id, target=result["target"]))
-                elif event.etype == "VOTE":
-                    game_state.step += 1
-                    sid = event.source
-                    tid = event.target
-                    game_state.vote(tid)
-                    game_state.add_system_history(content=f"玩家{sid}投票给了玩家{tid},理由是：{event.reason}")
-                    game_state.add_player_history(sid, content=f"我投票给了玩家{tid},理由是：{event.reason}")
-                    if sid == 6:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"你投票给了玩家{tid}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-                    else:
-                        yield sse_event({
-                            "type": "display",
-                            "content": f"玩家{sid}投票给了玩家{tid}",
-                            "day": game_state.day,
-                            "phase": game_state.phase,
-                            "alive": game_state.alive_players
-                        })
-                elif event.etype == "DAY_CHANGE":
-                    game_state.next_day()
-
-                continue
+    seat = game_state.token_seat(token)
+    if token and seat is None:
+        raise HTTPException(status_code=403, detail="Invalid seat token")
+    live = live_games.get(game_id)
+    if live is None or not live.running:
+        # 多个worker共享存储时，游戏可能正在其他worker上运行，不能再启动第二个引擎，改为转发那边的帧
+        owner = await store.acquire(game_id, worker_id, lease_ttl)
+        # 读取存储和获取租约期间可能已有其他连接启动了这局游戏
+        live = live_games.get(game_id)
+        if live is None:
+            live = live_games.create(game_id)
+        if not live.running:
+            live.start(run_engine(game_id, game_state, live) if owner else relay(game_id, live))
 
     return StreamingResponse(
-        event_generator(),
+        live.subscribe(last_event_id or after, seat),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -446,84 +310,137 @@ async def playing(game_id: str):
 
 
 @app.post("/game/send/{game_id}")
-async def send(game_id: str, event: Dict[str, Any]):
-    if game_id not in game_states:
+async def send(game_id: str, event: Dict[str, Any], x_seat_token: Optional[str] = Header(None)):
+    """提交人类玩家的决策，座位由X-Seat-Token确定，source与令牌的座位不一致时拒绝"""
+    game_state = await store.get(game_id)
+    if game_state is None:
         raise HTTPException(status_code=404, detail="Game not found")
-
-    game_state = game_states[game_id]
-    print(event)
-
-    if event["etype"] == "NONE":
-        game_state.add_system_history(content="玩家6什么也没有做")
-        game_state.add_player_history(6, content="我什么也没有做")
-    elif event["etype"] == "SPEAK":
-        game_state.add_system_history(f"玩家6说：{event['content']}")
-        game_state.add_player_history(6, content=f"我说：{event['content']}")
-    else:
-        try:
-            # 根据事件类型创建对应的事件对象
-            event_map = {
-                "CONVERSATION": ConversationEvent,
-                "RESURRECTION": ResurrectionEvent,
-                "KILL": KillEvent,
-                "CHECK": CheckEvent,
-                "VOTE": VoteEvent
-            }
-
-            if event["etype"] not in event_map:
-                raise HTTPException(status_code=400, detail=f"Invalid event type: {event['etype']}")
-
-            # 转换为具体的事件类型并验证
-            if event["etype"] == "CONVERSATION":
-                specific_event = event_map[event["etype"]](**event, day=game_state.day, phase=game_state.phase, count=game_state.conversations)
-            else:
-                specific_event = event_map[event["etype"]](**event, day=game_state.day, phase=game_state.phase)
-
-            # 将事件添加到游戏状态
-            game_states[game_id].add_event(specific_event)
-
-        except ValidationError as e:
-            raise HTTPException(status_code=400, detail=f"Invalid event data: {str(e)}")
-    game_events[game_id].set()
+    seat = game_state.token_seat(x_seat_token)
+    if seat is None:
+        raise HTTPException(status_code=403, detail="Invalid seat token")
+    if event.get("source", seat) != seat:
+        raise HTTPException(status_code=403, detail=f"令牌属于玩家{seat}，不能以玩家{event['source']}的身份提交")
+    event = dict(event, source=seat)
+
+    try:
+        # 只在这里校验，由运行该局游戏的worker收到消息后写入游戏状态
+        parse_input(game_state, event)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event data: {str(e)}")
+    await channel.publish(game_id, event)
     return {"status": "success"}
 
 
 @app.get("/game/end/{game_id}")
 async def end_game(game_id: str):
     """结束游戏"""
-    if game_id not in game_states:
+    game_state = await store.get(game_id)
+    if game_state is None:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    game_state = game_states[game_id]
     game_state.game_over = True
+    await store.put(game_id, game_state)
+    await channel.publish(game_id, {"etype": "END"})
 
     return {"status": "success"}
 
 
 @app.get("/game/reset/{game_id}")
-async def reset_game(game_id: str):
-    """重置游戏"""
-    if game_id not in game_states:
+async def reset_game(game_id: str, x_seat_token: Optional[str] = Header(None)):
+    """重置游戏，已加入的玩家保留座位和令牌；带X-Seat-Token时返回该座位的新身份"""
+    previous = await store.get(game_id)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Game not found")
-
+    seat = previous.token_seat(x_seat_token)
+
+    # 先通知正在运行的旧游戏停止写回，再保存新游戏
+    await channel.publish(game_id, {"etype": "RESET"})
+    live = live_games.get(game_id)
+    if live is not None:
+        live_games.forget(live)
+    if archive is not None:
+        archive.discard(game_id)
     game_state = GameState()
-    game_state.initialize_players()
-    game_states[game_id] = game_state
-    game_events[game_id].clear()
+    game_state.initialize_players(**table_config)
+    game_state.seat_tokens = {seat: token for seat, token in previous.seat_tokens.items()
+                              if seat in game_state.human_seats}
+    await store.put(game_id, game_state)
+
+    return {"status": "success", **seat_info(game_state, seat)}
+
+
+@app.get("/game/review/{game_id}", response_model=ReviewPage)
+async def game_review(game_id: str, day: Optional[int] = None, phase: Optional[Phase] = None,
+                      seat: Optional[int] = None, kind: Optional[str] = None, cursor: int = Query(0, ge=0),
+                      limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), format: str = "json"):
+    """
+    获取游戏复盘，可按天、阶段、座位和事件类型过滤。
+    返回的next_cursor作为下一次请求的cursor参数，为null时没有更多记录。
+    format=ndjson时以NDJSON流式输出，limit默认不限制；json格式的limit默认为PAGE_SIZE。
+    """
+    if kind is not None and kind not in KIND_NAMES:
+        raise HTTPException(status_code=400, detail=f"Invalid kind: {kind}, expected one of {KIND_NAMES}")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}")
+    game_state = await store.get(game_id)
+    if game_state is None:
+        raise HTTPException(status_code=404, detail="Game not found")
 
-    user_role = next(p.role for p in game_state.players if p.id == 6)
+    index = game_state.review_index
+    if format == "ndjson":
+        positions, _ = index.query(day, phase, seat, kind, cursor, limit)
+        return StreamingResponse(ndjson(index, positions), media_type="application/x-ndjson")
+    positions, next_cursor = index.query(day, phase, seat, kind, cursor, limit or PAGE_SIZE)
+    # 内部事件不经过pydantic，在这里由response_model校验和序列化
+    return {"events": [index.item(pos) for pos in positions], "next_cursor": next_cursor}
 
-    return {"status": "success", "user_role": user_role.value}
 
+@app.get("/game/trace/{game_id}")
+async def game_trace(game_id: str):
+    """下载一局游戏的追踪，可在chrome://tracing或ui.perfetto.dev中打开"""
+    tracer = traces.get(game_id) if traces else None
+    if tracer is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return JSONResponse(tracer.to_chrome(),
+                        headers={"Content-Disposition": f'attachment; filename="trace-{game_id}.json"'})
+
+
+@app.get("/stats/store")
+async def store_stats():
+    """内存中的游戏数、磁盘快照数以及淘汰/加载次数"""
+    return store.stats()
+
+
+@app.get("/stats/live")
+async def live_stats():
+    """本worker上运行的游戏数、连接数，以及慢连接被丢帧、合并和断开的次数"""
+    return live_games.stats()
+
+
+@app.get("/stats/archive")
+async def archive_stats():
+    """归档队列中等待写入、已写入和丢弃的游戏数"""
+    return archive.stats() if archive else {}
+
+
+@app.get("/stats/turns")
+async def turn_stats_endpoint():
+    """人类回合按类型统计的超时次数、智能体代为决策次数和游戏暂停次数"""
+    return turn_stats.to_dict()
+
+
+@app.get("/stats/agents")
+async def agent_stats():
+    """各角色智能体按阶段统计的重试次数和兜底决策次数"""
+    return {name: agent.stats() for name, agent in agents.items()}
 
-@app.get("/game/review/{game_id}")
-async def game_review(game_id: str):
-    """获取游戏复盘"""
-    if game_id not in game_states:
-        raise HTTPException(status_code=404, detail="Game not found")
 
-    game_state = game_states[game_id]
-    return {"events": [e.dict() for e in game_state.histories[0]]}
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus文本格式的LLM调用和引擎指标"""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+"""
+历史记忆模式：每天投票结束后把当天的记录压缩成每个玩家各自的摘要，之后的提示词用摘要代替已结束各天的原始记录。
+- extractive：按规则压缩，去掉行动理由、发言只保留第一句、投票合并为一行，同步完成
+- llm：在后台由LLM生成摘要，失败或超时时退回extractive；当晚的行动在摘要写入之后才开始
+"""
+import asyncio
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+from backend.base import Phase
+from backend.events import Event
+from backend.game_state import GameState
+from backend.history import PUBLIC_PHASES, render
+from backend.prompts import SUMMARY, set_budgets
+
+logger = logging.getLogger(__name__)
+
+MODES = ("none", "extractive", "llm")
+REASON = re.compile(r"[,，。]?\s*理由是[:：].*$", re.S)
+VOTE = re.compile(r"^玩家(\d+)投票给了玩家(\d+)")
+SPEECH = re.compile(r"^(玩家\d+(?:发言|说)[:：])(.*)$", re.S)
+SENTENCE = re.compile(r"^.*?[。！？!?]")
+
+
+def day_events(game_state: GameState, pid: int, day: int) -> List[Event]:
+    """玩家pid可见的某一天的记录：自己的夜晚记录在前，公共记录在后，与get_history的顺序一致"""
+    own = [e for e in game_state.histories.get(pid, []) if e.day == day and e.phase == Phase.NIGHT]
+    public = [e for e in game_state.histories[0] if e.day == day and e.phase in PUBLIC_PHASES]
+    return own + public
+
+
+def extractive(events: List[Event], speech_chars: int = 40) -> str:
+    parts = []
+    votes = []
+    for event in events:
+        content = REASON.sub("", event.content)
+        vote = VOTE.match(content)
+        if vote:
+            votes.append(f"{vote.group(1)}→{vote.group(2)}")
+            continue
+        speech = SPEECH.match(content)
+        if speech:
+            text = speech.group(2).strip()
+            first = SENTENCE.match(text)
+            text = first.group(0) if first else text
+            if len(text) > speech_chars:
+                text = text[:speech_chars] + "…"
+            content = speech.group(1) + text
+        parts.append(content)
+    if votes:
+        parts.append("投票：" + "，".join(votes))
+    return "；".join(parts)
+
+
+class Summarizer:
+    """为每个存活的智能体玩家生成已结束各天的摘要，写入game_state.summaries"""
+
+    def __init__(self, mode: str = "extractive", concurrency: int = 4, speech_chars: int = 40,
+                 timeout: float = 20.0):
+        if mode not in MODES or mode == "none":
+            raise ValueError(f"Unknown memory mode: {mode}")
+        self.mode = mode
+        self.speech_chars = speech_chars
+        # llm模式单个摘要（含排队）的时限，夜晚开始前最多等待这么久；0表示不限制
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.summaries = 0
+        self.failures = 0
+
+    def schedule(self, game_state: GameState, day: int, pids: Iterable[int]) -> List[asyncio.Task]:
+        """当天的记录已完整时调用；llm模式返回后台任务，由调用方在当晚的行动之前等待，游戏结束时取消"""
+        tasks = []
+        for pid in pids:
+            if self.mode == "extractive":
+                self._store(game_state, pid, day, extractive(day_events(game_state, pid, day), self.speech_chars))
+            else:
+                tasks.append(asyncio.ensure_future(self._summarize(game_state, pid, day)))
+        return tasks
+
+    def _store(self, game_state: GameState, pid: int, day: int, text: str):
+        game_state.summaries.setdefault(pid, {})[day] = text
+        self.summaries += 1
+
+    async def _summarize(self, game_state: GameState, pid: int, day: int):
+        events = day_events(game_state, pid, day)
+        try:
+            from backend.llm import llm
+            async with asyncio.timeout(self.timeout or None), self.semaphore:
+                response = await llm.agenerate([SUMMARY.render(pid=pid, day=day,
+                                                               history="\n".join(render(e) for e in events))])
+            text = response.generations[0][0].text.strip()
+            if not text:
+                raise ValueError("empty summary")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("summary for player %s day %s failed, using extractive", pid, day)
+            self.failures += 1
+            text = extractive(events, self.speech_chars)
+        self._store(game_state, pid, day, text)
+
+    def stats(self) -> Dict[str, int]:
+        return {"summaries": self.summaries, "failures": self.failures}
+
+
+def create_summarizer(mode: str = "none", budgets: Optional[Dict[str, int]] = None,
+                      **options) -> Optional[Summarizer]:
+    """根据config.toml中的[memory]设置各模板的token上限并创建摘要器；mode为none时返回None"""
+    set_budgets(budgets or {})
+    if mode == "none":
+        return None
+    return Summarizer(mode, **options)
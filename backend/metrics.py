@@ -0,0 +1,144 @@
+"""
+Prometheus指标，由/metrics以文本格式输出。
+- LLM调用：按角色、阶段和调用类型（act/speak）统计请求数、总延迟、流式发言的首个分片延迟、
+  提示词和输出的token数，以及输出无法解析、重试和兜底决策的次数
+- 引擎：本worker上正在运行的游戏数、正在等待人类玩家的游戏数和调度器中排队的事件数
+延迟和token数使用直方图，可以在Prometheus中计算分位数。
+"""
+import time
+from typing import Callable, Iterable, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+from backend import archive, tracing
+from backend.tokens import count_tokens
+
+REGISTRY = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+LLM_REQUESTS = Counter("werewolf_llm_requests", "LLM requests by result",
+                       ["role", "phase", "kind", "result"], registry=REGISTRY)
+# 天数只作为计数器的标签，避免直方图的序列数随天数增长
+LLM_REQUESTS_BY_DAY = Counter("werewolf_llm_requests_by_day", "LLM requests by game day",
+                              ["role", "day"], registry=REGISTRY)
+LLM_LATENCY = Histogram("werewolf_llm_latency_seconds", "Total LLM call latency",
+                        ["role", "phase", "kind"], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+LLM_TTFT = Histogram("werewolf_llm_time_to_first_token_seconds", "Time to the first streamed chunk",
+                     ["role", "phase"], buckets=TTFT_BUCKETS, registry=REGISTRY)
+LLM_PROMPT_TOKENS = Histogram("werewolf_llm_prompt_tokens", "Prompt tokens per LLM call",
+                              ["role", "phase", "kind"], buckets=TOKEN_BUCKETS, registry=REGISTRY)
+LLM_COMPLETION_TOKENS = Histogram("werewolf_llm_completion_tokens", "Completion tokens per LLM call",
+                                  ["role", "phase", "kind"], buckets=TOKEN_BUCKETS, registry=REGISTRY)
+LLM_PARSE_FAILURES = Counter("werewolf_llm_parse_failures", "Decisions that failed to parse or validate",
+                             ["role", "phase"], registry=REGISTRY)
+LLM_RETRIES = Counter("werewolf_llm_retries", "Decision retries", ["role", "phase"], registry=REGISTRY)
+LLM_FALLBACKS = Counter("werewolf_llm_fallbacks", "Deterministic fallback decisions after retries ran out",
+                        ["role", "phase"], registry=REGISTRY)
+
+GAMES_ACTIVE = Gauge("werewolf_games_active", "Games whose engine is running on this worker", registry=REGISTRY)
+GAMES_WAITING_HUMAN = Gauge("werewolf_games_waiting_human", "Running games blocked on a human decision",
+                            registry=REGISTRY)
+EVENTS_QUEUED = Gauge("werewolf_events_queued", "Events queued in the schedulers of running games",
+                      registry=REGISTRY)
+
+
+def _prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _completion_text(response) -> str:
+    try:
+        return response.generations[0][0].text
+    except (AttributeError, IndexError):
+        return ""
+
+
+def _usage(response) -> Optional[dict]:
+    """OpenAI返回的token用量，缓存回放等没有用量时返回None"""
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage")
+    if usage:
+        return usage
+    # 流式分片的用量在usage_metadata中，需要请求时开启stream_usage
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata:
+        return {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+    return None
+
+
+class LLMCall:
+    """
+    一次LLM调用的计时和token统计：
+        call = LLMCall(role, phase, day, "act", messages)
+        response = await llm.agenerate(...)
+        call.done(response=response, text=...)
+    流式调用在收到首个分片时调用call.first_chunk()。
+    """
+    __slots__ = ("role", "phase", "day", "kind", "seat", "messages", "start", "first")
+
+    def __init__(self, role: str, phase: str, day: int, kind: str, messages, seat: int = 0):
+        self.role = role
+        self.phase = phase
+        self.day = day
+        self.kind = kind
+        self.seat = seat
+        self.messages = messages
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        LLM_REQUESTS_BY_DAY.labels(role, str(day)).inc()
+
+    def first_chunk(self):
+        if self.first is None:
+            self.first = time.perf_counter() - self.start
+            LLM_TTFT.labels(self.role, self.phase).observe(self.first)
+
+    def done(self, response=None, text: str = ""):
+        end = time.perf_counter()
+        LLM_LATENCY.labels(self.role, self.phase, self.kind).observe(end - self.start)
+        LLM_REQUESTS.labels(self.role, self.phase, self.kind, "ok").inc()
+        usage = _usage(response) if response is not None else None
+        prompt = usage.get("prompt_tokens") if usage else None
+        completion = usage.get("completion_tokens") if usage else None
+        if prompt is None:
+            prompt = count_tokens(_prompt_text(self.messages))
+        if completion is None:
+            completion = count_tokens(text or _completion_text(response))
+        LLM_PROMPT_TOKENS.labels(self.role, self.phase, self.kind).observe(prompt)
+        LLM_COMPLETION_TOKENS.labels(self.role, self.phase, self.kind).observe(completion)
+        self._trace(end, prompt_tokens=prompt, completion_tokens=completion)
+        self._archive(end, prompt, completion, True)
+
+    def failed(self):
+        end = time.perf_counter()
+        LLM_LATENCY.labels(self.role, self.phase, self.kind).observe(end - self.start)
+        LLM_REQUESTS.labels(self.role, self.phase, self.kind, "error").inc()
+        self._trace(end, error=True)
+        self._archive(end, 0, 0, False)
+
+    def _trace(self, end: float, **args):
+        tracer = tracing.current()
+        if tracer is not None:
+            if self.first is not None:
+                args["ttft_ms"] = round(self.first * 1e3, 1)
+            tracer.complete("llm " + self.kind, "llm", self.start, end, self.seat,
+                            role=self.role, phase=self.phase, day=self.day, **args)
+
+    def _archive(self, end: float, prompt: int, completion: int, ok: bool):
+        record = archive.current()
+        if record is not None and self.seat:
+            record.call(self.role, self.phase, self.day, self.kind, self.seat, end - self.start, prompt, completion, ok)
+
+
+def track_engines(sources: Callable[[], Iterable]):
+    """sources返回本worker上正在运行的各局游戏的输入来源（带有game_state和blocked属性）"""
+    GAMES_ACTIVE.set_function(lambda: sum(1 for _ in sources()))
+    GAMES_WAITING_HUMAN.set_function(lambda: sum(1 for source in sources() if source.blocked))
+    EVENTS_QUEUED.set_function(lambda: sum(len(source.game_state.events) for source in sources()))
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
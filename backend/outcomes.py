@@ -0,0 +1,243 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+from backend.base import Phase
+
+# 同时接受Phase和它的字符串值
+_PHASES = {phase.value: phase for phase in Phase}
+
+
+class Outcome:
+    """
+    引擎每处理一个事件产生的结果记录，由调用方决定如何输出（SSE、日志、统计）。
+    发言的每个分片都是一个结果，因此与Event一样是带__slots__的普通对象，构造时不做校验；
+    to_frame直接生成推送给前端的JSON字典，需要pydantic模型（校验、接口文档）时用to_model转换。
+    """
+    __slots__ = ()
+    type = "outcome"
+    # 按此顺序写入帧，type总在最前
+    FIELDS = ()
+
+    def to_frame(self) -> Dict[str, Any]:
+        frame = {"type": self.type}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, Phase):
+                value = value.value
+            elif isinstance(value, list):
+                # 帧保存在重放缓冲区中，不与游戏状态共享列表
+                value = list(value)
+            frame[name] = value
+        return frame
+
+    def to_model(self) -> BaseModel:
+        return FRAME_MODELS[self.type].model_validate(self.to_frame())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={getattr(self, k)!r}' for k in self.FIELDS)})"
+
+
+class DisplayOutcome(Outcome):
+    __slots__ = ("content", "day", "phase", "alive", "seat")
+    type = "display"
+    FIELDS = ("content", "day", "phase", "alive", "seat")
+
+    def __init__(self, content: str, day: int, phase: Phase, alive: List[int], seat: Optional[int] = None):
+        self.content = content
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.alive = alive
+        # 只发给该座位的人类玩家，None表示所有人可见
+        self.seat = seat
+
+    def to_frame(self) -> Dict[str, Any]:
+        frame = super().to_frame()
+        if self.seat is None:
+            del frame["seat"]
+        return frame
+
+
+class SpeakOutcome(Outcome):
+    # 智能体流式发言的一个分片
+    __slots__ = ("id", "content", "phase", "day", "mid")
+    type = "speak"
+    FIELDS = ("id", "content", "phase", "day", "mid")
+
+    def __init__(self, id: int, content: str, phase: Phase, day: int, mid: str):
+        self.id = id
+        self.content = content
+        self.phase = _PHASES[phase]
+        self.day = day
+        self.mid = mid
+
+    def to_frame(self) -> Dict[str, Any]:
+        return {"type": "speak", "id": self.id, "content": self.content, "phase": self.phase.value,
+                "day": self.day, "mid": self.mid}
+
+
+class ActOutcome(Outcome):
+    # 请求人类玩家在夜晚行动
+    __slots__ = ("content", "day", "phase", "seat", "action", "targets")
+    type = "act"
+    FIELDS = ("content", "day", "phase", "seat", "action")
+
+    def __init__(self, day: int, phase: Phase, seat: int, action: List[str],
+                 targets: Optional[Dict[str, List[int]]] = None, content: str = "请选择你的行动"):
+        self.content = content
+        self.day = day
+        self.phase = _PHASES[phase]
+        # 等待决策的座位，前端只对自己的座位显示操作
+        self.seat = seat
+        self.action = action
+        # 每个操作对应的玩家ID列表，作为帧的同名字段
+        self.targets = targets or {}
+
+    def to_frame(self) -> Dict[str, Any]:
+        frame = super().to_frame()
+        frame.update((name, list(ids)) for name, ids in self.targets.items())
+        return frame
+
+
+class ConversationOutcome(ActOutcome):
+    # 狼人队友发来的私信，等待人类玩家回应
+    __slots__ = ("source",)
+    type = "conversation"
+    FIELDS = ActOutcome.FIELDS + ("source",)
+
+    def __init__(self, day: int, phase: Phase, seat: int, action: List[str], source: int,
+                 targets: Optional[Dict[str, List[int]]] = None, content: str = "请选择你的行动"):
+        super().__init__(day, phase, seat, action, targets, content)
+        self.source = source
+
+
+class UserSpeakOutcome(Outcome):
+    __slots__ = ("content", "day", "phase", "seat", "action", "alive")
+    type = "user_speak"
+    FIELDS = ("content", "day", "phase", "seat", "action", "alive")
+
+    def __init__(self, day: int, phase: Phase, seat: int, alive: List[int], content: str = "开始你的发言"):
+        self.content = content
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.seat = seat
+        self.action = ["speak"]
+        self.alive = alive
+
+
+class VotingOutcome(Outcome):
+    __slots__ = ("content", "day", "phase", "seat", "action", "voting", "alive")
+    type = "voting"
+    FIELDS = ("content", "day", "phase", "seat", "action", "voting", "alive")
+
+    def __init__(self, day: int, phase: Phase, seat: int, voting: List[int], alive: List[int],
+                 content: str = "请进行投票"):
+        self.content = content
+        self.day = day
+        self.phase = _PHASES[phase]
+        self.seat = seat
+        self.action = ["voting"]
+        self.voting = voting
+        self.alive = alive
+
+
+class FinishOutcome(Outcome):
+    __slots__ = ("winner", "game_over")
+    type = "finish"
+    FIELDS = ("winner", "game_over")
+
+    def __init__(self, winner: Optional[str] = None):
+        self.winner = winner
+        self.game_over = True
+
+
+class ParkedOutcome(Outcome):
+    # 人类玩家长时间没有操作，游戏暂停并释放资源，重新连接后从当前回合继续
+    __slots__ = ("content",)
+    type = "parked"
+    FIELDS = ("content",)
+
+    def __init__(self, content: str = "长时间未操作，游戏已暂停"):
+        self.content = content
+
+
+class Frame(BaseModel):
+    """推送给前端的帧的pydantic模型，与各结果的to_frame一致；只在需要校验或生成接口文档时使用"""
+    type: str
+
+
+class DisplayFrame(Frame):
+    type: str = "display"
+    content: str
+    day: int
+    phase: Phase
+    alive: List[int]
+    seat: Optional[int] = None
+
+
+class SpeakFrame(Frame):
+    type: str = "speak"
+    id: int
+    content: str
+    phase: Phase
+    day: int
+    mid: str
+
+
+class ActFrame(Frame):
+    # 每个操作对应的玩家ID列表是以操作命名的额外字段
+    model_config = ConfigDict(extra="allow")
+    type: str = "act"
+    content: str = "请选择你的行动"
+    day: int
+    phase: Phase
+    seat: int
+    action: List[str]
+
+
+class ConversationFrame(ActFrame):
+    type: str = "conversation"
+    source: int
+
+
+class UserSpeakFrame(Frame):
+    type: str = "user_speak"
+    content: str = "开始你的发言"
+    day: int
+    phase: Phase
+    seat: int
+    action: List[str] = ["speak"]
+    alive: List[int]
+
+
+class VotingFrame(Frame):
+    type: str = "voting"
+    content: str = "请进行投票"
+    day: int
+    phase: Phase
+    seat: int
+    action: List[str] = ["voting"]
+    voting: List[int]
+    alive: List[int]
+
+
+class FinishFrame(Frame):
+    type: str = "finish"
+    winner: Optional[str] = None
+    game_over: bool = True
+
+
+class ParkedFrame(Frame):
+    type: str = "parked"
+    content: str = "长时间未操作，游戏已暂停"
+
+
+FRAME_MODELS = {
+    "display": DisplayFrame,
+    "speak": SpeakFrame,
+    "act": ActFrame,
+    "conversation": ConversationFrame,
+    "user_speak": UserSpeakFrame,
+    "voting": VotingFrame,
+    "finish": FinishFrame,
+    "parked": ParkedFrame,
+}
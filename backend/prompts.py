@@ -0,0 +1,252 @@
+from textwrap import dedent
+from typing import Any, Dict, List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from backend.tokens import count_tokens
+
+
+def compact(text: str) -> str:
+    """去掉缩进、行尾空白和连续空行"""
+    lines = []
+    for line in dedent(text).strip().splitlines():
+        line = line.strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+RULES = compact("""
+    【狼人杀基础规则】
+
+    分好人阵营（村民+神职）和狼人阵营，总共包括四种职业
+    好人阵营：[女巫，预言家，平民]
+    狼人阵营：[狼人]
+
+    ### 核心角色及技能
+    - **狼人**：夜间共同商议杀死1名玩家，且晚上必须杀死1名玩家，白天可伪装身份误导好人
+    - **平民**：无特殊技能，白天通过发言判断身份、投票放逐狼人
+    - **预言家**：夜间可查验1名玩家的阵营（好人/狼人）
+    - **女巫**：拥有1瓶解药（可救夜间被刀玩家）和1瓶毒药（可毒杀1名玩家），同一晚不能同时用两种药
+
+    ### 游戏流程
+    1. **黑夜阶段**（按顺序行动）：
+    - 狼人睁眼，协商杀死1人后闭眼
+    - 预言家睁眼，法官告知其查验玩家的阵营后闭眼
+    - 女巫睁眼，法官告知夜间死亡玩家，女巫选择是否用解药救人或用毒药毒人（不用药则直接闭眼）
+    - 猎人保持闭眼（仅在死亡时触发技能）
+    2. **白天阶段**：
+    - 法官公布夜间死亡信息（无人死亡则为“平安夜”）
+    - 所有玩家按顺序发言（可陈述观点、怀疑他人或为自己辩解）
+    - 发言结束后，全体玩家投票放逐1名最可疑的玩家（得票最多者出局，出局玩家可留“遗言”）
+    3. 重复“黑夜-白天”流程，直至某一阵营达成胜利条件
+
+    ### 胜负条件
+    - **好人阵营**：所有狼人被放逐
+    - **狼人阵营**：狼人数量≥好人数量（或所有神职被消灭，依具体规则调整）
+""")
+
+
+class PromptTemplate:
+    """
+    预编译的提示词模板。
+    static（规则 + 角色指令）对同一模板的所有调用完全相同，作为system消息放在最前面，
+    便于支持前缀缓存的OpenAI兼容后端复用；state（局面 + 历史）每次调用时格式化，作为单独的消息发送。
+    """
+
+    def __init__(self, name: str, instructions: str, state: str):
+        self.name = name
+        self.static = RULES + "\n\n" + compact(instructions)
+        self.state = compact(state)
+        self.system_message = SystemMessage(content=self.static)
+        # 整个提示词的token上限，超出时从最早的历史开始截断；0表示不限制
+        self.budget = 0
+        self._static_tokens = None
+
+    def render(self, **values) -> List[BaseMessage]:
+        if self.budget and values.get("history"):
+            values["history"] = self._fit(values)
+        return [self.system_message, HumanMessage(content=self.state.format(**values))]
+
+    def _fit(self, values: Dict[str, Any]) -> str:
+        history = values["history"]
+        if self._static_tokens is None:
+            self._static_tokens = count_tokens(self.static)
+        allowance = self.budget - self._static_tokens - count_tokens(self.state.format(**dict(values, history="")))
+        lines = history.split("\n")
+        sizes = [count_tokens(line) + 1 for line in lines]
+        total = sum(sizes)
+        if total <= allowance:
+            return history
+        allowance -= count_tokens(TRUNCATED) + 1
+        start = 0
+        while start < len(lines) and total > allowance:
+            total -= sizes[start]
+            start += 1
+        return "\n".join([TRUNCATED] + lines[start:])
+
+
+# 历史超出模板的token上限时，替换被截掉的最早部分
+TRUNCATED = "（更早的历史已省略）"
+
+
+STATE = """
+    你是玩家{pid}。现在是第{day}天{phase}。
+"""
+
+ALIVE = """
+    存活玩家: {alive}
+"""
+
+HISTORY = """
+    历史信息：
+    {history}
+"""
+
+SPEAK = """
+    为了赢得胜利，请结合历史信息谨慎发言（100~200字），必要时可以暴露你的身份！！！
+    在发言时，请不要坦露你内心所想的！
+"""
+
+SPEAK_NOW = """
+    现在，开始发言：
+"""
+
+VOTE = """
+    为了赢得胜利，请根据历史信息谨慎选择投票给哪个玩家！！！
+    投票返回JSON格式：
+    {"action": "vote", "target": int,必须是可选目标中的一个, "reason": "你的理由，中文"}
+"""
+
+TARGETS = """
+    存活玩家中的可选目标: {targets}
+"""
+
+WEREWOLF_NIGHT = PromptTemplate("werewolf_night", """
+    你是一名狼人玩家，现在是晚上。
+    你和你的队友每晚只能杀死一个玩家，请结合历史信息并和你的队友交流后谨慎选择！！！
+    注意：
+    - 你要杀死所有非狼人玩家，以取得最终胜利
+    - 在每天，你最多能和队友总计交流 2 次
+    - 当你和队友还有交流机会时，应优先选择和队友交流
+    请选择一名玩家作为猎杀目标或者和你的队友交流:
+    猎杀目标，返回JSON格式：
+    {"action": "kill", "target": int,必须是可选目标中的一个, "reason": "你的理由，中文"}
+    和队友交流，返回JSON格式：
+    {"action": "conversation", "target": 你的队友的玩家ID, "content": "交流内容,中文"}
+""", STATE + """
+    你的队友: 玩家{teammate}
+    你已经和队友交流了{talks}次
+""" + TARGETS + HISTORY)
+
+WEREWOLF_KILL = PromptTemplate("werewolf_kill", """
+    你是一名狼人玩家，现在是晚上。
+    你每晚只能杀死一个玩家，请结合历史信息谨慎选择！！！
+    你要杀死所有非狼人玩家，以取得最终胜利。
+    请选择一名玩家作为猎杀目标，返回JSON格式：
+    {"action": "kill", "target": int,必须是可选目标中的一个, "reason": "你的理由，中文"}
+""", STATE + """
+    你的队友: {teammate}
+""" + TARGETS + HISTORY)
+
+WEREWOLF_VOTE = PromptTemplate("werewolf_vote", """
+    你是一名狼人玩家，现在是投票环节，必要时，你可以投给你的队友。
+""" + VOTE, STATE + TARGETS + HISTORY)
+
+WEREWOLF_SPEAK = PromptTemplate("werewolf_speak", """
+    你是一名狼人玩家，现在是讨论环节。
+    为了欺骗其他玩家，你可以伪装自己的身份（例如女巫、预言家、平民）！！！
+""" + SPEAK, STATE + ALIVE + """
+    你的队友: {teammate}
+""" + HISTORY + SPEAK_NOW)
+
+SEER_NIGHT = PromptTemplate("seer_night", """
+    你是一名预言家玩家，现在是晚上。
+    你需要尽快找到狼人，请根据历史信息分析哪个玩家可能是狼人，并查验他的身份。
+    请选择一名玩家查验身份，返回JSON格式：
+    {"action": "check", "target": int,必须是可选目标中的一个, "reason": "你的理由，中文"}
+""", STATE + TARGETS + HISTORY)
+
+SEER_VOTE = PromptTemplate("seer_vote", """
+    你是一名预言家玩家，现在是投票环节。
+""" + VOTE, STATE + TARGETS + HISTORY)
+
+SEER_SPEAK = PromptTemplate("seer_speak", """
+    你是一名预言家玩家，现在是讨论环节。
+""" + SPEAK, STATE + ALIVE + HISTORY + SPEAK_NOW)
+
+WITCH_NIGHT = PromptTemplate("witch_night", """
+    你是一名女巫玩家，现在是晚上。
+    请注意：
+    - 当你拥有物品时，你可以选择使用毒药杀死一名存活的玩家或者使用解药救助一名濒死玩家，或者什么也不做
+    - 当你没有物品时，只能选择什么也不做
+    选择杀死一名玩家，返回JSON格式：
+    {"action": "kill", "target": int,必须是可选目标中的一个, "reason": "你的理由，中文"}
+    选择救助一名濒死的玩家，返回JSON格式：
+    {"action": "resurrection", "target": 濒死玩家的ID, "reason": "你的理由，中文"}
+    什么都不做时，返回JSON格式：
+    {"action": "none", "target": -1, "reason": "你的理由，中文"}
+""", STATE + """
+    你拥有的物品：{items}
+    濒死玩家：{dying}
+""" + TARGETS + HISTORY)
+
+WITCH_VOTE = PromptTemplate("witch_vote", """
+    你是一名女巫玩家，现在是投票环节。
+""" + VOTE, STATE + TARGETS + HISTORY)
+
+WITCH_SPEAK = PromptTemplate("witch_speak", """
+    你是一名女巫玩家，现在是讨论环节。
+""" + SPEAK, STATE + ALIVE + HISTORY + SPEAK_NOW)
+
+VILLAGER_VOTE = PromptTemplate("villager_vote", """
+    你是一名平民玩家，现在是投票环节。
+""" + VOTE, STATE + TARGETS + HISTORY)
+
+VILLAGER_SPEAK = PromptTemplate("villager_speak", """
+    你是一名平民玩家，现在是讨论环节。
+""" + SPEAK, STATE + ALIVE + HISTORY + SPEAK_NOW)
+
+# 输出无效时追加的纠正提示
+RETRY = compact("""
+    上一次的输出无效。请只返回一个JSON对象，action必须是{actions}之一，target必须在该行动对应的可选目标中：{targets}
+""")
+
+SUMMARY = PromptTemplate("summary", """
+    你是玩家{pid}的记录员，请把下面第{day}天的游戏记录压缩成不超过150字的中文摘要。
+    必须保留：死亡和出局的玩家、每个玩家的投票对象、查验结果、你自己的夜晚行动，以及各玩家发言中的身份声明和怀疑对象。
+    只输出摘要本身，不要分析，不要输出JSON。
+""", """
+    你是玩家{pid}。
+    第{day}天的记录：
+    {history}
+""")
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    template.name: template for template in (
+        WEREWOLF_NIGHT, WEREWOLF_KILL, WEREWOLF_VOTE, WEREWOLF_SPEAK,
+        SEER_NIGHT, SEER_VOTE, SEER_SPEAK,
+        WITCH_NIGHT, WITCH_VOTE, WITCH_SPEAK,
+        VILLAGER_VOTE, VILLAGER_SPEAK, SUMMARY,
+    )
+}
+
+
+def set_budgets(budgets: Dict[str, int]):
+    """按模板名设置token上限，default适用于未单独配置的模板"""
+    for name, template in TEMPLATES.items():
+        template.budget = budgets.get(name, budgets.get("default", 0))
+
+
+def token_report(sample: Dict[str, str] = None) -> List[dict]:
+    """统计每个模板静态前缀和动态部分（用sample格式化）的token数"""
+    sample = sample or {}
+    values = {"pid": 1, "day": 1, "phase": "夜晚", "alive": "[1, 2, 3, 4, 5, 6]", "targets": "[2, 3, 4, 5, 6]",
+              "teammate": 2, "talks": 0, "items": "一瓶解药 | 一瓶毒药", "dying": "玩家3", "history": "暂时没有"}
+    values.update(sample)
+    rows = []
+    for template in TEMPLATES.values():
+        static = count_tokens(template.static)
+        dynamic = count_tokens(template.state.format(**values))
+        rows.append({"template": template.name, "static": static, "dynamic": dynamic, "total": static + dynamic})
+    return rows
@@ -0,0 +1,88 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+DANGLING_KEY = re.compile(r',\s*"[^"]*(?:"\s*:?)?\s*$')
+
+
+def _close(text: str) -> str:
+    """补全被截断的JSON：闭合未结束的字符串和括号"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",").rstrip(":")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    从LLM输出中尽量恢复一个JSON对象：
+    去掉```代码块、截取第一个{开始的部分、删除多余的逗号、补全截断的字符串和括号。
+    无法恢复时返回None。
+    """
+    if not text:
+        return None
+    text = text.strip()
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    candidates = [text]
+    end = text.rfind("}")
+    if end >= 0:
+        candidates.append(text[:end + 1])
+    for candidate in candidates:
+        cleaned = TRAILING_COMMA.sub(r"\1", candidate)
+        # 最后一个键没有值时直接丢弃该键
+        for fixed in (candidate, cleaned, _close(cleaned), _close(DANGLING_KEY.sub("", cleaned))):
+            try:
+                data = json.loads(fixed)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                return data
+    return None
+
+
+def decision_schema(spec: Dict[str, List[int]]) -> Dict[str, Any]:
+    """根据允许的 行动 -> 目标 列表生成OpenAI json_schema格式的response_format"""
+    targets = sorted({t for ts in spec.values() for t in ts})
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "decision",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": list(spec)},
+                    "target": {"type": "integer", "enum": targets},
+                    "reason": {"type": "string"},
+                    "content": {"type": "string"},
+                },
+                "required": ["action", "target", "reason", "content"],
+                "additionalProperties": False,
+            },
+        },
+    }
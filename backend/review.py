@@ -0,0 +1,90 @@
+"""
+游戏复盘查询：按天、阶段、座位和事件类型过滤公共历史（histories[0]），游标分页。
+引擎写入公共历史时记录事件类型和行动的座位（SystemEvent.kind/seat），ReviewIndex随追加增量更新，
+为每种过滤条件维护按位置递增的倒排表，查询只遍历最短的倒排表。
+游标是历史记录的位置，历史只追加不修改，游戏进行中翻页也不会重复或遗漏。
+"""
+import asyncio
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from backend.base import Phase
+from backend.events import HISTORY_KINDS, Event, HistoryModel
+
+KIND_NAMES = HISTORY_KINDS
+# JSON格式每页默认和最多的记录数
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+class ReviewIndex:
+    """公共历史的倒排索引：(字段, 值) -> 递增的位置列表"""
+
+    def __init__(self, history: List[Event]):
+        self.history = history
+        self.postings: Dict[Tuple[str, object], List[int]] = defaultdict(list)
+        for pos in range(len(history)):
+            self.add(pos)
+
+    def add(self, pos: int):
+        """索引新追加的一条记录，由GameState.add_system_history调用"""
+        event = self.history[pos]
+        self.postings["day", event.day].append(pos)
+        self.postings["phase", event.phase].append(pos)
+        self.postings["kind", event.kind].append(pos)
+        if event.seat is not None:
+            self.postings["seat", event.seat].append(pos)
+
+    def query(self, day: Optional[int] = None, phase: Optional[Phase] = None, seat: Optional[int] = None,
+              kind: Optional[str] = None, cursor: int = 0,
+              limit: Optional[int] = None) -> Tuple[List[int], Optional[int]]:
+        """
+        满足全部过滤条件、位置不小于cursor的记录，最多limit条；
+        返回(位置列表, 下一页的游标)，没有更多记录时游标为None
+        """
+        filters = [(name, value) for name, value in (("day", day), ("phase", phase), ("seat", seat), ("kind", kind))
+                   if value is not None]
+        if filters:
+            filters.sort(key=lambda key: len(self.postings.get(key, ())))
+            first = self.postings.get(filters[0], [])
+            # 其余条件直接查列，避免求倒排表的交集
+            rest = filters[1:]
+            candidates = (pos for pos in first[bisect_left(first, cursor):]
+                          if all(getattr(self.history[pos], name) == value for name, value in rest))
+        else:
+            candidates = iter(range(max(cursor, 0), len(self.history)))
+        positions = list(candidates) if limit is None else list(islice(candidates, limit + 1))
+        if limit is not None and len(positions) > limit:
+            return positions[:limit], positions[limit]
+        return positions, None
+
+    def item(self, pos: int) -> dict:
+        """一条复盘记录，字段与ReviewEvent一致"""
+        data = self.history[pos].to_dict()
+        data["index"] = pos
+        return data
+
+
+class ReviewEvent(HistoryModel):
+    index: int
+    seat: Optional[int] = None
+    kind: str
+
+
+class ReviewPage(BaseModel):
+    events: List[ReviewEvent]
+    # 下一页的cursor参数，没有更多记录时为None
+    next_cursor: Optional[int] = None
+
+
+async def ndjson(index: ReviewIndex, positions: List[int], batch: int = 200) -> AsyncIterator[str]:
+    """逐批输出NDJSON，每批之后让出事件循环，导出长复盘时不阻塞正在进行的游戏"""
+    for start in range(0, len(positions), batch):
+        yield "".join(json.dumps(index.item(pos), ensure_ascii=False) + "\n"
+                      for pos in positions[start:start + batch])
+        await asyncio.sleep(0)
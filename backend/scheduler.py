@@ -0,0 +1,138 @@
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+from backend.events import Event, parse_event
+
+# 优先级越小越先处理
+URGENT = 0  # 行动产生的后续事件，后加入的先处理（与原来的栈语义一致）
+PHASE = 1  # 阶段流程事件，按加入顺序处理
+
+
+class _Entry:
+    __slots__ = ("key", "event", "index_key", "alive")
+
+    def __init__(self, key: Tuple[int, int], event: Event, index_key):
+        self.key = key
+        self.event = event
+        self.index_key = index_key
+        self.alive = True
+
+    def __lt__(self, other: "_Entry"):
+        return self.key < other.key
+
+
+class EventScheduler:
+    """
+    游戏事件调度器：按 (优先级, 序号) 排序的堆。
+    - push：插入紧急事件，在所有阶段事件之前处理，后进先出
+    - schedule：按顺序追加阶段事件
+    - cancel：按 (etype, target) 取消尚未处理的事件，借助索引 O(1) 定位
+    - peek / 迭代 / len 不改变待处理的事件
+    """
+
+    def __init__(self, events: Optional[List[Event]] = None):
+        self._heap: List[_Entry] = []
+        self._counter = itertools.count()
+        self._index: Dict[Tuple[str, int], Dict[int, _Entry]] = {}
+        self._live = 0
+        for event in events or []:
+            self.schedule(event)
+
+    @staticmethod
+    def _index_key(event: Event):
+        target = getattr(event, "target", None)
+        return None if target is None else (event.etype, target)
+
+    def _add(self, priority: int, order: int, event: Event):
+        index_key = self._index_key(event)
+        entry = _Entry((priority, order), event, index_key)
+        heapq.heappush(self._heap, entry)
+        if index_key is not None:
+            self._index.setdefault(index_key, {})[entry.key[1]] = entry
+        self._live += 1
+
+    def push(self, event: Event):
+        self._add(URGENT, -next(self._counter), event)
+
+    def schedule(self, event: Event):
+        self._add(PHASE, next(self._counter), event)
+
+    def extend(self, events: List[Event]):
+        for event in events:
+            self.schedule(event)
+
+    def _drop_cancelled(self):
+        # 已取消的条目只是墓碑，清理它们不影响待处理事件
+        while self._heap and not self._heap[0].alive:
+            heapq.heappop(self._heap)
+
+    def _forget(self, entry: _Entry):
+        entry.alive = False
+        self._live -= 1
+        if entry.index_key is not None:
+            bucket = self._index.get(entry.index_key)
+            if bucket is not None:
+                bucket.pop(entry.key[1], None)
+                if not bucket:
+                    del self._index[entry.index_key]
+
+    def pop(self) -> Event:
+        self._drop_cancelled()
+        if not self._heap:
+            raise IndexError("pop from empty scheduler")
+        entry = heapq.heappop(self._heap)
+        self._forget(entry)
+        return entry.event
+
+    def peek(self) -> Optional[Event]:
+        self._drop_cancelled()
+        return self._heap[0].event if self._heap else None
+
+    def cancel(self, etype: str, target: int) -> int:
+        """取消所有 (etype, target) 匹配的待处理事件，返回取消的数量"""
+        bucket = self._index.pop((etype, target), None)
+        if not bucket:
+            return 0
+        for entry in bucket.values():
+            entry.alive = False
+        self._live -= len(bucket)
+        return len(bucket)
+
+    def pending(self, etype: str, target: int) -> bool:
+        return (etype, target) in self._index
+
+    def clear(self):
+        self._heap.clear()
+        self._index.clear()
+        self._live = 0
+
+    def dump_entries(self) -> List[Tuple[int, int, Event]]:
+        """待处理事件及其排序键 (优先级, 序号, 事件)"""
+        return [(entry.key[0], entry.key[1], entry.event) for entry in sorted(self._heap) if entry.alive]
+
+    @classmethod
+    def from_entries(cls, entries: List[Tuple[int, int, Event]]) -> "EventScheduler":
+        scheduler = cls()
+        for priority, order, event in entries:
+            scheduler._add(priority, order, event)
+        # 新事件的序号必须接着已有的序号，保证相对顺序不变
+        start = max((abs(order) for _, order, _ in entries), default=-1) + 1
+        scheduler._counter = itertools.count(start)
+        return scheduler
+
+    def dump(self) -> List[list]:
+        """可JSON序列化的待处理事件，用于持久化"""
+        return [[priority, order, event.to_dict()] for priority, order, event in self.dump_entries()]
+
+    @classmethod
+    def load(cls, entries: List[list]) -> "EventScheduler":
+        return cls.from_entries([(priority, order, parse_event(data)) for priority, order, data in entries])
+
+    def __iter__(self) -> Iterator[Event]:
+        return (entry.event for entry in sorted(self._heap) if entry.alive)
+
+    def __len__(self):
+        return self._live
+
+    def __bool__(self):
+        return self._live > 0
@@ -0,0 +1,153 @@
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from backend.game_state import GameState
+from backend.store import MemoryStore
+
+GAME_ID = re.compile(r"[\w-]+")
+
+
+class SessionStore(MemoryStore):
+    """
+    带淘汰的进程内存储：
+    - 超过idle_ttl秒未访问的游戏、已结束或已暂停且超过finished_ttl秒未访问的游戏会被淘汰
+    - 内存中的游戏超过max_games局时，按最近最少使用淘汰
+    - 淘汰的游戏写入path目录下的gzip压缩快照，再次访问时透明地加载回内存
+    正在进行的游戏（pin）不会被淘汰。
+    """
+
+    def __init__(self, path: str = "cache/snapshots", idle_ttl: float = 1800, finished_ttl: float = 300,
+                 max_games: int = 1000):
+        super().__init__()
+        self.games: "OrderedDict[str, GameState]" = OrderedDict()
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.max_games = max_games
+        self.accessed: Dict[str, float] = {}
+        self.pinned: Dict[str, int] = {}
+        # 淘汰逐个进行，sweep和_shrink不会同时淘汰同一局游戏
+        self.evict_lock = asyncio.Lock()
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def _snapshot(self, game_id: str) -> Path:
+        return self.path / f"{game_id}.json.gz"
+
+    def _touch(self, game_id: str):
+        self.games.move_to_end(game_id)
+        self.accessed[game_id] = time.monotonic()
+
+    @staticmethod
+    def _write(path: Path, data: dict):
+        tmp = path.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path: Path) -> dict:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def get(self, game_id: str) -> Optional[GameState]:
+        game_state = self.games.get(game_id)
+        if game_state is not None:
+            self._touch(game_id)
+            return game_state
+        path = self._snapshot(game_id)
+        if not GAME_ID.fullmatch(game_id) or not path.exists():
+            return None
+        game_state = GameState.load(await asyncio.to_thread(self._read, path))
+        # 加载期间可能已经有其他请求先加载或写入了这局游戏
+        if game_id in self.games:
+            return await self.get(game_id)
+        self.rehydrations += 1
+        self.games[game_id] = game_state
+        self._touch(game_id)
+        path.unlink(missing_ok=True)
+        await self._shrink()
+        return game_state
+
+    async def put(self, game_id: str, game_state: GameState):
+        self.games[game_id] = game_state
+        self._touch(game_id)
+        await self._shrink()
+
+    async def delete(self, game_id: str):
+        self.games.pop(game_id, None)
+        self.accessed.pop(game_id, None)
+        if GAME_ID.fullmatch(game_id):
+            self._snapshot(game_id).unlink(missing_ok=True)
+
+    async def exists(self, game_id: str) -> bool:
+        return game_id in self.games or (GAME_ID.fullmatch(game_id) is not None and self._snapshot(game_id).exists())
+
+    def pin(self, game_id: str):
+        self.pinned[game_id] = self.pinned.get(game_id, 0) + 1
+
+    def unpin(self, game_id: str):
+        if self.pinned.get(game_id, 0) <= 1:
+            self.pinned.pop(game_id, None)
+        else:
+            self.pinned[game_id] -= 1
+
+    async def evict(self, game_id: str, accessed: Optional[float] = None) -> bool:
+        """
+        把游戏写入快照后移出内存，返回是否已淘汰。
+        先写快照再移除，写入期间的get仍能读到内存中的游戏；accessed为选中这局游戏时的访问时间，
+        之后又被访问、写入、删除或固定时放弃淘汰。
+        """
+        async with self.evict_lock:
+            game_state = self.games.get(game_id)
+            seen = self.accessed.get(game_id)
+            if game_state is None or game_id in self.pinned or accessed is not None and seen != accessed:
+                return False
+            path = self._snapshot(game_id)
+            await asyncio.to_thread(self._write, path, game_state.dump())
+            if self.accessed.get(game_id) != seen or game_id in self.pinned:
+                # 快照已经过时，游戏留在内存中
+                path.unlink(missing_ok=True)
+                return False
+            self.games.pop(game_id, None)
+            self.accessed.pop(game_id, None)
+            self.evictions += 1
+            return True
+
+    async def _shrink(self):
+        # OrderedDict的顺序即最近访问顺序，从最久未访问的开始淘汰
+        over = len(self.games) - self.max_games
+        if over <= 0:
+            return
+        for game_id, accessed in [(g, self.accessed[g]) for g in self.games if g not in self.pinned][:over]:
+            await self.evict(game_id, accessed)
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [
+            (game_id, self.accessed[game_id]) for game_id, game_state in self.games.items()
+            if game_id not in self.pinned
+            and now - self.accessed[game_id] > (self.finished_ttl if game_state.game_over or game_state.parked
+                                                 else self.idle_ttl)
+        ]
+        evicted = 0
+        for game_id, accessed in expired:
+            evicted += await self.evict(game_id, accessed)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_memory": len(self.games),
+            "pinned": len(self.pinned),
+            "snapshots": sum(1 for _ in self.path.glob("*.json.gz")),
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
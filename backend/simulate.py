@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from backend.game_state import GameState
+from backend.engine import run_game, AIInputSource
+from backend.tracing import Tracer
+from backend.archive import Archive
+
+
+async def play_one(agents: Dict[str, Any], seats: int = 6, **options) -> GameState:
+    """所有座位均由智能体控制，完整进行一局游戏；options透传给run_game"""
+    game_state = GameState()
+    game_state.initialize_players(seats=seats, human_seats=())
+    async for _ in run_game(game_state, agents, AIInputSource(), **options):
+        pass
+    return game_state
+
+
+async def simulate(n_games: int, agents: Optional[Dict[str, Any]] = None, concurrency: int = 100,
+                   trace: Optional[str] = None, archive: Optional[str] = None, model: str = "",
+                   **options) -> dict:
+    """
+    在同一个事件循环上并发模拟多局游戏，返回吞吐量统计；trace为目录时把每局的追踪写入其中，
+    archive为目录时把每局写入该归档，model为归档中记录的模型名
+    """
+    if agents is None:
+        from backend.agents import create_agents
+        agents = create_agents()
+    semaphore = asyncio.Semaphore(concurrency)
+    games = Archive(archive, model=model) if archive is not None else None
+
+    async def worker(i: int):
+        async with semaphore:
+            game_id = str(uuid.uuid4())
+            record = games.recorder(game_id) if games else None
+            if trace is None:
+                game_state = await play_one(agents, record=record, **options)
+            else:
+                tracer = Tracer(str(i))
+                game_state = await play_one(agents, tracer=tracer, record=record, **options)
+                (Path(trace) / f"game-{i}.json").write_text(json.dumps(tracer.to_chrome(), ensure_ascii=False),
+                                                           encoding="utf-8")
+            if games and game_state.winner:
+                games.finish(game_id, game_state)
+            return game_state
+
+    if trace is not None:
+        Path(trace).mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    states = await asyncio.gather(*(worker(i) for i in range(n_games)))
+    elapsed = time.perf_counter() - start
+    if games:
+        await games.close()
+    return {
+        "games": n_games,
+        "seconds": elapsed,
+        "games_per_sec": n_games / elapsed if elapsed else float("inf"),
+        "events": sum(s.step for s in states),
+        "winners": dict(Counter(s.winner for s in states)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无界面批量模拟狼人杀游戏")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--concurrent-night", action="store_true", help="夜晚独立角色并发行动")
+    parser.add_argument("--vote-concurrency", type=int, default=1, help="每局并发投票的最大请求数")
+    parser.add_argument("--seats", type=int, default=6, help="每局的座位数（6~20）")
+    parser.add_argument("--trace", help="把每局的Chrome trace写入该目录")
+    parser.add_argument("--archive", help="把每局写入该目录下的归档，用backend.analytics统计")
+    args = parser.parse_args()
+    from backend.config import section
+    print(asyncio.run(simulate(args.games, concurrency=args.concurrency, seats=args.seats, trace=args.trace,
+                               archive=args.archive, model=section('llm').get('model', ''),
+                               concurrent_night=args.concurrent_night,
+                               vote_concurrency=args.vote_concurrency)))
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from backend.game_state import GameState
+
+
+class GameStore(ABC):
+    """游戏状态存储，多个worker共享同一个存储时可以服务同一批游戏"""
+
+    @abstractmethod
+    async def get(self, game_id: str) -> Optional[GameState]:
+        """不存在时返回None"""
+
+    @abstractmethod
+    async def put(self, game_id: str, game_state: GameState):
+        ...
+
+    @abstractmethod
+    async def delete(self, game_id: str):
+        ...
+
+    async def exists(self, game_id: str) -> bool:
+        return await self.get(game_id) is not None
+
+    def pin(self, game_id: str):
+        """游戏正在某个连接上运行，不应被淘汰"""
+
+    def unpin(self, game_id: str):
+        ...
+
+    async def acquire(self, game_id: str, owner: str, ttl: float) -> bool:
+        """
+        获取或续期运行这局游戏的租约，返回owner是否持有租约。
+        同一时刻只有持有租约的worker运行引擎；租约超过ttl秒没有续期即失效，可以被其他worker接管。
+        只有一个worker的存储总是返回True。
+        """
+        return True
+
+    async def release(self, game_id: str, owner: str):
+        """引擎结束时释放租约"""
+
+    async def sweep(self) -> int:
+        """清理过期的游戏，返回清理的数量"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class Channel(ABC):
+    """
+    按游戏ID广播消息的通知通道，用于把/game/send收到的人类输入送到运行该局游戏的worker，
+    以及把引擎产出的帧转发给其他worker上的连接。
+    """
+
+    # 消息是否对其他进程可见；只在进程内可见时没有其他worker需要转发帧
+    shared: bool = False
+
+    @abstractmethod
+    async def publish(self, game_id: str, message: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def subscribe(self, game_id: str, backlog: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        只接收订阅之后发布的消息：订阅的起点在调用时确定，而不是第一次迭代时。
+        backlog大于0时先收到之前发布的最近至多backlog条消息（通道保留了历史消息时）。
+        """
+
+
+class MemoryStore(GameStore):
+    """进程内存储，直接保存GameState对象，只支持单个worker"""
+
+    def __init__(self):
+        self.games: Dict[str, GameState] = {}
+
+    async def get(self, game_id: str) -> Optional[GameState]:
+        return self.games.get(game_id)
+
+    async def put(self, game_id: str, game_state: GameState):
+        self.games[game_id] = game_state
+
+    async def delete(self, game_id: str):
+        self.games.pop(game_id, None)
+
+
+class MemoryChannel(Channel):
+    def __init__(self):
+        self.queues: Dict[str, List[asyncio.Queue]] = {}
+
+    async def publish(self, game_id: str, message: Dict[str, Any]):
+        for queue in self.queues.get(game_id, []):
+            queue.put_nowait(message)
+
+    def subscribe(self, game_id: str, backlog: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        # 不保留历史消息，忽略backlog
+        queue = asyncio.Queue()
+        self.queues.setdefault(game_id, []).append(queue)
+        return self._receive(game_id, queue)
+
+    async def _receive(self, game_id: str, queue: asyncio.Queue) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.queues[game_id].remove(queue)
+            if not self.queues[game_id]:
+                del self.queues[game_id]
+
+
+class SQLiteDatabase:
+    """
+    WAL模式的SQLite数据库，同一台机器上的多个进程可以同时读写。
+    每个worker只打开一个连接，所有操作在线程池中执行，用锁保证同一时刻只有一个线程使用连接。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id TEXT NOT NULL,
+            body TEXT NOT NULL,
+            created REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS messages_game ON messages (game_id, id);
+        CREATE INDEX IF NOT EXISTS messages_created ON messages (created);
+        CREATE TABLE IF NOT EXISTS leases (
+            game_id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            heartbeat REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def execute(self, sql: str, params=()) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    async def run(self, sql: str, params=()) -> List[tuple]:
+        return await asyncio.to_thread(self.execute, sql, params)
+
+
+class SQLiteStore(GameStore):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def get(self, game_id: str) -> Optional[GameState]:
+        rows = await self.db.run("SELECT state FROM games WHERE game_id = ?", (game_id,))
+        return GameState.load(json.loads(rows[0][0])) if rows else None
+
+    async def put(self, game_id: str, game_state: GameState):
+        state = json.dumps(game_state.dump(), ensure_ascii=False)
+        await self.db.run("INSERT INTO games (game_id, state, updated) VALUES (?, ?, ?) "
+                          "ON CONFLICT(game_id) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                          (game_id, state, time.time()))
+
+    async def delete(self, game_id: str):
+        await self.db.run("DELETE FROM games WHERE game_id = ?", (game_id,))
+
+    async def exists(self, game_id: str) -> bool:
+        return bool(await self.db.run("SELECT 1 FROM games WHERE game_id = ?", (game_id,)))
+
+    async def acquire(self, game_id: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        # 租约空闲、已过期或本来就属于owner时才会写入
+        await self.db.run("INSERT INTO leases (game_id, owner, heartbeat) VALUES (?, ?, ?) "
+                          "ON CONFLICT(game_id) DO UPDATE SET owner = excluded.owner, heartbeat = excluded.heartbeat "
+                          "WHERE leases.owner = excluded.owner OR leases.heartbeat < ?",
+                          (game_id, owner, now, now - ttl))
+        rows = await self.db.run("SELECT owner FROM leases WHERE game_id = ?", (game_id,))
+        return bool(rows) and rows[0][0] == owner
+
+    async def release(self, game_id: str, owner: str):
+        await self.db.run("DELETE FROM leases WHERE game_id = ? AND owner = ?", (game_id, owner))
+
+
+class SQLiteChannel(Channel):
+    """
+    基于SQLite消息表的通知通道：发布即插入一行，订阅者按自增ID轮询新消息。
+    超过retention秒的消息在发布时顺带清理。
+    """
+
+    shared = True
+
+    def __init__(self, db: SQLiteDatabase, poll_interval: float = 0.05, retention: float = 3600):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.retention = retention
+
+    async def publish(self, game_id: str, message: Dict[str, Any]):
+        now = time.time()
+        await self.db.run("INSERT INTO messages (game_id, body, created) VALUES (?, ?, ?)",
+                          (game_id, json.dumps(message, ensure_ascii=False), now))
+        await self.db.run("DELETE FROM messages WHERE created < ?", (now - self.retention,))
+
+    def subscribe(self, game_id: str, backlog: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        # 同步读取订阅的起点：如果推迟到第一次轮询，其间发布的消息会被漏掉
+        last = None
+        if backlog:
+            last = self.db.execute("SELECT MIN(id) - 1 FROM (SELECT id FROM messages WHERE game_id = ? "
+                                   "ORDER BY id DESC LIMIT ?)", (game_id, backlog))[0][0]
+        if last is None:
+            last = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM messages")[0][0]
+        return self._poll(game_id, last)
+
+    async def _poll(self, game_id: str, last: int) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            rows = await self.db.run("SELECT id, body FROM messages WHERE game_id = ? AND id > ? ORDER BY id",
+                                     (game_id, last))
+            for last, body in rows:
+                yield json.loads(body)
+            if not rows:
+                await asyncio.sleep(self.poll_interval)
+
+
+def create_store(backend: str = "memory", path: str = "cache/games.db", poll_interval: float = 0.05,
+                 sessions: Optional[Dict[str, Any]] = None, **options) -> Tuple[GameStore, Channel]:
+    """
+    根据config.toml中的[store]创建游戏状态存储和对应的通知通道。
+    memory后端配置了[store.sessions]时，空闲和已结束的游戏会被淘汰到磁盘快照。
+    """
+    if backend == "memory":
+        if sessions:
+            from backend.sessions import SessionStore
+            return SessionStore(**sessions), MemoryChannel()
+        return MemoryStore(), MemoryChannel()
+    if backend == "sqlite":
+        db = SQLiteDatabase(path)
+        return SQLiteStore(db), SQLiteChannel(db, poll_interval=poll_interval, **options)
+    raise ValueError(f"Unknown store backend: {backend}")
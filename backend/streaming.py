@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import AsyncIterator, Iterable
+
+# 遇到这些字符结尾的分片时立即发送，保证逐句输出的观感
+SENTENCE_ENDS = frozenset("。！？；!?;\n…")
+
+
+async def coalesce(chunks: AsyncIterator[str], interval: float = 0.05, max_bytes: int = 512,
+                   markers: Iterable[str] = ("FINISH",)) -> AsyncIterator[str]:
+    """
+    合并流式发言的分片，减少SSE帧数：
+    - 缓冲区中最早的分片等待超过interval秒时发送（即使后续分片迟迟不来）
+    - 缓冲区超过max_bytes字节时发送
+    - 分片以句末标点结尾时立即发送
+    - markers中的分片（如发言结束标记FINISH）先发送已缓冲的内容，再单独发送
+    interval为0时不做合并，原样转发。
+    """
+    if interval <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    markers = frozenset(markers)
+    iterator = chunks.__aiter__()
+    buffer = []
+    size = 0
+    deadline = None
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                # 时间窗口到期，后续分片仍在等待中
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            if chunk in markers:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size, deadline = [], 0, None
+                yield chunk
+                continue
+            if not chunk:
+                continue
+            buffer.append(chunk)
+            size += len(chunk.encode("utf-8"))
+            if deadline is None:
+                deadline = time.monotonic() + interval
+            if size >= max_bytes or chunk[-1] in SENTENCE_ENDS:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,28 @@
+import re
+from functools import lru_cache
+
+# tiktoken的编码表需要联网下载，离线时退回到近似估计：
+# 每个中日韩字符、英文单词、1~3位数字、连续空白、标点各计1个token
+_APPROX = re.compile(r"[　-〿一-鿿＀-￯]|[A-Za-z]+|\d{1,3}|\s+"
+                     r"|[^\sA-Za-z\d　-〿一-鿿＀-￯]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_APPROX.findall(text))
+
+
+def is_exact() -> bool:
+    """count_tokens是否使用真实的分词器"""
+    return _encoding() is not None
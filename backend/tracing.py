@@ -0,0 +1,108 @@
+"""
+单局游戏的引擎追踪，导出为Chrome trace event格式（chrome://tracing、Perfetto可直接打开）。
+- 引擎线程（tid 0）：每个处理的事件一个span，带etype、座位、阶段和天数；span内的emit子span是结果交给推送端的时间
+- 每个座位一个线程（tid为座位号）：该座位的LLM调用和等待人类玩家决策的span
+事件span减去其中的LLM、人类等待和emit子span即为引擎自身的CPU时间。
+当前游戏的Tracer保存在contextvar中，智能体和输入来源无需额外传参即可记录。
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+_current: ContextVar[Optional["Tracer"]] = ContextVar("tracer", default=None)
+
+
+def current() -> Optional["Tracer"]:
+    return _current.get()
+
+
+def activate(tracer: Optional["Tracer"]):
+    """在当前任务中启用tracer；之后创建的子任务继承同一个tracer"""
+    _current.set(tracer)
+
+
+class Tracer:
+    """一局游戏的span列表，时间以time.perf_counter为基准，导出时换算为微秒"""
+
+    def __init__(self, game_id: str, max_spans: int = 50000):
+        self.game_id = game_id
+        self.max_spans = max_spans
+        self.spans: List[Dict[str, Any]] = []
+        self.seats = set()
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        # 正在处理的引擎事件：(名称, 开始时间, 参数)
+        self.open: Optional[tuple] = None
+
+    def complete(self, name: str, cat: str, start: float, end: float, tid: int = 0, **args):
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        if tid:
+            self.seats.add(tid)
+        self.spans.append({"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": round((start - self.origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                           "args": args})
+
+    @contextmanager
+    def span(self, name: str, cat: str, tid: int = 0, **args) -> Iterator[Dict[str, Any]]:
+        """记录with块的耗时，块内可以向返回的字典补充参数"""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.complete(name, cat, start, time.perf_counter(), tid, **args)
+
+    def event(self, etype: str, **args):
+        """开始处理下一个引擎事件，同时结束上一个"""
+        now = time.perf_counter()
+        self.finish(now)
+        self.open = (etype, now, args)
+
+    def finish(self, now: Optional[float] = None):
+        if self.open is not None:
+            name, start, args = self.open
+            self.open = None
+            self.complete(name, "event", start, now or time.perf_counter(), **args)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        meta = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"game {self.game_id}"}},
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": "engine"}}]
+        meta += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": seat, "args": {"name": f"玩家{seat}"}}
+                 for seat in sorted(self.seats)]
+        return {"traceEvents": meta + self.spans, "displayTimeUnit": "ms",
+                "otherData": {"game_id": self.game_id, "dropped": self.dropped}}
+
+
+@contextmanager
+def span(name: str, cat: str, tid: int = 0, **args) -> Iterator[Dict[str, Any]]:
+    """在当前游戏的tracer上记录span，未启用追踪时什么也不做"""
+    tracer = _current.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, cat, tid, **args) as values:
+        yield values
+
+
+class TraceStore:
+    """本worker上最近keep局游戏的追踪，超过时淘汰最早创建的"""
+
+    def __init__(self, keep: int = 50, max_spans: int = 50000):
+        self.keep = keep
+        self.max_spans = max_spans
+        self.traces: "OrderedDict[str, Tracer]" = OrderedDict()
+
+    def get(self, game_id: str) -> Optional[Tracer]:
+        return self.traces.get(game_id)
+
+    def start(self, game_id: str) -> Tracer:
+        """同一局游戏重新启动引擎时继续写入原来的追踪"""
+        tracer = self.traces.get(game_id)
+        if tracer is None:
+            tracer = self.traces[game_id] = Tracer(game_id, self.max_spans)
+            while len(self.traces) > self.keep:
+                self.traces.popitem(last=False)
+        return tracer
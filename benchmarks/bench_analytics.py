@@ -0,0 +1,130 @@
+"""
+归档分析基准：用假LLM完整进行--games局游戏写入临时归档，再把列复制到--scale倍（几万局），
+对比backend.analytics在列数组上的NumPy实现与逐局遍历JSON记录、逐行遍历调用的纯Python实现，
+以及按索引过滤、按偏移量取出选中游戏与扫描全部列的开销。
+
+运行：python -m benchmarks.bench_analytics --games 200 --scale 100
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.fake_llm import install
+
+
+def tile(columns, scale: int):
+    from backend.archive import Columns
+    n = len(columns.games)
+    copies = np.arange(scale, dtype=np.uint64)
+    games = np.tile(columns.games, scale)
+    games["decision_start"] += np.repeat(copies * len(columns.decisions), n)
+    games["call_start"] += np.repeat(copies * len(columns.calls), n)
+    decisions = np.tile(columns.decisions, scale)
+    decisions["game"] += np.repeat(np.arange(scale, dtype=np.uint32) * n, len(columns.decisions))
+    calls = np.tile(columns.calls, scale)
+    calls["game"] += np.repeat(np.arange(scale, dtype=np.uint32) * n, len(columns.calls))
+    return Columns(games, decisions, calls)
+
+
+def scan_select(columns, seat: int, min_days: int):
+    """不用索引：比较games的列得到掩码，再扫描全部决策和调用"""
+    games = columns.games
+    rows = ((games["seer"] >> seat & 1) == 1) & (games["winner"] == 2) & (games["days"] >= min_days)
+    return columns.decisions[rows[columns.decisions["game"]]], columns.calls[rows[columns.calls["game"]]]
+
+
+def python_report(records, calls):
+    """与analytics.report相同的统计（不含直方图），逐条遍历"""
+    role_players, role_wins = defaultdict(int), defaultdict(int)
+    seat_games, seat_wins = defaultdict(int), defaultdict(int)
+    good_votes = good_hits = wolf_votes = wolf_hits = 0
+    for record in records:
+        wolves_won = record["winner"] == "狼人阵营"
+        roles = {int(seat): role for seat, role in record["roles"].items()}
+        for seat, role in roles.items():
+            won = wolves_won if role == "werewolf" else not wolves_won
+            role_players[role] += 1
+            role_wins[role] += won
+            seat_games[seat] += 1
+            seat_wins[seat] += won
+        for d in record["decisions"]:
+            if d["etype"] != "VOTE" or not d["target"] or d["target"] < 0:
+                continue
+            voter_wolf = roles[d["source"]] == "werewolf"
+            target_wolf = roles[d["target"]] == "werewolf"
+            if voter_wolf:
+                wolf_votes += 1
+                wolf_hits += not target_wolf
+            else:
+                good_votes += 1
+                good_hits += target_wolf
+    latency = defaultdict(list)
+    for row in calls:
+        if row[6]:
+            latency[row[3], row[5]].append(float(row[7]))
+    quantiles = {}
+    for key, values in latency.items():
+        values.sort()
+        quantiles[key] = [values[min(len(values) - 1, int(q * len(values)))] for q in (0.5, 0.9, 0.99)]
+    return ({role: role_wins[role] / role_players[role] for role in role_players},
+            {seat: seat_wins[seat] / seat_games[seat] for seat in seat_games},
+            good_hits / max(good_votes, 1), wolf_hits / max(wolf_votes, 1), quantiles)
+
+
+def bench(games: int, scale: int, seats: int):
+    install(latency=0.001)
+    from backend import analytics, archive
+    from backend.simulate import simulate
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        asyncio.run(simulate(games, archive=path, model="fake", seats=seats))
+        print(f"simulated and archived {games} games in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        columns = archive.read(path)
+        read_ms = (time.perf_counter() - start) * 1e3
+        records = [archive.record(path, columns.games, row) for row in range(len(columns.games))]
+    columns = tile(columns, scale)
+    records = records * scale
+    calls = columns.calls.tolist()
+    n = len(columns.games)
+    print(f"read columns of {games} games: {read_ms:.1f} ms")
+    print(f"{n} games, {len(columns.decisions)} decisions, {len(columns.calls)} calls")
+
+    start = time.perf_counter()
+    report = analytics.report(columns)
+    numpy_s = time.perf_counter() - start
+    start = time.perf_counter()
+    role_rates, _, good, wolf, _ = python_report(records, calls)
+    python_s = time.perf_counter() - start
+    assert abs(report["vote_accuracy"]["good"] - round(good, 4)) < 1e-3
+    assert abs(report["vote_accuracy"]["werewolf"] - round(wolf, 4)) < 1e-3
+    for role, rate in role_rates.items():
+        assert abs(report["win_rates"]["by_role"][role]["win_rate"] - round(rate, 4)) < 1e-3
+    # 复制出来的列没有索引文件，在内存中建立索引（一次性扫描全部行）
+    start = time.perf_counter()
+    index = archive.Index.build(columns.games)
+    build_ms = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    rows = archive.where(index, role="seer", seat=3, winner="狼人阵营", min_days=2)
+    selected = columns.select(rows)
+    select_ms = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    decisions, _ = scan_select(columns, 3, 2)
+    scan_ms = (time.perf_counter() - start) * 1e3
+    print(f"numpy report: {numpy_s * 1e3:.1f} ms   python loops: {python_s * 1e3:.1f} ms   "
+          f"({python_s / numpy_s:.1f}x)")
+    print(f"index build: {build_ms:.1f} ms   where(role=seer, seat=3, winner=狼人阵营, min_days=2) + select: "
+          f"{select_ms:.2f} ms, {len(selected.games)} games   scanning all columns: {scan_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=100, help="把归档的列复制的倍数")
+    parser.add_argument("--seats", type=int, default=6)
+    args = parser.parse_args()
+    bench(args.games, args.scale, args.seats)
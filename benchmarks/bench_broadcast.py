@@ -0,0 +1,107 @@
+"""
+广播基准：一局游戏的引擎向N个观战连接推送发言分片。
+- 每连接序列化：旧做法，每个连接各自对每一帧做一次json序列化
+- 广播：backend.live.LiveGame，每帧序列化一次，放入各连接的有界队列
+另有若干从不读取的慢连接，验证引擎不会被拖慢，并统计各慢连接策略的丢帧、合并和断开次数。
+
+运行：python -m benchmarks.bench_broadcast --frames 500 --subscribers 1 10 100 500
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from backend.base import Phase
+from backend.live import LiveGame
+from backend.outcomes import SpeakOutcome
+from benchmarks.fake_openai import SPEECH
+
+
+def sse(data: dict, frame_id: int) -> str:
+    return f"id: {frame_id}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def make_frames(n: int):
+    frames = []
+    mid = str(uuid.uuid4())
+    for i in range(n):
+        if i % 20 == 0:
+            mid = str(uuid.uuid4())
+        piece = SPEECH[i % len(SPEECH)]
+        frames.append(SpeakOutcome(id=1, content=piece, phase=Phase.DISCUSSION, day=1, mid=mid).to_frame())
+    return frames
+
+
+def per_subscriber(frames, subscribers: int) -> float:
+    start = time.perf_counter()
+    for i, data in enumerate(frames, 1):
+        for _ in range(subscribers):
+            sse(data, i)
+    return time.perf_counter() - start
+
+
+async def broadcast(frames, subscribers: int, slow: int, policy: str, queue_size: int):
+    live = LiveGame("bench", sse, size=256, queue_size=queue_size, policy=policy)
+    received = [0] * subscribers
+    publish_time = 0.0
+
+    go = asyncio.Event()
+
+    async def run():
+        nonlocal publish_time
+        await go.wait()
+        for i, data in enumerate(frames, 1):
+            t = time.perf_counter()
+            live.publish(i, data)
+            publish_time += time.perf_counter() - t
+            await asyncio.sleep(0)
+
+    async def reader(k: int):
+        async for _ in live.subscribe():
+            received[k] += 1
+
+    async def stalled():
+        stream = live.subscribe()
+        await stream.__anext__()
+        # 收到第一帧后不再读取，直到游戏结束
+        await live.task
+        await stream.aclose()
+
+    live.start(run())
+    tasks = [asyncio.create_task(reader(k)) for k in range(subscribers)]
+    tasks += [asyncio.create_task(stalled()) for _ in range(slow)]
+    # 等所有连接订阅完成后再开始推送
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    go.set()
+    await live.task
+    wall = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return publish_time, wall, received, live.stats
+
+
+def main(n: int, counts, slow: int, queue_size: int):
+    frames = make_frames(n)
+    print(f"{'subs':>5} | {'per-sub ms':>10} | {'publish ms':>10} {'wall ms':>8} {'complete':>8}")
+    for subscribers in counts:
+        naive = per_subscriber(frames, subscribers)
+        publish, wall, received, _ = asyncio.run(broadcast(frames, subscribers, 0, "coalesce", queue_size))
+        complete = sum(r == n for r in received)
+        print(f"{subscribers:>5} | {naive * 1e3:>10.1f} | {publish * 1e3:>10.1f} {wall * 1e3:>8.1f} "
+              f"{complete:>4}/{subscribers:<4}")
+    print(f"\n{slow} stalled subscribers + 10 readers, queue {queue_size}:")
+    for policy in ("drop", "coalesce", "disconnect"):
+        publish, wall, received, stats = asyncio.run(broadcast(frames, 10, slow, policy, queue_size))
+        print(f"{policy:>10}: wall {wall * 1e3:.1f} ms, readers complete {sum(r == n for r in received)}/10, "
+              f"dropped {stats['dropped']}, coalesced {stats['coalesced']}, disconnected {stats['disconnected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--queue", type=int, default=64)
+    args = parser.parse_args()
+    main(args.frames, args.subscribers, args.slow, args.queue)
@@ -0,0 +1,58 @@
+"""
+检查点基准：游戏逐天推进时，对比每个阶段边界保存一次状态的开销。
+- JSON：json.dumps(GameState.dump())，恢复用 GameState.load(json.loads(...))
+- 完整检查点：backend.checkpoint.encode 生成的完整二进制记录
+- 增量检查点：只包含上一个检查点之后新增历史事件的二进制记录（Checkpointer实际写入的内容）
+
+运行：python -m benchmarks.bench_checkpoint --days 7 --number 200
+"""
+import argparse
+import json
+import timeit
+import zlib
+
+from backend.checkpoint import decode, encode, COMPRESSED
+from backend.game_state import GameState
+from benchmarks.bench_history import play_day
+
+
+def bench(days: int, number: int):
+    game_state = GameState()
+    game_state.initialize_players()
+    written = {pid: len(events) for pid, events in game_state.histories.items()}
+    records = [encode(game_state)]
+    print(f"{'day':>4} {'events':>7} | {'json B':>8} {'enc us':>8} {'dec us':>8} | "
+          f"{'full B':>8} {'enc us':>8} {'dec us':>8} | {'delta B':>8} {'raw B':>8} {'enc us':>8}")
+    for _ in range(days):
+        play_day(game_state)
+        events = sum(len(h) for h in game_state.histories.values())
+
+        dumped = game_state.dump()
+        stored = json.dumps(dumped, ensure_ascii=False)
+        json_enc = timeit.timeit(lambda: json.dumps(game_state.dump(), ensure_ascii=False), number=number) / number
+        json_dec = timeit.timeit(lambda: GameState.load(json.loads(stored)), number=number) / number
+
+        kind, full = encode(game_state)
+        full_enc = timeit.timeit(lambda: encode(game_state), number=number) / number
+        full_dec = timeit.timeit(lambda: decode([(kind, full)]), number=number) / number
+        assert decode([(kind, full)]).dump() == dumped
+
+        kind, delta = encode(game_state, written)
+        delta_enc = timeit.timeit(lambda: encode(game_state, written), number=number) / number
+        records.append((kind, delta))
+        # 基准中的发言文本重复度很高，压缩率偏乐观，同时给出压缩前的大小
+        raw = len(zlib.decompress(delta)) if kind & COMPRESSED else len(delta)
+        assert decode(records).dump() == dumped
+        written = {pid: len(h) for pid, h in game_state.histories.items()}
+
+        print(f"{game_state.day - 1:>4} {events:>7} | {len(stored.encode()):>8} {json_enc * 1e6:>8.1f} "
+              f"{json_dec * 1e6:>8.1f} | {len(full):>8} {full_enc * 1e6:>8.1f} {full_dec * 1e6:>8.1f} | "
+              f"{len(delta):>8} {raw:>8} {delta_enc * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    bench(args.days, args.number)
@@ -0,0 +1,71 @@
+"""
+GameState.get_history 微基准：对比全量重新渲染与增量缓存视图在游戏变长时的单次调用开销。
+增量视图的开销分为三列：每次读取前追加一条、追加十条后读取一次，以及没有新记录时的重复读取；
+前两列中读取时仍要把新行拼接到缓存的文本上，文本越长这一步复制的字节越多。
+
+运行：python -m benchmarks.bench_history
+"""
+import argparse
+import timeit
+
+from backend.base import Phase
+from backend.game_state import GameState
+from backend.history import PUBLIC_PHASES, render
+
+
+def legacy_get_history(game_state: GameState, pid: int) -> str:
+    tmp = [data for data in game_state.histories[pid] if data.phase == Phase.NIGHT]
+    tmp.extend([data for data in game_state.histories[0] if data.phase in PUBLIC_PHASES])
+    tmp = sorted(tmp, key=lambda x: x.day)
+    return "\n".join([render(data) for data in tmp])
+
+
+def play_day(game_state: GameState, speeches: int = 6):
+    """按真实游戏的顺序为每个玩家追加一天的历史记录"""
+    game_state.phase = Phase.NIGHT
+    for pid in game_state.alive_players:
+        game_state.add_player_history(pid, f"我在夜晚行动了，理由是：第{game_state.day}天的判断")
+        game_state.add_system_history(f"玩家{pid}在夜晚行动了")
+    for phase in (Phase.DAY, Phase.DISCUSSION, Phase.VOTING):
+        game_state.phase = phase
+        for pid in game_state.alive_players[:speeches]:
+            game_state.add_system_history(f"玩家{pid}发言：" + "我认为场上局势很复杂，需要仔细分析每个人的发言。" * 4,
+                                          kind="speak", seat=pid)
+            game_state.add_player_history(pid, "我的发言：……", kind="speak", seat=pid)
+    game_state.day += 1
+
+
+def bench(days: int, number: int):
+    game_state = GameState()
+    game_state.initialize_players()
+    print(f"{'day':>4} {'events':>7} {'legacy us/call':>15} {'cached us/call':>15} "
+          f"{'10 appends us':>14} {'no new us':>10} {'chars':>8}")
+    for _ in range(days):
+        play_day(game_state)
+        pid = game_state.alive_players[0]
+        assert game_state.get_history(pid) == legacy_get_history(game_state, pid)
+        legacy = timeit.timeit(lambda: legacy_get_history(game_state, pid), number=number) / number
+        # 模拟每次LLM调用之间都有新事件追加的情况
+        def cached():
+            game_state.add_system_history("玩家1发言：好的")
+            return game_state.get_history(pid)
+        incremental = timeit.timeit(cached, number=number) / number
+
+        def batch():
+            for _ in range(10):
+                game_state.add_system_history("玩家1发言：好的")
+            return game_state.get_history(pid)
+        batched = timeit.timeit(batch, number=number // 10 or 1) / (number // 10 or 1)
+        unchanged = timeit.timeit(lambda: game_state.get_history(pid), number=number) / number
+        assert game_state.get_history(pid) == legacy_get_history(game_state, pid)
+        print(f"{game_state.day - 1:>4} {len(game_state.histories[0]):>7} "
+              f"{legacy * 1e6:>15.1f} {incremental * 1e6:>15.1f} {batched * 1e6:>14.1f} {unchanged * 1e6:>10.2f} "
+              f"{len(game_state.get_history(pid)):>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    bench(args.days, args.number)
@@ -0,0 +1,105 @@
+"""
+历史记忆基准：同一批对局（相同随机种子）在不同记忆配置下，每天白天投票提示词的token数。
+- raw：完整的历史记录
+- extractive：已结束的各天换成规则摘要，当天仍为原始记录
+- extractive + budget：在摘要基础上再给投票模板设置token上限
+- llm：由假LLM（每次请求延迟--latency秒）在后台生成摘要，检查每晚的行动开始时前一天的摘要都已写入
+智能体沿用bench_table的脚本智能体，但发言和理由换成接近真实LLM输出的长度，以便衡量压缩效果。
+
+运行：python -m benchmarks.bench_memory --games 10 --seats 12 --budget 1500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks import fake_llm
+from backend.engine import run_game, AIInputSource
+from backend.game_state import GameState
+from backend.memory import create_summarizer
+from backend.tokens import count_tokens, is_exact
+from benchmarks.bench_table import ScriptedAgent
+
+REASON = "结合昨晚的死亡信息和今天各位玩家的发言，我认为这名玩家的逻辑前后矛盾，嫌疑最大。"
+SPEECH = ("我先说结论，我怀疑后置位的玩家。", "昨晚的死亡信息说明狼人在刻意避开强神，", "而今天有几位玩家的发言明显在带节奏，",
+          "跟着前置位的观点走却给不出自己的判断。", "我建议大家重点关注这几名玩家，投票时不要分票。")
+
+
+class VerboseAgent(ScriptedAgent):
+    """发言和理由更长，并按天记录投票提示词的token数，以及夜晚行动时缺少前一天摘要的次数"""
+
+    def __init__(self, rng: random.Random, summaries: bool = False):
+        super().__init__(rng)
+        self.tokens = defaultdict(list)
+        self.summaries = summaries
+        self.missing = 0
+
+    async def act(self, game_state, player, *args, **kwargs):
+        # 摘要只为每天结束时存活的玩家生成
+        if self.summaries and game_state.day > 1 and player.id in game_state.alive_players \
+                and game_state.day - 1 not in game_state.summaries.get(player.id, {}):
+            self.missing += 1
+        return dict(await super().act(game_state, player, *args, **kwargs), reason=REASON)
+
+    async def vote(self, game_state, player, history=None):
+        result = await super().vote(game_state, player, history)
+        self.tokens[game_state.day].append(count_tokens(self.last_vote))
+        return dict(result, reason=REASON)
+
+    async def speak(self, game_state, player):
+        self._prompt(game_state, player, 2)
+        for piece in SPEECH:
+            yield piece
+        yield "FINISH"
+
+
+async def play(seats: int, games: int, seed: int, mode: str, budget: int):
+    summarizer = create_summarizer(mode, budgets={"default": budget})
+    rng = random.Random(seed)
+    random.seed(seed)
+    agent = VerboseAgent(rng, summaries=mode != "none")
+    agents = {role: agent for role in ("werewolf", "seer", "witch", "villager")}
+    elapsed = 0.0
+    for _ in range(games):
+        game_state = GameState()
+        game_state.initialize_players(seats=seats, human_seats=())
+        start = time.perf_counter()
+        async for _ in run_game(game_state, agents, AIInputSource(), summarizer=summarizer):
+            pass
+        elapsed += time.perf_counter() - start
+    assert agent.missing == 0, f"{mode}: {agent.missing} night actions started before the previous day's summary"
+    return agent.tokens, elapsed
+
+
+def main(seats: int, games: int, seed: int, budget: int, latency: float):
+    print(f"tokenizer: {'tiktoken cl100k_base' if is_exact() else 'approximate'}")
+    # llm模式的摘要请求由假LLM应答，必须在backend.llm被导入之前安装
+    fake_llm.install(latency=latency)
+    configs = [("raw", "none", 0), ("extractive", "extractive", 0), (f"extractive + {budget}", "extractive", budget),
+               ("llm", "llm", 0)]
+    results = [(label, *asyncio.run(play(seats, games, seed, mode, limit))) for label, mode, limit in configs]
+    # 还原默认配置，不影响之后在同一进程中渲染的提示词
+    create_summarizer()
+    days = sorted(set().union(*(tokens.keys() for _, tokens, _ in results)))
+    print(f"mean vote prompt tokens, {seats} seats, {games} games")
+    print(f"{'day':>4} | " + " | ".join(f"{label:>21}" for label, _, _ in results))
+    for day in days:
+        cells = []
+        for _, tokens, _ in results:
+            values = tokens.get(day)
+            cells.append(f"{statistics.mean(values):>10.0f} (max {max(values):>4})" if values else f"{'-':>21}")
+        print(f"{day:>4} | " + " | ".join(cells))
+    print("ms/game | " + " | ".join(f"{elapsed / games * 1e3:>21.1f}" for _, _, elapsed in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--seats", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--latency", type=float, default=0.02, help="llm模式每个摘要请求的延迟（秒）")
+    args = parser.parse_args()
+    main(args.seats, args.games, args.seed, args.budget, args.latency)
@@ -0,0 +1,70 @@
+"""
+LLMPool基准：在本地启动多个延迟不同的假OpenAI服务器（其中一个持续失败），
+并发发送请求，统计各后端的请求分布、剔除情况和整体延迟分位数。
+
+运行：python -m benchmarks.bench_pool --requests 400 --concurrency 64
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from backend.llm_pool import create_pool
+from benchmarks.fake_openai import serve
+
+SERVERS = [
+    {"port": 9101, "latency": 0.05, "weight": 2, "max_inflight": 16},
+    {"port": 9102, "latency": 0.15, "weight": 1, "max_inflight": 8},
+    {"port": 9103, "latency": 0.05, "weight": 1, "max_inflight": 8, "fail_rate": 1.0},
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+async def main(requests: int, concurrency: int):
+    servers = [await serve(s["port"], latency=s["latency"], fail_rate=s.get("fail_rate", 0.0)) for s in SERVERS]
+    pool = create_pool(
+        [{"name": f"fake:{s['port']}", "base_url": f"http://127.0.0.1:{s['port']}/v1",
+          "weight": s["weight"], "max_inflight": s["max_inflight"]} for s in SERVERS],
+        {"api_key": "fake", "model": "fake", "temperature": 0.5},
+        eject_after=3, eject_seconds=60, retries=2
+    )
+    messages = [SystemMessage(content='{"action": "vote"}'), HumanMessage(content="可选目标: [1, 2, 3]")]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await pool.agenerate([messages])
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{requests} requests in {elapsed:.2f}s ({requests / elapsed:.0f} req/s), failures={failures}")
+    print(f"p50={percentile(latencies, 0.5) * 1000:.0f}ms p99={percentile(latencies, 0.99) * 1000:.0f}ms")
+    for stats in pool.stats():
+        latency = f"{stats['latency'] * 1000:.0f}ms" if stats['latency'] is not None else "-"
+        print(f"  {stats['name']:<12} weight={stats['weight']} requests={stats['requests']:<4} "
+              f"errors={stats['errors']:<3} latency={latency:<6} ejected={stats['ejected']}")
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
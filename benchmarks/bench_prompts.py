@@ -0,0 +1,32 @@
+"""
+每个提示词模板的token统计：静态前缀（规则 + 角色指令，可被后端前缀缓存复用）与动态部分（局面 + 历史）。
+
+运行：python -m benchmarks.bench_prompts --days 3
+"""
+import argparse
+
+from backend.prompts import token_report
+from backend.game_state import GameState
+from backend.tokens import is_exact
+from benchmarks.bench_history import play_day
+
+
+def main(days: int):
+    game_state = GameState()
+    game_state.initialize_players()
+    for _ in range(days):
+        play_day(game_state)
+    history = game_state.get_history(game_state.alive_players[0])
+    rows = token_report({"history": history or "暂时没有", "day": game_state.day})
+    print(f"tokenizer: {'tiktoken cl100k_base' if is_exact() else 'approximate'}, history after {days} day(s)")
+    print(f"{'template':<16} {'static':>7} {'dynamic':>8} {'total':>7} {'cacheable':>10}")
+    for row in rows:
+        print(f"{row['template']:<16} {row['static']:>7} {row['dynamic']:>8} {row['total']:>7} "
+              f"{row['static'] / row['total']:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=0)
+    args = parser.parse_args()
+    main(args.days)
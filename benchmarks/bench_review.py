@@ -0,0 +1,66 @@
+"""
+复盘查询基准：游戏变长时，对比全量序列化公共历史（之前/game/review的做法）与按索引过滤后取一页的开销，
+以及连续请求中两次事件循环让出之间的最长阻塞（NDJSON逐批输出）。
+
+运行：python -m benchmarks.bench_review --days 30
+"""
+import argparse
+import asyncio
+import json
+import time
+import timeit
+
+from backend.base import Phase
+from backend.game_state import GameState
+from backend.review import PAGE_SIZE, ndjson
+from benchmarks.bench_history import play_day
+
+
+def full_dump(game_state: GameState) -> str:
+    return json.dumps({"events": [e.to_dict() for e in game_state.histories[0]]}, ensure_ascii=False)
+
+
+def page(game_state: GameState, **filters) -> str:
+    index = game_state.review_index
+    positions, next_cursor = index.query(limit=PAGE_SIZE, **filters)
+    return json.dumps({"events": [index.item(pos) for pos in positions], "next_cursor": next_cursor},
+                      ensure_ascii=False)
+
+
+async def longest_block(game_state: GameState) -> float:
+    """NDJSON导出全部记录时，单批占用事件循环的最长时间"""
+    index = game_state.review_index
+    positions, _ = index.query()
+    longest = 0.0
+    start = time.perf_counter()
+    async for _ in ndjson(index, positions):
+        now = time.perf_counter()
+        longest = max(longest, now - start)
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+    return longest
+
+
+def bench(days: int, number: int):
+    game_state = GameState()
+    game_state.initialize_players(seats=12, human_seats=())
+    print(f"{'day':>4} {'events':>7} | {'full us':>9} | {'page us':>9} {'day+seat us':>12} | {'max block us':>13}")
+    for _ in range(days):
+        play_day(game_state, speeches=12)
+        full = timeit.timeit(lambda: full_dump(game_state), number=number) / number
+        first = timeit.timeit(lambda: page(game_state), number=number) / number
+        # 复盘某一天某个座位的发言，只遍历该座位的倒排表
+        day = max(1, game_state.day // 2)
+        filtered = timeit.timeit(lambda: page(game_state, day=day, seat=3, phase=Phase.DISCUSSION),
+                                 number=number) / number
+        block = asyncio.run(longest_block(game_state))
+        print(f"{game_state.day - 1:>4} {len(game_state.histories[0]):>7} | {full * 1e6:>9.1f} | "
+              f"{first * 1e6:>9.1f} {filtered * 1e6:>12.1f} | {block * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+    bench(args.days, args.number)
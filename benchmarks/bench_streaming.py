@@ -0,0 +1,60 @@
+"""
+发言分片合并基准：模拟LLM按固定速度输出分片，对比逐片成帧与合并后成帧的帧数、字节数、
+序列化耗时以及每句话首字的额外延迟。
+
+运行：python -m benchmarks.bench_streaming --token-rate 50 --speeches 3
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from backend.base import Phase
+from backend.outcomes import SpeakOutcome
+from backend.streaming import coalesce
+from benchmarks.fake_openai import SPEECH
+
+
+async def speech(pieces, token_rate: float):
+    delay = 1 / token_rate if token_rate else 0
+    for piece in pieces:
+        if delay:
+            await asyncio.sleep(delay)
+        yield piece
+    yield "FINISH"
+
+
+async def measure(pieces, token_rate: float, interval: float, max_bytes: int):
+    mid = str(uuid.uuid4())
+    frames = 0
+    size = 0
+    cpu = 0.0
+    start = time.perf_counter()
+    arrivals = []
+    async for chunk in coalesce(speech(pieces, token_rate), interval, max_bytes):
+        arrivals.append(time.perf_counter() - start)
+        t = time.perf_counter()
+        frame = f"data: {json.dumps(SpeakOutcome(id=1, content=chunk, phase=Phase.DISCUSSION, day=1, mid=mid).to_frame(), ensure_ascii=False)}\n\n"
+        cpu += time.perf_counter() - t
+        frames += 1
+        size += len(frame.encode("utf-8"))
+    return frames, size, cpu, arrivals[0]
+
+
+async def main(token_rate: float, speeches: int, interval: float, max_bytes: int):
+    pieces = SPEECH * speeches
+    for label, window in (("逐片", 0.0), (f"合并 {interval * 1000:.0f}ms/{max_bytes}B", interval)):
+        frames, size, cpu, first = await measure(pieces, token_rate, window, max_bytes)
+        print(f"{label:<18} frames={frames:<5} bytes={size:<7} serialize={cpu * 1000:.2f}ms "
+              f"first_frame={first * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-rate", type=float, default=50, help="每秒输出的分片数，0表示不限速")
+    parser.add_argument("--speeches", type=int, default=3, help="发言长度（重复示例发言的次数）")
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args()
+    asyncio.run(main(args.token_rate, args.speeches, args.interval, args.max_bytes))
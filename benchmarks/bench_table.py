@@ -0,0 +1,106 @@
+"""
+大桌基准：座位数从6增加到20时，引擎处理每个事件的开销、每局的事件数以及提示词大小。
+智能体换成按规则立即决策的脚本智能体（不调用LLM），但每次决策仍用真实的提示词模板渲染完整提示词，
+因此“每事件耗时”包含历史渲染和模板格式化。提示词token数取最后一个白天的投票提示词。
+
+运行：python -m benchmarks.bench_table --games 20 --seats 6 8 12 16 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from backend.base import Phase, Role
+from backend.engine import run_game, AIInputSource
+from backend.game_state import GameState, table_roles
+from backend.prompts import (WEREWOLF_KILL, WEREWOLF_VOTE, WEREWOLF_SPEAK, SEER_NIGHT, SEER_VOTE, SEER_SPEAK,
+                             WITCH_NIGHT, WITCH_VOTE, WITCH_SPEAK, VILLAGER_VOTE, VILLAGER_SPEAK)
+from backend.tokens import count_tokens, is_exact
+
+TEMPLATES = {
+    Role.WEREWOLF: (WEREWOLF_KILL, WEREWOLF_VOTE, WEREWOLF_SPEAK),
+    Role.SEER: (SEER_NIGHT, SEER_VOTE, SEER_SPEAK),
+    Role.WITCH: (WITCH_NIGHT, WITCH_VOTE, WITCH_SPEAK),
+    Role.VILLAGER: (None, VILLAGER_VOTE, VILLAGER_SPEAK),
+}
+
+
+class ScriptedAgent:
+    """渲染真实提示词后按固定规则决策：狼人杀编号最小的好人，其余随机选择目标"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.last_vote = ""
+
+    def _prompt(self, game_state: GameState, player, index: int, history=None) -> str:
+        template = TEMPLATES[player.role][index]
+        if template is None:
+            return ""
+        targets = [p.id for p in game_state.players if p.alive and p.id != player.id]
+        values = {"pid": player.id, "day": game_state.day, "phase": game_state.phase_map[Phase(game_state.phase)],
+                  "alive": game_state.alive_players, "targets": targets,
+                  "history": (game_state.get_history(player.id) if history is None else history) or "暂时没有",
+                  "teammate": "", "talks": 0, "items": "一瓶解药 | 一瓶毒药", "dying": "无"}
+        return "\n".join(m.content for m in template.render(**values))
+
+    async def act(self, game_state: GameState, player, *args, **kwargs):
+        self._prompt(game_state, player, 0)
+        alive = [p for p in game_state.players if p.alive and p.id != player.id]
+        if player.role == Role.WEREWOLF:
+            target = next(p.id for p in alive if p.role != Role.WEREWOLF)
+            return {"action": "kill", "target": target, "reason": "脚本"}
+        if player.role == Role.WITCH:
+            return {"action": "none", "target": -1, "reason": "脚本"}
+        return {"action": "check", "target": self.rng.choice(alive).id, "reason": "脚本"}
+
+    async def vote(self, game_state: GameState, player, history=None):
+        self.last_vote = self._prompt(game_state, player, 1, history)
+        alive = [p.id for p in game_state.players if p.alive and p.id != player.id]
+        return {"action": "vote", "target": self.rng.choice(alive), "reason": "脚本"}
+
+    async def speak(self, game_state: GameState, player):
+        self._prompt(game_state, player, 2)
+        for piece in ("我觉得", "场上", "局势", "很复杂。"):
+            yield piece
+        yield "FINISH"
+
+
+async def play(seats: int, games: int, seed: int):
+    rng = random.Random(seed)
+    random.seed(seed)
+    agent = ScriptedAgent(rng)
+    agents = {role.value: agent for role in Role}
+    steps, days, tokens, elapsed = [], [], [], 0.0
+    for _ in range(games):
+        game_state = GameState()
+        game_state.initialize_players(seats=seats, human_seats=())
+        start = time.perf_counter()
+        async for _ in run_game(game_state, agents, AIInputSource()):
+            pass
+        elapsed += time.perf_counter() - start
+        steps.append(game_state.step)
+        days.append(game_state.day)
+        tokens.append(count_tokens(agent.last_vote))
+    return elapsed, steps, days, tokens
+
+
+def main(seat_counts, games: int, seed: int):
+    print(f"tokenizer: {'tiktoken cl100k_base' if is_exact() else 'approximate'}")
+    print(f"{'seats':>5} {'wolves':>6} | {'events/game':>11} {'days':>5} | {'us/event':>9} {'ms/game':>8} | "
+          f"{'vote prompt tokens':>18}")
+    for seats in seat_counts:
+        elapsed, steps, days, tokens = asyncio.run(play(seats, games, seed))
+        wolves = table_roles(seats).count(Role.WEREWOLF)
+        print(f"{seats:>5} {wolves:>6} | {statistics.mean(steps):>11.1f} {statistics.mean(days):>5.1f} | "
+              f"{elapsed / sum(steps) * 1e6:>9.1f} {elapsed / games * 1e3:>8.1f} | "
+              f"{statistics.mean(tokens):>9.0f} (max {max(tokens)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seats", type=int, nargs="+", default=[6, 8, 12, 16, 20])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.seats, args.games, args.seed)
@@ -0,0 +1,68 @@
+"""
+进程内的假LLM，提供与ChatOpenAI相同的agenerate/astream接口，用于完全离线的端到端基准。
+决策按response_format中的JSON Schema（没有时按提示词中的格式说明）生成合法的行动和目标；
+latency为每次请求的延迟（秒），token_rate为流式发言每秒输出的分片数，0表示不等待。
+
+backend.llm在导入时根据config.toml创建客户端，必须在导入backend.agents之前调用install()。
+"""
+import asyncio
+import json
+import random
+import sys
+import types
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from benchmarks.fake_openai import SPEECH, decide
+
+
+class FakeLLM:
+
+    def __init__(self, latency: float = 0.0, token_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def _decide(self, messages, response_format=None) -> str:
+        schema = (response_format or {}).get("json_schema", {}).get("schema")
+        if schema is None:
+            return decide("\n".join(str(m.content) for m in messages), self.rng)
+        properties = schema["properties"]
+        actions = [a for a in properties["action"]["enum"] if a != "conversation"] or ["conversation"]
+        targets = [t for t in properties["target"]["enum"] if t != -1] or [-1]
+        return json.dumps({"action": actions[0], "target": self.rng.choice(targets), "reason": "根据发言判断",
+                           "content": "今晚一起行动"}, ensure_ascii=False)
+
+    async def agenerate(self, batches, response_format=None, **kwargs) -> LLMResult:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._decide(batches[0], response_format)
+        return LLMResult(generations=[[ChatGeneration(message=AIMessage(content=text))]])
+
+    async def astream(self, messages, **kwargs):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        delay = 1 / self.token_rate if self.token_rate else 0
+        for piece in SPEECH:
+            if delay:
+                await asyncio.sleep(delay)
+            yield AIMessageChunk(content=piece)
+
+
+def install(**options) -> FakeLLM:
+    """用FakeLLM替换backend.llm模块；已经安装过时只更新参数"""
+    module = sys.modules.get("backend.llm")
+    if module is not None and isinstance(getattr(module, "llm", None), FakeLLM):
+        for name, value in options.items():
+            setattr(module.llm, name, value)
+        return module.llm
+    if module is not None:
+        raise RuntimeError("backend.llm is already imported, call install() before importing backend.agents")
+    module = types.ModuleType("backend.llm")
+    module.llm = FakeLLM(**options)
+    sys.modules["backend.llm"] = module
+    return module.llm
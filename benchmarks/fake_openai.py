@@ -0,0 +1,93 @@
+"""
+离线的OpenAI兼容假服务器，实现 /v1/chat/completions（普通与流式），用于连接池和端到端基准测试。
+根据提示词中的JSON格式说明和"可选目标"生成合法的决策，延迟、输出速度和失败率可配置。
+
+运行：python -m benchmarks.fake_openai --port 9001 --latency 0.2 --token-rate 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SPEECH = ["我觉得", "昨晚的", "情况", "很可疑，", "玩家", "的发言", "前后", "矛盾。", "我建议", "大家", "重点", "关注", "他。"]
+ACTION = re.compile(r'\{"action": "(\w+)"')
+TARGETS = re.compile(r'可选目标: \[([\d, ]*)\]')
+
+
+def decide(prompt: str, rng: random.Random) -> str:
+    """从提示词里的第一种行动和可选目标中随机生成一个合法决策"""
+    actions = ACTION.findall(prompt)
+    targets = TARGETS.findall(prompt)
+    ids = [int(x) for x in targets[0].split(",") if x.strip()] if targets else []
+    action = actions[0] if actions else "vote"
+    return json.dumps({"action": action, "target": rng.choice(ids) if ids else -1, "reason": "根据发言判断"},
+                      ensure_ascii=False)
+
+
+def create_app(latency: float = 0.0, token_rate: float = 0.0, fail_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+        if fail_rate and rng.random() < fail_rate:
+            return JSONResponse({"error": {"message": "fake failure", "type": "server_error"}}, status_code=500)
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        model = body.get("model", "fake")
+        cid = f"chatcmpl-{uuid.uuid4().hex}"
+        if not body.get("stream"):
+            text = decide(prompt, rng)
+            return {
+                "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(text),
+                          "total_tokens": len(prompt) + len(text)},
+            }
+
+        async def stream():
+            delay = 1 / token_rate if token_rate else 0
+            for piece in SPEECH:
+                if delay:
+                    await asyncio.sleep(delay)
+                chunk = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            done = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+async def serve(port: int, **options):
+    """在当前事件循环中启动一个假服务器，返回uvicorn.Server以便关闭"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(create_app(**options), host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="流式输出的分片速度（每秒），0表示不限速")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.token_rate, args.fail_rate), host="127.0.0.1", port=args.port)
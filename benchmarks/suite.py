@@ -0,0 +1,252 @@
+"""
+基准套件，完全离线运行：
+- 微基准：GameState热路径（get_history、must_event_every_day、when_day_event、kill_player、set_out）、
+  事件构造和sse_event序列化，每次操作的耗时取多轮重复的中位数
+- 端到端：智能体使用进程内的假LLM（benchmarks.fake_llm，延迟和输出速度可配置）完整对局，
+  统计games/sec、events/sec、每局CPU时间、每局内存峰值和结束后游戏状态占用的内存（tracemalloc）
+--save把结果写入基线文件，--check与基线比较，任一指标变差超过它的阈值时以状态1退出：
+端到端指标为--threshold，纳秒级的微基准受缓存和调度影响更大，阈值为--micro-threshold。
+基线与机器相关，换机器或Python版本后先在修改前的代码上运行--save。
+
+运行：python -m benchmarks.suite --check
+     python -m benchmarks.suite --save
+     python -m benchmarks.suite --only e2e --games 100 --latency 0.01 --token-rate 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from backend.base import Phase
+from backend.events import VoteEvent
+from backend.game_state import GameState
+from backend.live import sse_event
+from backend.outcomes import SpeakOutcome
+from benchmarks.bench_history import play_day
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def new_game(seats: int) -> GameState:
+    game_state = GameState()
+    game_state.initialize_players(seats=seats, human_seats=())
+    # 座位索引在真实对局中早已建好，不计入kill_player和set_out
+    game_state.seat_index
+    return game_state
+
+
+def _killed(seats: int) -> GameState:
+    game_state = new_game(seats)
+    game_state.just_killed = [2, 3]
+    return game_state
+
+
+def _voted(seats: int) -> GameState:
+    game_state = new_game(seats)
+    for pid in game_state.alive_players:
+        game_state.vote(pid % 3 + 1)
+    return game_state
+
+
+def _history(seats: int) -> Callable[[], GameState]:
+    """每次操作使用新的5天历史、已渲染过一次的GameState，历史长度不随操作次数增长"""
+    def make() -> GameState:
+        game_state = new_game(seats)
+        for _ in range(5):
+            play_day(game_state)
+        game_state.phase = Phase.DISCUSSION
+        game_state.get_history(game_state.alive_players[0])
+        return game_state
+    return make
+
+
+def _append_and_render(game_state: GameState):
+    # 每次LLM调用之间都有新的发言追加，测的是增量渲染
+    game_state.add_system_history("玩家1发言：我认为场上局势很复杂。", kind="speak", seat=1)
+    return game_state.get_history(game_state.alive_players[0])
+
+
+FRAME = SpeakOutcome(id=1, content="我觉得昨晚的情况很可疑，", phase=Phase.DISCUSSION, day=1, mid="m").to_frame()
+
+# 名称 -> (准备一次操作所需参数的工厂，操作)；工厂在计时之外调用，修改状态的操作每次使用新的GameState
+MICRO: Dict[str, Tuple[Callable[[int], Callable[[], Any]], Callable[[Any], Any]]] = {
+    "get_history": (_history, _append_and_render),
+    "must_event_every_day": (lambda seats: lambda: new_game(seats), GameState.must_event_every_day),
+    "when_day_event": (lambda seats: lambda: new_game(seats), GameState.when_day_event),
+    "kill_player": (lambda seats: lambda: _killed(seats), GameState.kill_player),
+    "set_out": (lambda seats: lambda: _voted(seats), GameState.set_out),
+    "event_construction": (lambda seats: lambda: None,
+                           lambda _: VoteEvent(day=1, phase=Phase.VOTING, source=1, target=2, reason="理由")),
+    "sse_event": (lambda seats: lambda: 7, lambda frame_id: sse_event(FRAME, event_id=frame_id)),
+}
+
+
+def _time(make: Callable[[], Any], op: Callable[[Any], Any], number: int) -> float:
+    args = [make() for _ in range(number)]
+    # 与timeit一样计时期间关闭垃圾回收，避免准备阶段分配的对象触发回收
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for arg in args:
+            op(arg)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def micro(seats: int, number: int, repeat: int, min_time: float = 0.05, setup_time: float = 0.25) -> Dict[str, float]:
+    """
+    每轮的操作次数使计时不少于min_time，同时准备参数（如新建GameState）不超过setup_time，最多number次；
+    取各轮每次操作耗时的中位数
+    """
+    results = {}
+    for name, (factory, op) in MICRO.items():
+        make = factory(seats)
+        start = time.perf_counter()
+        trial = max(_time(make, op, 50) / 50, 1e-9)
+        setup = max((time.perf_counter() - start) / 50 - trial, 1e-9)
+        n = max(50, min(number, int(min_time / trial), int(setup_time / setup)))
+        results[f"micro.{name}.ns"] = statistics.median(_time(make, op, n) / n for _ in range(repeat)) * 1e9
+    return results
+
+
+async def _games(agents, games: int, seats: int, concurrency: int) -> List[GameState]:
+    from backend.simulate import play_one
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with semaphore:
+            return await play_one(agents, seats)
+
+    return await asyncio.gather(*(worker() for _ in range(games)))
+
+
+def e2e(games: int, seats: int, latency: float, token_rate: float, concurrency: int,
+        memory_games: int, seed: int = 0) -> Dict[str, float]:
+    from benchmarks.fake_llm import install
+    llm = install(latency=latency, token_rate=token_rate)
+    from backend.agents import create_agents
+    agents = create_agents()
+    # 角色分配和假LLM的决策都固定随机种子，每次运行进行的是同一批对局
+    random.seed(seed)
+    llm.rng.seed(seed)
+    wall, cpu = time.perf_counter(), time.process_time()
+    states = asyncio.run(_games(agents, games, seats, concurrency))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    events = sum(s.step for s in states)
+    # 内存峰值单独逐局测量，tracemalloc会明显拖慢运行，不计入上面的耗时
+    peaks, retained = [], []
+    tracemalloc.start()
+    for _ in range(memory_games):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        finished = asyncio.run(_games(agents, 1, seats, 1))
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+        # 结束的对局仍保存在存储中，retained为一局结束后游戏状态占用的内存
+        retained.append(current - base)
+        del finished
+    tracemalloc.stop()
+    key = f"e2e[seats={seats},latency={latency:g},token_rate={token_rate:g},concurrency={concurrency}]"
+    return {
+        f"{key}.games_per_sec": games / wall,
+        f"{key}.events_per_sec": events / wall,
+        f"{key}.cpu_ms_per_game": cpu / games * 1e3,
+        f"{key}.peak_kib_per_game": sum(peaks) / len(peaks) / 1024 if peaks else 0.0,
+        f"{key}.retained_kib_per_game": sum(retained) / len(retained) / 1024 if retained else 0.0,
+    }
+
+
+def higher_is_better(name: str) -> bool:
+    return name.endswith("_per_sec")
+
+
+def threshold_of(name: str, args) -> float:
+    return args.micro_threshold if name.startswith("micro.") else args.threshold
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], args) -> List[str]:
+    """打印与基线的对比，返回变差超过各自阈值的指标"""
+    regressions = []
+    print(f"{'metric':<80} {'baseline':>12} {'current':>12} {'change':>8} {'limit':>6}")
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old:
+            print(f"{name:<80} {'-':>12} {value:>12.1f}")
+            continue
+        change = value / old - 1
+        worse = -change if higher_is_better(name) else change
+        flag = ""
+        limit = threshold_of(name, args)
+        if worse > limit:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<80} {old:>12.1f} {value:>12.1f} {change:>+7.1%} {limit:>6.0%}{flag}")
+    return regressions
+
+
+def run(args) -> Dict[str, float]:
+    results = {}
+    if args.only in (None, "micro"):
+        results.update(micro(args.seats, args.number, args.repeat))
+    if args.only in (None, "e2e"):
+        results.update(e2e(args.games, args.seats, args.latency, args.token_rate, args.concurrency,
+                           args.memory_games))
+    return results
+
+
+def median_of(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """多次运行中每个指标的中位数，单次运行受机器负载影响的结果不会决定比较结果"""
+    return {name: statistics.median(r[name] for r in runs) for name in runs[0]}
+
+
+def main(args) -> int:
+    runs = [run(args) for _ in range(args.runs)]
+    results = median_of(runs)
+    path = Path(args.baseline)
+    baseline = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {"results": {}}
+    regressions = compare(results, baseline["results"], args)
+    if args.check and regressions and not args.save:
+        # 偶发的机器负载也会超过阈值，再运行同样多次确认，取全部运行的中位数
+        print(f"{len(regressions)} metrics over threshold, running again to confirm")
+        runs += [run(args) for _ in range(args.runs)]
+        results = median_of(runs)
+        regressions = compare(results, baseline["results"], args)
+    if args.save:
+        baseline["results"].update(results)
+        baseline["machine"] = f"{platform.machine()} {platform.processor()} python {platform.python_version()}"
+        path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"saved {len(results)} results to {path}")
+        return 0
+    if args.check and regressions:
+        print(f"{len(regressions)} metrics regressed past their threshold")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GameState和引擎的离线基准套件")
+    parser.add_argument("--only", choices=["micro", "e2e"])
+    parser.add_argument("--seats", type=int, default=6)
+    parser.add_argument("--number", type=int, default=20000, help="微基准每轮最多的操作次数")
+    parser.add_argument("--repeat", type=int, default=7, help="微基准的重复轮数，取中位数")
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="假LLM每次请求的延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="假LLM流式发言每秒的分片数，0表示不限速")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时进行的对局数")
+    parser.add_argument("--memory-games", type=int, default=5, help="测量内存峰值的对局数")
+    parser.add_argument("--runs", type=int, default=3, help="整个套件运行的次数，每个指标取中位数")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--threshold", type=float, default=0.25, help="端到端指标允许变差的比例")
+    parser.add_argument("--micro-threshold", type=float, default=0.5, help="微基准允许变差的比例")
+    parser.add_argument("--save", action="store_true", help="把本次结果写入基线")
+    parser.add_argument("--check", action="store_true", help="与基线比较，有指标变差时以状态1退出")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,4 @@
+"""测试使用进程内的假LLM，backend.llm在导入时会创建客户端，必须在导入backend.agents之前安装"""
+from benchmarks import fake_llm
+
+fake_llm.install()
@@ -0,0 +1,101 @@
+"""检查点：第一条记录为完整状态，之后追加增量记录，读回的状态与保存时一致"""
+import random
+
+from backend.checkpoint import Checkpointer, COMPRESSED, DELTA, FULL, MAGIC, RECORD, VERSION, decode, encode
+from backend.engine import AIInputSource, run_game
+from backend.game_state import GameState
+from benchmarks.bench_table import ScriptedAgent
+
+
+def kinds(path):
+    """文件中每条记录的类型，不含压缩标志"""
+    data = path.read_bytes()
+    assert data[:4] == MAGIC and data[4] == VERSION
+    result, pos = [], 5
+    while pos < len(data):
+        kind, size = RECORD.unpack_from(data, pos)
+        result.append(kind & ~COMPRESSED)
+        pos += RECORD.size + size
+    return result
+
+
+def new_game(seed=0):
+    random.seed(seed)
+    game_state = GameState()
+    game_state.initialize_players(seats=12, human_seats=())
+    agent = ScriptedAgent(random.Random(seed))
+    return game_state, {role: agent for role in ("werewolf", "seer", "witch", "villager")}
+
+
+def test_encode_decode_round_trip():
+    game_state, _ = new_game()
+    game_state.add_system_history("玩家1说：我是好人", kind="speak", seat=1)
+    full = encode(game_state)
+    written = {pid: len(events) for pid, events in game_state.histories.items()}
+    game_state.add_system_history("玩家2投票给了玩家1,理由是：可疑", kind="vote", seat=2)
+    game_state.add_player_history(2, "我投票给了玩家1,理由是：可疑", kind="vote", seat=2)
+    delta = encode(game_state, written)
+    assert full[0] & ~COMPRESSED == FULL and delta[0] & ~COMPRESSED == DELTA
+    restored = decode([full, delta])
+    assert restored.dump() == game_state.dump()
+    assert [(e.kind, e.seat) for e in restored.histories[0][-2:]] == [("speak", 1), ("vote", 2)]
+
+
+async def test_full_then_delta_during_game(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path))
+    game_state, agents = new_game()
+    path = tmp_path / "g.ckpt"
+    saved = 0
+
+    async def save(state):
+        nonlocal saved
+        await checkpointer.save("g", state)
+        if state.game_over:
+            return
+        saved += 1
+        assert kinds(path) == [FULL] + [DELTA] * (saved - 1)
+        assert Checkpointer.read(path).dump() == state.dump()
+
+    async for _ in run_game(game_state, agents, AIInputSource(), on_checkpoint=save):
+        pass
+    assert saved > 2
+    # 游戏结束后删除检查点
+    assert game_state.game_over and not path.exists()
+
+
+async def test_rewrites_full_record_when_history_diverges(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path))
+    game_state, _ = new_game()
+    path = tmp_path / "g.ckpt"
+    game_state.add_system_history("第一天", kind="announce")
+    await checkpointer.save("g", game_state)
+    game_state.add_system_history("第二天", kind="announce")
+    await checkpointer.save("g", game_state)
+    assert kinds(path) == [FULL, DELTA]
+    # 重置后的新游戏与已写入的历史对不上，重新写入完整记录
+    reset, _ = new_game(1)
+    await checkpointer.save("g", reset)
+    assert kinds(path) == [FULL]
+    assert Checkpointer.read(path).dump() == reset.dump()
+    # 检查点文件被删除后同样重新写入完整记录
+    path.unlink()
+    reset.add_system_history("第三天", kind="announce")
+    await checkpointer.save("g", reset)
+    assert kinds(path) == [FULL]
+    assert Checkpointer.read(path).dump() == reset.dump()
+
+
+async def test_restore_ignores_torn_tail_and_skips_corrupt_files(tmp_path, caplog):
+    checkpointer = Checkpointer(str(tmp_path))
+    game_state, _ = new_game()
+    await checkpointer.save("g", game_state)
+    game_state.add_system_history("第二天", kind="announce")
+    await checkpointer.save("g", game_state)
+    # 写入中途崩溃：最后一条记录不完整
+    with open(tmp_path / "g.ckpt", "ab") as f:
+        f.write(RECORD.pack(DELTA, 100) + b"\x00" * 10)
+    (tmp_path / "bad.ckpt").write_bytes(b"not a checkpoint")
+    restored = dict(Checkpointer(str(tmp_path)).restore())
+    assert list(restored) == ["g"]
+    assert restored["g"].dump() == game_state.dump()
+    assert "skip checkpoint bad.ckpt" in caplog.text
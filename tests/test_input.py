@@ -0,0 +1,105 @@
+"""人类输入：一个回合的决策只写入一次，不是当前回合的座位提交的决策被忽略"""
+import asyncio
+import random
+from collections import Counter
+
+from backend.agents import create_agents
+from backend.engine import ChannelInputSource, parse_input, run_game
+from backend.game_state import GameState
+from backend.store import MemoryChannel
+
+
+def new_game(human_seats):
+    game_state = GameState()
+    game_state.initialize_players(seats=10, human_seats=human_seats)
+    return game_state
+
+
+def said(game_state, seat):
+    return [e for e in game_state.histories[0] if e.kind == "speak" and e.seat == seat]
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_duplicate_input_applied_once():
+    game_state = new_game([6])
+    channel = MemoryChannel()
+    source = ChannelInputSource(channel, "g", game_state, game_state.human_seats)
+    try:
+        source.expect(6)
+        await channel.publish("g", {"etype": "SPEAK", "source": 6, "content": "我是好人"})
+        await channel.publish("g", {"etype": "SPEAK", "source": 6, "content": "我是好人"})
+        assert await source.wait(game_state, 6, "speak")
+        await settle()
+        assert len(said(game_state, 6)) == 1
+        # 下一次询问之前提交的决策都被忽略
+        await channel.publish("g", {"etype": "SPEAK", "source": 6, "content": "还有一句"})
+        await settle()
+        assert len(said(game_state, 6)) == 1
+        source.expect(6)
+        await channel.publish("g", {"etype": "SPEAK", "source": 6, "content": "第二轮"})
+        assert await source.wait(game_state, 6, "speak")
+        assert len(said(game_state, 6)) == 2
+    finally:
+        source.close()
+
+
+async def test_out_of_turn_input_ignored():
+    game_state = new_game([3, 6])
+    channel = MemoryChannel()
+    source = ChannelInputSource(channel, "g", game_state, game_state.human_seats)
+    try:
+        source.expect(6)
+        await channel.publish("g", {"etype": "SPEAK", "source": 3, "content": "不是我的回合"})
+        await settle()
+        assert not said(game_state, 3)
+        assert not source.event.is_set()
+        await channel.publish("g", {"etype": "SPEAK", "source": 6, "content": "轮到我了"})
+        assert await source.wait(game_state, 6, "speak")
+        assert len(said(game_state, 6)) == 1
+    finally:
+        source.close()
+
+
+def reply(frame):
+    seat = frame["seat"]
+    if frame["type"] == "user_speak":
+        return {"etype": "SPEAK", "source": seat, "content": "我是好人"}
+    if frame["type"] == "voting":
+        return {"etype": "VOTE", "source": seat, "target": frame["voting"][0], "reason": "发言可疑"}
+    action = "kill" if "kill" in frame["action"] else frame["action"][0]
+    if not frame.get(action):
+        return {"etype": "NONE", "source": seat}
+    return {"etype": action.upper(), "source": seat, "target": frame[action][0], "reason": "发言可疑"}
+
+
+async def test_game_counts_each_vote_once():
+    """人类座位每次都把同一个决策提交两次，并且另一个人类座位抢先提交：每天仍然只记一票"""
+    random.seed(6)
+    game_state = new_game([3, 6])
+    channel = MemoryChannel()
+    source = ChannelInputSource(channel, "g", game_state, game_state.human_seats)
+    prompts = Counter()
+    try:
+        async for outcome in run_game(game_state, create_agents(), source):
+            frame = outcome.to_frame()
+            if frame["type"] not in ("act", "conversation", "user_speak", "voting"):
+                continue
+            seat = frame["seat"]
+            other = 3 if seat == 6 else 6
+            await channel.publish("g", {"etype": "SPEAK", "source": other, "content": "不是我的回合"})
+            message = reply(frame)
+            parse_input(game_state, message)
+            if frame["type"] == "voting":
+                prompts[seat, game_state.day] += 1
+            await channel.publish("g", message)
+            await channel.publish("g", message)
+    finally:
+        source.close()
+    votes = Counter((e.seat, e.day) for e in game_state.histories[0] if e.kind == "vote" and e.seat in (3, 6))
+    assert prompts
+    assert votes == prompts
+    assert not any("不是我的回合" in e.content for e in game_state.histories[0])
@@ -0,0 +1,87 @@
+"""断线重连：携带Last-Event-ID只补发缺失的帧，私有帧只发给所属座位的连接"""
+import asyncio
+import json
+
+from backend.live import LiveGame, sse_event
+
+
+def new_live(size=8):
+    return LiveGame("g", lambda data, frame_id: sse_event(data, event_id=frame_id), size=size)
+
+
+def frame_ids(texts):
+    return [int(text.split("\n")[0][len("id: "):]) for text in texts]
+
+
+async def collect(live, last_event_id=None, seat=None):
+    return [text async for text in live.subscribe(last_event_id, seat)]
+
+
+async def finished(live, frames):
+    """发布frames后结束的引擎"""
+    async def run():
+        for frame_id, data in frames:
+            live.publish(frame_id, data)
+    live.start(run())
+    await live.task
+
+
+async def test_replay_after_last_event_id():
+    live = new_live()
+    await finished(live, [(i, {"type": "display", "content": str(i)}) for i in range(1, 6)])
+    assert frame_ids(await collect(live, "3")) == [4, 5]
+    assert frame_ids(await collect(live, "5")) == []
+    assert frame_ids(await collect(live)) == [1, 2, 3, 4, 5]
+    # 不是数字的id按没有携带处理
+    assert frame_ids(await collect(live, "abc")) == [1, 2, 3, 4, 5]
+
+
+async def test_replay_out_of_buffer():
+    live = new_live(size=4)
+    await finished(live, [(i, {"type": "display"}) for i in range(1, 11)])
+    # 落后太多或id来自之前的运行时补发缓冲区中的全部帧
+    assert frame_ids(await collect(live, "2")) == [7, 8, 9, 10]
+    assert frame_ids(await collect(live, "99")) == [7, 8, 9, 10]
+    assert frame_ids(await collect(live, "6")) == [7, 8, 9, 10]
+
+
+async def test_private_frames_only_replayed_to_their_seat():
+    live = new_live()
+    await finished(live, [(1, {"type": "display"}), (2, {"type": "act", "seat": 3}),
+                          (3, {"type": "display", "seat": 6}), (4, {"type": "display"})])
+    assert frame_ids(await collect(live, "1")) == [4]
+    assert frame_ids(await collect(live, "1", seat=3)) == [2, 4]
+    assert frame_ids(await collect(live, "1", seat=6)) == [3, 4]
+
+
+async def test_reconnect_then_follow_live_frames():
+    live = new_live()
+    release = asyncio.Event()
+
+    async def run():
+        live.publish(1, {"type": "display"})
+        live.publish(2, {"type": "display"})
+        await release.wait()
+        live.publish(3, {"type": "display", "seat": 6})
+        live.publish(4, {"type": "display"})
+    live.start(run())
+    await asyncio.sleep(0)
+    stream = live.subscribe("1", seat=6)
+    received = [await anext(stream)]
+    release.set()
+    received += [text async for text in stream]
+    assert frame_ids(received) == [2, 3, 4]
+    assert json.loads(received[1].split("data: ")[1])["seat"] == 6
+    await live.task
+
+
+async def test_engine_error_is_logged(caplog):
+    live = new_live()
+
+    async def run():
+        live.publish(1, {"type": "display"})
+        raise RuntimeError("boom")
+    live.start(run())
+    await live.task
+    assert "game g stopped" in caplog.text and "boom" in caplog.text
+    assert frame_ids(await collect(live)) == [1]
@@ -0,0 +1,55 @@
+"""结果记录生成的帧与pydantic帧模型一致"""
+import pytest
+
+from backend.base import Phase
+from backend.outcomes import (
+    FRAME_MODELS,
+    ActOutcome,
+    ConversationOutcome,
+    DisplayOutcome,
+    FinishOutcome,
+    ParkedOutcome,
+    SpeakOutcome,
+    UserSpeakOutcome,
+    VotingOutcome,
+)
+
+ALIVE = [1, 2, 3, 5]
+OUTCOMES = [
+    DisplayOutcome(content="天亮了", day=1, phase=Phase.DAY, alive=ALIVE),
+    DisplayOutcome(content="你查验了玩家2", day=1, phase="night", alive=ALIVE, seat=3),
+    SpeakOutcome(id=2, content="我觉得", phase=Phase.DISCUSSION, day=1, mid="m"),
+    ActOutcome(day=1, phase=Phase.NIGHT, seat=3, action=["check"], targets={"check": [1, 2, 5]}),
+    ConversationOutcome(content="玩家1(你的队友)说：杀5号", day=1, phase=Phase.NIGHT, seat=3, source=1,
+                        action=["conversation", "kill"], targets={"conversation": [1], "kill": [2, 5]}),
+    UserSpeakOutcome(day=2, phase=Phase.DISCUSSION, seat=3, alive=ALIVE),
+    VotingOutcome(day=2, phase=Phase.VOTING, seat=3, voting=ALIVE, alive=ALIVE),
+    FinishOutcome(winner="好人阵营"),
+    ParkedOutcome(),
+]
+
+
+@pytest.mark.parametrize("outcome", OUTCOMES, ids=lambda outcome: type(outcome).__name__)
+def test_frame_matches_model(outcome):
+    frame = outcome.to_frame()
+    model = outcome.to_model()
+    assert isinstance(model, FRAME_MODELS[frame["type"]])
+    assert model.model_dump(mode="json", exclude_unset=True) == frame
+    assert list(frame)[0] == "type"
+
+
+def test_frame_fields():
+    display, private, _, act, conversation, user_speak, voting, finish, parked = (o.to_frame() for o in OUTCOMES)
+    assert "seat" not in display and private["seat"] == 3
+    assert act["check"] == [1, 2, 5] and "targets" not in act
+    assert conversation["source"] == 1 and conversation["kill"] == [2, 5]
+    assert user_speak["action"] == ["speak"] and voting["action"] == ["voting"]
+    assert finish == {"type": "finish", "winner": "好人阵营", "game_over": True}
+    assert parked["content"] == "长时间未操作，游戏已暂停"
+
+
+def test_frame_does_not_share_state_lists():
+    alive = [1, 2, 3]
+    frame = DisplayOutcome(content="天亮了", day=1, phase=Phase.DAY, alive=alive).to_frame()
+    alive.remove(2)
+    assert frame["alive"] == [1, 2, 3]
@@ -0,0 +1,56 @@
+"""租约的获取、续期和接管，以及通过通知通道在worker之间转发帧"""
+import asyncio
+
+from backend.store import MemoryStore, SQLiteChannel, SQLiteDatabase, SQLiteStore
+
+
+async def test_memory_store_always_owns_lease():
+    store = MemoryStore()
+    assert await store.acquire("g", "a", 30)
+    assert await store.acquire("g", "b", 30)
+
+
+async def test_lease_takeover(tmp_path):
+    db = SQLiteDatabase(tmp_path / "games.db")
+    a, b = SQLiteStore(db), SQLiteStore(SQLiteDatabase(tmp_path / "games.db"))
+    assert await a.acquire("g", "a", 30)
+    assert not await b.acquire("g", "b", 30)
+    # 续期不受ttl影响，其他游戏的租约互不影响
+    assert await a.acquire("g", "a", 30)
+    assert await b.acquire("h", "b", 30)
+    # 超过ttl没有续期后可以被接管，原来的持有者再续期失败
+    await asyncio.sleep(0.05)
+    assert await b.acquire("g", "b", 0.01)
+    assert not await a.acquire("g", "a", 30)
+    # 只有持有者才能释放
+    await a.release("g", "a")
+    assert not await a.acquire("g", "a", 30)
+    await b.release("g", "b")
+    assert await a.acquire("g", "a", 30)
+
+
+async def anext_within(messages, timeout=2):
+    return await asyncio.wait_for(anext(messages), timeout)
+
+
+async def test_channel_relays_frames_with_backlog(tmp_path):
+    db = SQLiteDatabase(tmp_path / "games.db")
+    owner = SQLiteChannel(db, poll_interval=0.01)
+    relay = SQLiteChannel(SQLiteDatabase(tmp_path / "games.db"), poll_interval=0.01)
+    assert owner.shared
+    for frame_id in range(1, 6):
+        await owner.publish("g/frames", {"id": frame_id, "data": {"type": "display"}})
+    await owner.publish("h/frames", {"id": 100, "data": {"type": "display"}})
+    # 后来订阅的worker先收到最近的backlog帧，再收到之后发布的帧，其他游戏的帧不会混入
+    messages = relay.subscribe("g/frames", backlog=3)
+    await owner.publish("g/frames", {"id": 6, "data": {"type": "display"}})
+    await owner.publish("g/frames", {"end": True})
+    received = [await anext_within(messages) for _ in range(5)]
+    assert [m.get("id") for m in received] == [3, 4, 5, 6, None]
+    assert received[-1]["end"]
+    # 不带backlog时只接收订阅之后发布的消息
+    fresh = relay.subscribe("g/frames")
+    await owner.publish("g/frames", {"id": 7, "data": {"type": "display"}})
+    assert (await anext_within(fresh))["id"] == 7
+    await messages.aclose()
+    await fresh.aclose()